@@ -15,6 +15,7 @@ from app.habits.models import Habit
 from app.completions.models import HabitCompletion
 from app.preferences.models import UserPreference
 from app.streaks.models import Streak
+from app.analytics.models import CompletionDailyRollup, AnalyticsMonthlySnapshot
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,50 @@
+"""Completion daily rollup
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'completion_daily_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('habit_counts', sa.JSON(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'day', name='uq_user_rollup_day')
+    )
+    op.create_index(op.f('ix_completion_daily_rollup_id'), 'completion_daily_rollup', ['id'], unique=False)
+    op.create_index(op.f('ix_completion_daily_rollup_user_id'), 'completion_daily_rollup', ['user_id'], unique=False)
+    
+    # Backfill from existing completions; `python -m app.jobs.rollup_backfill` rebuilds it later if needed
+    op.execute("""
+        INSERT INTO completion_daily_rollup (user_id, day, count, habit_counts, updated_at)
+        SELECT user_id, day, SUM(n), json_object_agg(habit_id::text, n), now()
+        FROM (
+            SELECT user_id, completion_date AS day, habit_id, COUNT(*) AS n
+            FROM habit_completions
+            GROUP BY user_id, completion_date, habit_id
+        ) per_habit
+        GROUP BY user_id, day
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_completion_daily_rollup_user_id'), table_name='completion_daily_rollup')
+    op.drop_index(op.f('ix_completion_daily_rollup_id'), table_name='completion_daily_rollup')
+    op.drop_table('completion_daily_rollup')
@@ -0,0 +1,37 @@
+"""Analytics monthly snapshots
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'analytics_monthly_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'month', name='uq_user_snapshot_month')
+    )
+    op.create_index(op.f('ix_analytics_monthly_snapshots_id'), 'analytics_monthly_snapshots', ['id'], unique=False)
+    op.create_index(op.f('ix_analytics_monthly_snapshots_user_id'), 'analytics_monthly_snapshots', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_analytics_monthly_snapshots_user_id'), table_name='analytics_monthly_snapshots')
+    op.drop_index(op.f('ix_analytics_monthly_snapshots_id'), table_name='analytics_monthly_snapshots')
+    op.drop_table('analytics_monthly_snapshots')
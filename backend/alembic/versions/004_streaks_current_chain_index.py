@@ -0,0 +1,29 @@
+"""Partial index on live streak chains
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_streaks_current_chain',
+        'streaks',
+        ['user_id', 'streak_start_date'],
+        unique=False,
+        postgresql_where=sa.text('current_streak > 0')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_streaks_current_chain', table_name='streaks')
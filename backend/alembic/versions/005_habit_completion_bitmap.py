@@ -0,0 +1,26 @@
+"""Habit completion bitmap
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Left NULL here; bitmaps are built from completions on the next write or streak pass
+    op.add_column('habits', sa.Column('completion_bitmap', sa.LargeBinary(), nullable=True))
+    op.add_column('habits', sa.Column('completion_bitmap_origin', sa.Date(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('habits', 'completion_bitmap_origin')
+    op.drop_column('habits', 'completion_bitmap')
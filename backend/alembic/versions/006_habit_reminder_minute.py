@@ -0,0 +1,31 @@
+"""Habit reminder minute index
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('habits', sa.Column('reminder_minute', sa.Integer(), nullable=True))
+    # Same format rule as REMINDER_TIME_PATTERN in app.habits.service; malformed times get no reminder
+    op.execute("""
+        UPDATE habits
+        SET reminder_minute = split_part(reminder_time, ':', 1)::int * 60 + split_part(reminder_time, ':', 2)::int
+        WHERE reminder_time ~ '^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
+    """)
+    op.create_index(op.f('ix_habits_reminder_minute'), 'habits', ['reminder_minute'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_habits_reminder_minute'), table_name='habits')
+    op.drop_column('habits', 'reminder_minute')
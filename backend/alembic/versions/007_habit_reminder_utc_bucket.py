@@ -0,0 +1,41 @@
+"""Habit reminder UTC minute buckets
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('habits', sa.Column('reminder_utc_minute', sa.Integer(), nullable=True))
+    op.add_column('habits', sa.Column('reminder_day_shift', sa.SmallInteger(), nullable=True))
+    op.add_column('habits', sa.Column('reminder_valid_until', sa.DateTime(), nullable=True))
+    # Provisional UTC buckets that have already expired, so the first reminder tick recomputes them
+    # in each owner's timezone
+    op.execute("""
+        UPDATE habits
+        SET reminder_utc_minute = reminder_minute, reminder_day_shift = 0, reminder_valid_until = now() AT TIME ZONE 'UTC'
+        WHERE reminder_minute IS NOT NULL
+    """)
+    op.create_index(op.f('ix_habits_reminder_utc_minute'), 'habits', ['reminder_utc_minute'], unique=False)
+    op.create_index(op.f('ix_habits_reminder_valid_until'), 'habits', ['reminder_valid_until'], unique=False)
+    # The per-minute lookup now goes through the UTC bucket
+    op.drop_index(op.f('ix_habits_reminder_minute'), table_name='habits')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_habits_reminder_minute'), 'habits', ['reminder_minute'], unique=False)
+    op.drop_index(op.f('ix_habits_reminder_valid_until'), table_name='habits')
+    op.drop_index(op.f('ix_habits_reminder_utc_minute'), table_name='habits')
+    op.drop_column('habits', 'reminder_valid_until')
+    op.drop_column('habits', 'reminder_day_shift')
+    op.drop_column('habits', 'reminder_utc_minute')
@@ -0,0 +1,27 @@
+"""Versioned analytics month snapshots
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A NULL payload marks a month stale; writes bump the version instead of deleting the row
+    op.add_column('analytics_monthly_snapshots', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    op.alter_column('analytics_monthly_snapshots', 'payload', existing_type=sa.JSON(), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM analytics_monthly_snapshots WHERE payload IS NULL")
+    op.alter_column('analytics_monthly_snapshots', 'payload', existing_type=sa.JSON(), nullable=False)
+    op.drop_column('analytics_monthly_snapshots', 'version')
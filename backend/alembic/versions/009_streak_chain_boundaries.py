@@ -0,0 +1,28 @@
+"""Run and chain boundaries on streaks
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Left NULL: the first completion write to each habit walks its history to fill them
+    op.add_column('streaks', sa.Column('run_start_date', sa.Date(), nullable=True))
+    op.add_column('streaks', sa.Column('chain_start_date', sa.Date(), nullable=True))
+    op.add_column('streaks', sa.Column('chain_length', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('streaks', 'chain_length')
+    op.drop_column('streaks', 'chain_start_date')
+    op.drop_column('streaks', 'run_start_date')
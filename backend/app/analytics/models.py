@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, JSON, UniqueConstraint
+from app.database import Base
+from datetime import datetime
+
+
+class CompletionDailyRollup(Base):
+    __tablename__ = "completion_daily_rollup"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    day = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    habit_counts = Column(JSON, nullable=False, default=dict)  # {"<habit_id>": count}
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # One rollup row per user per day
+    __table_args__ = (
+        UniqueConstraint('user_id', 'day', name='uq_user_rollup_day'),
+    )
+
+
+class AnalyticsMonthlySnapshot(Base):
+    __tablename__ = "analytics_monthly_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    month = Column(Date, nullable=False)  # First day of the month
+    payload = Column(JSON, nullable=True)  # {"t": total, "d": [daily counts], "h": {"<habit_id>": [count, rate]}}; NULL once stale
+    # Bumped by every write that makes the month stale; a snapshot is only stored if it is unchanged since the build began
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # One frozen snapshot per user per closed month
+    __table_args__ = (
+        UniqueConstraint('user_id', 'month', name='uq_user_snapshot_month'),
+    )
@@ -1,89 +1,266 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, select, cast, null, union_all, Date, JSON, Row
+from sqlalchemy.exc import IntegrityError
 from app.habits.models import Habit
 from app.completions.models import HabitCompletion
 from app.streaks.models import Streak
+from app.analytics.models import CompletionDailyRollup, AnalyticsMonthlySnapshot
 from typing import List, Dict
-from datetime import date, timedelta
+from datetime import date
 
 
 class AnalyticsRepository:
     def __init__(self, db: Session):
         self.db = db
     
-    def get_user_streaks(self, user_id: int) -> List[Streak]:
-        """Get all streaks for a user"""
-        return self.db.query(Streak).filter(
-            Streak.user_id == user_id
-        ).all()
+    def get_habit_overview(self, user_id: int) -> List[Row]:
+        """Get every habit of a user joined to its streak"""
+        return self.db.execute(_habit_overview_query(user_id)).all()
     
-    def get_habit_streak(self, user_id: int, habit_id: int) -> Streak:
-        """Get streak for a specific habit"""
-        return self.db.query(Streak).filter(
-            Streak.user_id == user_id,
-            Streak.habit_id == habit_id
-        ).first()
+    def get_completion_overview(self, user_id: int, chart_start: date, chart_end: date, today: date) -> Dict[str, object]:
+        """Get the all-time completion total and daily rollups for a chart window in one round trip"""
+        rows = self.db.execute(_completion_overview_query(user_id, chart_start, chart_end, today)).all()
+        return _fold_completion_overview(rows)
+
+
+class AsyncAnalyticsRepository:
+    """Read queries of AnalyticsRepository on an AsyncSession"""
     
-    def get_completion_count(self, user_id: int, start_date: date, end_date: date) -> int:
-        """Get completion count for a date range"""
-        return self.db.query(func.count(HabitCompletion.id)).filter(
-            HabitCompletion.user_id == user_id,
-            HabitCompletion.completion_date >= start_date,
-            HabitCompletion.completion_date <= end_date
-        ).scalar() or 0
+    def __init__(self, db: AsyncSession):
+        self.db = db
     
-    def get_habit_completion_count(self, user_id: int, habit_id: int, start_date: date, end_date: date) -> int:
-        """Get completion count for a habit in a date range"""
-        return self.db.query(func.count(HabitCompletion.id)).filter(
-            HabitCompletion.user_id == user_id,
-            HabitCompletion.habit_id == habit_id,
-            HabitCompletion.completion_date >= start_date,
-            HabitCompletion.completion_date <= end_date
-        ).scalar() or 0
-    
-    def get_weekly_completions(self, user_id: int, start_date: date) -> Dict[str, int]:
-        """Get daily completion counts for a week"""
-        end_date = start_date + timedelta(days=6)
-        completions = self.db.query(
-            func.date(HabitCompletion.completion_date).label('date'),
-            func.count(HabitCompletion.id).label('count')
+    async def get_habit_overview(self, user_id: int) -> List[Row]:
+        """Get every habit of a user joined to its streak"""
+        result = await self.db.execute(_habit_overview_query(user_id))
+        return result.all()
+    
+    async def get_completion_overview(self, user_id: int, chart_start: date, chart_end: date, today: date) -> Dict[str, object]:
+        """Get the all-time completion total and daily rollups for a chart window in one round trip"""
+        result = await self.db.execute(_completion_overview_query(user_id, chart_start, chart_end, today))
+        return _fold_completion_overview(result.all())
+
+
+def _habit_overview_query(user_id: int):
+    """Select every habit of a user outer-joined to its streak, newest first"""
+    return select(
+        Habit.id.label('habit_id'),
+        Habit.name.label('habit_name'),
+        Habit.is_active,
+        Habit.created_at,
+        Streak.id.label('streak_id'),
+        Streak.current_streak,
+        Streak.longest_streak,
+        Streak.last_completion_date,
+        Streak.streak_start_date
+    ).outerjoin(
+        Streak,
+        and_(Streak.habit_id == Habit.id, Streak.user_id == user_id)
+    ).where(
+        Habit.user_id == user_id
+    ).order_by(Habit.created_at.desc())
+
+
+def _completion_overview_query(user_id: int, chart_start: date, chart_end: date, today: date):
+    """Union the rollup rows of a chart window with one all-time total row (day is NULL)"""
+    daily = select(
+        CompletionDailyRollup.day,
+        CompletionDailyRollup.count,
+        CompletionDailyRollup.habit_counts
+    ).where(
+        CompletionDailyRollup.user_id == user_id,
+        CompletionDailyRollup.day >= chart_start,
+        CompletionDailyRollup.day <= chart_end
+    )
+    
+    total = select(
+        cast(null(), Date).label('day'),
+        func.coalesce(func.sum(CompletionDailyRollup.count), 0).label('count'),
+        cast(null(), JSON).label('habit_counts')
+    ).where(
+        CompletionDailyRollup.user_id == user_id,
+        CompletionDailyRollup.day >= date(2000, 1, 1),
+        CompletionDailyRollup.day <= today
+    )
+    
+    return union_all(daily, total)
+
+
+def _fold_completion_overview(rows: List[Row]) -> Dict[str, object]:
+    """Split completion overview rows into the total and per-day counts"""
+    total_completions = 0
+    daily_counts = {}
+    daily_habit_counts = {}
+    for row in rows:
+        if row.day is None:
+            total_completions = int(row.count or 0)
+        else:
+            daily_counts[row.day] = row.count
+            daily_habit_counts[row.day] = {int(habit_id): count for habit_id, count in (row.habit_counts or {}).items()}
+    
+    return {
+        "total_completions": total_completions,
+        "daily_counts": daily_counts,
+        "daily_habit_counts": daily_habit_counts
+    }
+
+
+class CompletionRollupRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def apply_delta(self, user_id: int, habit_id: int, day: date, delta: int) -> None:
+        """Add delta completions of a habit to a user's rollup for a day (caller commits)"""
+        query = self.db.query(CompletionDailyRollup).filter(
+            CompletionDailyRollup.user_id == user_id,
+            CompletionDailyRollup.day == day
+        )
+        rollup = query.with_for_update().first()
+        if rollup is None:
+            try:
+                with self.db.begin_nested():
+                    rollup = CompletionDailyRollup(user_id=user_id, day=day, count=0, habit_counts={})
+                    self.db.add(rollup)
+            except IntegrityError:
+                # A concurrent write created the row first
+                rollup = query.with_for_update().first()
+        
+        habit_counts = dict(rollup.habit_counts or {})
+        habit_key = str(habit_id)
+        habit_count = habit_counts.get(habit_key, 0) + delta
+        if habit_count > 0:
+            habit_counts[habit_key] = habit_count
+        else:
+            habit_counts.pop(habit_key, None)
+        
+        rollup.count = max((rollup.count or 0) + delta, 0)
+        rollup.habit_counts = habit_counts
+        if rollup.count == 0:
+            self.db.delete(rollup)
+        self.db.flush()
+    
+    def remove_habit(self, user_id: int, habit_id: int) -> List[date]:
+        """Subtract all completions of a habit from the rollup, returning the days changed (caller commits)"""
+        days = self.db.query(
+            HabitCompletion.completion_date,
+            func.count(HabitCompletion.id)
         ).filter(
             HabitCompletion.user_id == user_id,
-            HabitCompletion.completion_date >= start_date,
-            HabitCompletion.completion_date <= end_date
-        ).group_by(func.date(HabitCompletion.completion_date)).all()
+            HabitCompletion.habit_id == habit_id
+        ).group_by(HabitCompletion.completion_date).all()
         
-        return {str(row.date): row.count for row in completions}
+        for day, count in days:
+            self.apply_delta(user_id, habit_id, day, -count)
+        return [day for day, _ in days]
     
-    def get_monthly_completions(self, user_id: int, start_date: date) -> Dict[str, int]:
-        """Get daily completion counts for a month"""
-        # Calculate end of month
-        if start_date.month == 12:
-            end_date = date(start_date.year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(start_date.year, start_date.month + 1, 1) - timedelta(days=1)
+    def get_daily_rollups(self, user_id: int, start_date: date, end_date: date) -> List[CompletionDailyRollup]:
+        """Get rollup rows for a date range"""
+        return self.db.query(CompletionDailyRollup).filter(
+            CompletionDailyRollup.user_id == user_id,
+            CompletionDailyRollup.day >= start_date,
+            CompletionDailyRollup.day <= end_date
+        ).order_by(CompletionDailyRollup.day).all()
+    
+    def rebuild_user(self, user_id: int) -> int:
+        """Rebuild a user's rollup rows from raw completions (caller commits)"""
+        self.db.query(CompletionDailyRollup).filter(
+            CompletionDailyRollup.user_id == user_id
+        ).delete(synchronize_session=False)
         
-        completions = self.db.query(
-            func.date(HabitCompletion.completion_date).label('date'),
+        per_habit = self.db.query(
+            HabitCompletion.completion_date,
+            HabitCompletion.habit_id,
             func.count(HabitCompletion.id).label('count')
         ).filter(
-            HabitCompletion.user_id == user_id,
-            HabitCompletion.completion_date >= start_date,
-            HabitCompletion.completion_date <= end_date
-        ).group_by(func.date(HabitCompletion.completion_date)).all()
+            HabitCompletion.user_id == user_id
+        ).group_by(
+            HabitCompletion.completion_date,
+            HabitCompletion.habit_id
+        ).all()
         
-        return {str(row.date): row.count for row in completions}
-    
-    def get_total_habits(self, user_id: int) -> int:
-        """Get total number of habits"""
-        return self.db.query(func.count(Habit.id)).filter(
-            Habit.user_id == user_id
-        ).scalar() or 0
-    
-    def get_active_habits(self, user_id: int) -> int:
-        """Get number of active habits"""
-        return self.db.query(func.count(Habit.id)).filter(
-            Habit.user_id == user_id,
-            Habit.is_active == True
-        ).scalar() or 0
+        rollups = {}
+        for row in per_habit:
+            rollup = rollups.setdefault(row.completion_date, {"user_id": user_id, "day": row.completion_date, "count": 0, "habit_counts": {}})
+            rollup["count"] += row.count
+            rollup["habit_counts"][str(row.habit_id)] = row.count
+        
+        if rollups:
+            self.db.bulk_insert_mappings(CompletionDailyRollup, list(rollups.values()))
+        return len(rollups)
+
 
+class AnalyticsSnapshotRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_range(self, user_id: int, start_month: date, end_month: date) -> List[AnalyticsMonthlySnapshot]:
+        """Get stored snapshots for months in a range"""
+        return self.db.query(AnalyticsMonthlySnapshot).filter(
+            AnalyticsMonthlySnapshot.user_id == user_id,
+            AnalyticsMonthlySnapshot.month >= start_month,
+            AnalyticsMonthlySnapshot.month <= end_month
+        ).all()
+    
+    def claim(self, user_id: int, months: List[date]) -> Dict[date, int]:
+        """
+        Get the versions of months about to be frozen, creating stale rows for months without one,
+        so a write landing during the build bumps the row and voids the save (caller commits)
+        """
+        for month in months:
+            try:
+                with self.db.begin_nested():
+                    self.db.add(AnalyticsMonthlySnapshot(user_id=user_id, month=month, payload=None, version=0))
+            except IntegrityError:
+                # Claimed before, or a write marked the month stale first
+                pass
+        rows = self.db.query(AnalyticsMonthlySnapshot.month, AnalyticsMonthlySnapshot.version).filter(
+            AnalyticsMonthlySnapshot.user_id == user_id,
+            AnalyticsMonthlySnapshot.month.in_(months)
+        ).all()
+        return {row.month: row.version for row in rows}
+    
+    def save(self, user_id: int, month: date, payload: dict, version: int) -> bool:
+        """Store a frozen month snapshot unless a write made the month stale after it was claimed (caller commits)"""
+        return bool(self.db.query(AnalyticsMonthlySnapshot).filter(
+            AnalyticsMonthlySnapshot.user_id == user_id,
+            AnalyticsMonthlySnapshot.month == month,
+            AnalyticsMonthlySnapshot.version == version
+        ).update({"payload": payload}, synchronize_session=False))
+    
+    def invalidate(self, user_id: int, month: date) -> None:
+        """Mark the snapshot of one month stale (caller commits)"""
+        self.invalidate_months(user_id, [month])
+    
+    def invalidate_months(self, user_id: int, months: List[date]) -> None:
+        """
+        Mark the snapshots of months stale, bumping their versions. Months without a row get a stale one,
+        so a snapshot being built for them concurrently is not stored either (caller commits)
+        """
+        for month in months:
+            if self._mark_stale(user_id, month):
+                continue
+            try:
+                with self.db.begin_nested():
+                    self.db.add(AnalyticsMonthlySnapshot(user_id=user_id, month=month, payload=None, version=1))
+            except IntegrityError:
+                # A build claimed the month first
+                self._mark_stale(user_id, month)
+    
+    def invalidate_closed_months(self, user_id: int, first_day: date, today: date) -> None:
+        """Mark stale every closed month from the one containing first_day (caller commits)"""
+        months = []
+        month = date(first_day.year, first_day.month, 1)
+        while month < date(today.year, today.month, 1):
+            months.append(month)
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        self.invalidate_months(user_id, months)
+    
+    def _mark_stale(self, user_id: int, month: date) -> bool:
+        """Drop a stored snapshot's payload and bump its version; False if the month has no row"""
+        return bool(self.db.query(AnalyticsMonthlySnapshot).filter(
+            AnalyticsMonthlySnapshot.user_id == user_id,
+            AnalyticsMonthlySnapshot.month == month
+        ).update({
+            "payload": None,
+            "version": AnalyticsMonthlySnapshot.version + 1
+        }, synchronize_session=False))
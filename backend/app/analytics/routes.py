@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Request, Query
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.database import get_db, get_async_db
 from app.analytics.service import AnalyticsService
-from app.analytics.schemas import AnalyticsResponse, StreakResponse
+from app.analytics.schemas import (
+    AnalyticsResponse, StreakResponse, MonthlyAnalyticsResponse, YearOverYearResponse, HabitHeatmapResponse
+)
 from app.shared.dependencies import get_current_user
 from app.shared.rate_limiter import get_rate_limiter
 from slowapi import Limiter
@@ -17,11 +20,12 @@ limiter = get_rate_limiter()
 async def get_analytics(
     request: Request,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Get comprehensive analytics for the current user"""
-    analytics_service = AnalyticsService(db)
-    return analytics_service.get_analytics(current_user.id)
+    analytics_service = AnalyticsService(db, async_db)
+    return await analytics_service.aget_analytics(current_user.id)
 
 
 @router.get("/streaks", response_model=List[StreakResponse])
@@ -29,9 +33,49 @@ async def get_analytics(
 async def get_streaks(
     request: Request,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Get all streaks for the current user"""
+    analytics_service = AnalyticsService(db, async_db)
+    return await analytics_service.aget_streaks(current_user.id)
+
+
+
+@router.get("/history", response_model=List[MonthlyAnalyticsResponse])
+@limiter.limit("60/minute")
+async def get_history(
+    request: Request,
+    months: int = Query(12, ge=1, le=60),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get per-month analytics for the current user, newest month first"""
+    analytics_service = AnalyticsService(db)
+    return analytics_service.get_history(current_user.id, months)
+
+
+@router.get("/year-over-year", response_model=YearOverYearResponse)
+@limiter.limit("60/minute")
+async def get_year_over_year(
+    request: Request,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Compare this year's monthly completions with last year"""
     analytics_service = AnalyticsService(db)
-    return analytics_service.get_streaks(current_user.id)
+    return analytics_service.get_year_over_year(current_user.id)
+
 
+@router.get("/habits/{habit_id}/heatmap", response_model=HabitHeatmapResponse)
+@limiter.limit("60/minute")
+async def get_habit_heatmap(
+    request: Request,
+    habit_id: int,
+    days: int = Query(365, ge=1, le=3660),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a habit's daily completion heatmap and 7-day rolling counts"""
+    analytics_service = AnalyticsService(db)
+    return analytics_service.get_habit_heatmap(current_user.id, habit_id, days)
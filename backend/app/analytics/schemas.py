@@ -41,3 +41,41 @@ class AnalyticsResponse(BaseModel):
     weekly_completions: Dict[str, int]  # Date -> count
     monthly_completions: Dict[str, int]  # Date -> count
 
+
+
+class MonthlyHabitStats(BaseModel):
+    habit_id: int
+    total_completions: int
+    completion_rate: float
+
+
+class MonthlyAnalyticsResponse(BaseModel):
+    month: date  # First day of the month
+    is_closed: bool
+    total_completions: int
+    daily_completions: Dict[str, int]  # Date -> count
+    habit_stats: List[MonthlyHabitStats]
+
+
+class MonthComparison(BaseModel):
+    month: int
+    completions: int
+    previous_completions: int
+
+
+class YearOverYearResponse(BaseModel):
+    year: int
+    previous_year: int
+    total_completions: int
+    previous_total_completions: int
+    months: List[MonthComparison]
+
+
+class HabitHeatmapResponse(BaseModel):
+    habit_id: int
+    start_date: date
+    end_date: date
+    total_completions: int
+    completion_rate: float  # Percentage
+    daily_completions: Dict[str, int]  # Date -> 1 if completed, else 0
+    rolling_7_day: Dict[str, int]  # Date -> completions in the 7 days ending that day
@@ -1,119 +1,337 @@
 from sqlalchemy.orm import Session
-from app.analytics.repository import AnalyticsRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.analytics.repository import (
+    AnalyticsRepository, AsyncAnalyticsRepository, CompletionRollupRepository, AnalyticsSnapshotRepository
+)
 from app.habits.repository import HabitRepository
-from app.analytics.schemas import AnalyticsResponse, StreakResponse, HabitStats
-from app.redis_client import get_cache, set_cache
-from typing import List, Dict
+from app.database import SessionLocal
+from app.redis_client import get_cache_swr, aget_cache_swr
+from fastapi import HTTPException, status
+from typing import List, Dict, Any, Callable, Optional
 from datetime import date, timedelta
 
 
 class AnalyticsService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, async_db: Optional[AsyncSession] = None):
         self.analytics_repo = AnalyticsRepository(db)
+        self.async_analytics_repo = AsyncAnalyticsRepository(async_db) if async_db is not None else None
+        self.rollup_repo = CompletionRollupRepository(db)
+        self.snapshot_repo = AnalyticsSnapshotRepository(db)
         self.habit_repo = HabitRepository(db)
         self.db = db
     
     def get_analytics(self, user_id: int) -> dict:
         """Get comprehensive analytics for a user"""
-        cache_key = f"analytics:user:{user_id}"
-        cached_analytics = get_cache(cache_key)
-        if cached_analytics:
-            return cached_analytics
-        
+        # Fresh for 15 minutes, served stale for up to a day while a refresh runs
+        return get_cache_swr(
+            f"analytics:user:{user_id}",
+            lambda: self._build_analytics(user_id),
+            refresh=lambda: _refresh_in_new_session(lambda service: service._build_analytics(user_id)),
+            soft_ttl=900,
+            hard_ttl=86400
+        )
+    
+    async def aget_analytics(self, user_id: int) -> dict:
+        """Get comprehensive analytics for a user without blocking the event loop on Redis"""
+        build = self._abuild_analytics if self.async_analytics_repo is not None else self._build_analytics
+        return await aget_cache_swr(
+            f"analytics:user:{user_id}",
+            lambda: build(user_id),
+            refresh=lambda: _refresh_in_new_session(lambda service: service._build_analytics(user_id)),
+            soft_ttl=900,
+            hard_ttl=86400
+        )
+    
+    def _build_analytics(self, user_id: int) -> dict:
+        """Build the analytics payload from the habit overview and the completion rollup"""
         today = date.today()
-        week_start = today - timedelta(days=today.weekday())
-        month_start = date(today.year, today.month, 1)
+        chart_start, chart_end = _chart_window(today)
         
-        # Get basic stats
-        total_habits = self.analytics_repo.get_total_habits(user_id)
-        active_habits = self.analytics_repo.get_active_habits(user_id)
-        total_completions = self.analytics_repo.get_completion_count(user_id, date(2000, 1, 1), today)
-        completions_this_week = self.analytics_repo.get_completion_count(user_id, week_start, today)
-        completions_this_month = self.analytics_repo.get_completion_count(user_id, month_start, today)
+        habit_rows = self.analytics_repo.get_habit_overview(user_id)
+        completion_overview = self.analytics_repo.get_completion_overview(user_id, chart_start, chart_end, today)
+        return build_analytics_payload(habit_rows, completion_overview, today)
+    
+    async def _abuild_analytics(self, user_id: int) -> dict:
+        """Build the analytics payload through the async engine"""
+        today = date.today()
+        chart_start, chart_end = _chart_window(today)
         
-        # Calculate completion rate (completions / (active_habits * days))
-        days_since_start = (today - month_start).days + 1
-        expected_completions = active_habits * days_since_start if active_habits > 0 else 1
-        overall_completion_rate = (completions_this_month / expected_completions * 100) if expected_completions > 0 else 0
+        habit_rows = await self.async_analytics_repo.get_habit_overview(user_id)
+        completion_overview = await self.async_analytics_repo.get_completion_overview(user_id, chart_start, chart_end, today)
+        return build_analytics_payload(habit_rows, completion_overview, today)
+    
+    def get_streaks(self, user_id: int) -> List[dict]:
+        """Get all streaks for a user"""
+        # Fresh for 10 minutes, served stale for up to a day while a refresh runs
+        return get_cache_swr(
+            f"streaks:user:{user_id}",
+            lambda: self._build_streaks(user_id),
+            refresh=lambda: _refresh_in_new_session(lambda service: service._build_streaks(user_id)),
+            soft_ttl=600,
+            hard_ttl=86400
+        )
+    
+    async def aget_streaks(self, user_id: int) -> List[dict]:
+        """Get all streaks for a user without blocking the event loop on Redis"""
+        build = self._abuild_streaks if self.async_analytics_repo is not None else self._build_streaks
+        return await aget_cache_swr(
+            f"streaks:user:{user_id}",
+            lambda: build(user_id),
+            refresh=lambda: _refresh_in_new_session(lambda service: service._build_streaks(user_id)),
+            soft_ttl=600,
+            hard_ttl=86400
+        )
+    
+    def _build_streaks(self, user_id: int) -> List[dict]:
+        """Build the streak list from the habit overview"""
+        return build_streak_entries(self.analytics_repo.get_habit_overview(user_id))
+    
+    async def _abuild_streaks(self, user_id: int) -> List[dict]:
+        """Build the streak list through the async engine"""
+        return build_streak_entries(await self.async_analytics_repo.get_habit_overview(user_id))
+    
+    def get_history(self, user_id: int, months: int = 12) -> List[dict]:
+        """Get per-month analytics for the last `months` months, newest first"""
+        today = date.today()
+        current_month = date(today.year, today.month, 1)
+        month_starts = [_add_months(current_month, -offset) for offset in range(months)]
         
-        # Get streaks
-        streaks_data = self.analytics_repo.get_user_streaks(user_id)
-        streaks = []
-        for streak in streaks_data:
-            habit = self.habit_repo.get_by_id(streak.habit_id, user_id)
-            if habit:
-                streaks.append({
-                    "habit_id": streak.habit_id,
-                    "habit_name": habit.name,
-                    "current_streak": streak.current_streak,
-                    "longest_streak": streak.longest_streak,
-                    "last_completion_date": streak.last_completion_date.isoformat() if streak.last_completion_date else None,
-                    "streak_start_date": streak.streak_start_date.isoformat() if streak.streak_start_date else None
-                })
+        snapshots = self._get_month_snapshots(user_id, month_starts, today)
+        return [
+            _expand_snapshot(month_start, snapshots[month_start], month_start < current_month)
+            for month_start in month_starts
+        ]
+    
+    def get_year_over_year(self, user_id: int) -> dict:
+        """Compare this year's monthly completions with the same months last year"""
+        today = date.today()
+        this_year = [date(today.year, month, 1) for month in range(1, today.month + 1)]
+        last_year = [date(today.year - 1, month, 1) for month in range(1, today.month + 1)]
         
-        # Get habit stats
-        habits = self.habit_repo.get_all_by_user(user_id, active_only=True)
-        habit_stats = []
-        for habit in habits:
-            habit_completions = self.analytics_repo.get_habit_completion_count(user_id, habit.id, month_start, today)
-            streak = self.analytics_repo.get_habit_streak(user_id, habit.id)
-            
-            days_since_habit_start = (today - habit.created_at.date()).days + 1 if habit.created_at else 1
-            completion_rate = (habit_completions / days_since_habit_start * 100) if days_since_habit_start > 0 else 0
-            
-            habit_stats.append({
-                "habit_id": habit.id,
-                "habit_name": habit.name,
-                "total_completions": habit_completions,
-                "current_streak": streak.current_streak if streak else 0,
-                "longest_streak": streak.longest_streak if streak else 0,
-                "completion_rate": completion_rate,
-                "last_completion_date": streak.last_completion_date.isoformat() if streak and streak.last_completion_date else None
-            })
+        snapshots = self._get_month_snapshots(user_id, last_year + this_year, today)
+        months = [
+            {
+                "month": month_start.month,
+                "completions": snapshots[month_start]["t"],
+                "previous_completions": snapshots[previous_start]["t"]
+            }
+            for month_start, previous_start in zip(this_year, last_year)
+        ]
+        return {
+            "year": today.year,
+            "previous_year": today.year - 1,
+            "total_completions": sum(month["completions"] for month in months),
+            "previous_total_completions": sum(month["previous_completions"] for month in months),
+            "months": months
+        }
+    
+    def get_habit_heatmap(self, user_id: int, habit_id: int, days: int = 365) -> dict:
+        """Get a habit's daily completions and 7-day rolling counts over the last `days` days from its bitmap"""
+        if not self.habit_repo.get_by_id(habit_id, user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habit not found"
+            )
         
-        # Get weekly and monthly completion charts
-        weekly_completions = self.analytics_repo.get_weekly_completions(user_id, week_start)
-        monthly_completions = self.analytics_repo.get_monthly_completions(user_id, month_start)
+        bitmap = self.habit_repo.get_completion_bitmaps([habit_id])[habit_id]
+        # Persist a bitmap built on first use
+        self.db.commit()
         
-        analytics_data = {
-            "total_habits": total_habits,
-            "active_habits": active_habits,
+        today = date.today()
+        start_date = today - timedelta(days=days - 1)
+        total_completions = bitmap.count(start_date, today)
+        return {
+            "habit_id": habit_id,
+            "start_date": start_date,
+            "end_date": today,
             "total_completions": total_completions,
-            "completions_this_week": completions_this_week,
-            "completions_this_month": completions_this_month,
-            "overall_completion_rate": round(overall_completion_rate, 2),
-            "streaks": streaks,
-            "habit_stats": habit_stats,
-            "weekly_completions": weekly_completions,
-            "monthly_completions": monthly_completions
+            "completion_rate": round(total_completions / days * 100, 2),
+            "daily_completions": bitmap.heatmap(start_date, today),
+            "rolling_7_day": bitmap.rolling_counts(start_date, today, 7)
         }
-        
-        # Cache for 15 minutes
-        set_cache(cache_key, analytics_data, expire=900)
-        return analytics_data
     
-    def get_streaks(self, user_id: int) -> List[dict]:
-        """Get all streaks for a user"""
-        cache_key = f"streaks:user:{user_id}"
-        cached_streaks = get_cache(cache_key)
-        if cached_streaks:
-            return cached_streaks
+    def _get_month_snapshots(self, user_id: int, month_starts: List[date], today: date) -> Dict[date, dict]:
+        """Get compact snapshots for months, freezing closed months that have not been stored yet"""
+        current_month = date(today.year, today.month, 1)
+        closed_months = [month_start for month_start in month_starts if month_start < current_month]
+        
+        snapshots = {}
+        if closed_months:
+            for snapshot in self.snapshot_repo.get_range(user_id, min(closed_months), max(closed_months)):
+                if snapshot.payload is not None:
+                    snapshots[snapshot.month] = snapshot.payload
+        
+        # Closed months are frozen once, until a back-dated write marks them stale; only the current
+        # month is built on every request
+        to_build = [month_start for month_start in month_starts if month_start not in snapshots]
+        if not to_build:
+            return snapshots
         
-        streaks_data = self.analytics_repo.get_user_streaks(user_id)
-        streaks = []
-        for streak in streaks_data:
-            habit = self.habit_repo.get_by_id(streak.habit_id, user_id)
-            if habit:
-                streaks.append({
-                    "habit_id": streak.habit_id,
-                    "habit_name": habit.name,
-                    "current_streak": streak.current_streak,
-                    "longest_streak": streak.longest_streak,
-                    "last_completion_date": streak.last_completion_date.isoformat() if streak.last_completion_date else None,
-                    "streak_start_date": streak.streak_start_date.isoformat() if streak.streak_start_date else None
-                })
+        # Claim closed months before reading their rollups: a write landing after this bumps the
+        # month's version, and the snapshot built from rollups it may have missed is not stored
+        to_freeze = [month_start for month_start in to_build if month_start < current_month]
+        versions = self.snapshot_repo.claim(user_id, to_freeze) if to_freeze else {}
         
-        # Cache for 10 minutes
-        set_cache(cache_key, streaks, expire=600)
-        return streaks
+        habits = self.habit_repo.get_all_by_user(user_id)
+        rollups = self.rollup_repo.get_daily_rollups(user_id, min(to_build), _month_end(max(to_build)))
+        for month_start in to_build:
+            month_rollups = [rollup for rollup in rollups if month_start <= rollup.day <= _month_end(month_start)]
+            snapshots[month_start] = _freeze_month(month_start, month_rollups, habits, today)
+            if month_start in versions:
+                self.snapshot_repo.save(user_id, month_start, snapshots[month_start], versions[month_start])
+        
+        if to_freeze:
+            self.db.commit()
+        return snapshots
+
+
+def _refresh_in_new_session(build: Callable[["AnalyticsService"], Any]) -> Any:
+    """Run a cache rebuild on its own session, for background refreshes outside the request"""
+    db = SessionLocal()
+    try:
+        return build(AnalyticsService(db))
+    finally:
+        db.close()
 
+
+def _add_months(month_start: date, months: int) -> date:
+    """Shift the first day of a month by a number of months"""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _freeze_month(month_start: date, rollups: list, habits: list, today: date) -> dict:
+    """Build the compact snapshot of one month from its rollup rows"""
+    month_end = _month_end(month_start)
+    last_day = min(month_end, today)
+    
+    daily = [0] * month_end.day
+    habit_counts = {}
+    for rollup in rollups:
+        daily[rollup.day.day - 1] = rollup.count
+        for habit_id, count in (rollup.habit_counts or {}).items():
+            habit_counts[habit_id] = habit_counts.get(habit_id, 0) + count
+    
+    habit_stats = {}
+    for habit in habits:
+        habit_key = str(habit.id)
+        created = habit.created_at.date() if habit.created_at else month_start
+        if created > last_day and habit_key not in habit_counts:
+            continue
+        days_active = max((last_day - max(month_start, created)).days + 1, 1)
+        count = habit_counts.get(habit_key, 0)
+        habit_stats[habit_key] = [count, round(count / days_active * 100, 2)]
+    
+    return {"t": sum(daily), "d": daily, "h": habit_stats}
+
+
+def _expand_snapshot(month_start: date, snapshot: dict, is_closed: bool) -> dict:
+    """Expand a compact month snapshot into the MonthlyAnalyticsResponse shape"""
+    return {
+        "month": month_start.isoformat(),
+        "is_closed": is_closed,
+        "total_completions": snapshot["t"],
+        "daily_completions": {
+            (month_start + timedelta(days=offset)).isoformat(): count
+            for offset, count in enumerate(snapshot["d"]) if count
+        },
+        "habit_stats": [
+            {"habit_id": int(habit_id), "total_completions": count, "completion_rate": rate}
+            for habit_id, (count, rate) in snapshot["h"].items()
+        ]
+    }
+
+
+def _chart_window(today: date) -> tuple:
+    """First and last day covered by the weekly and monthly charts"""
+    week_start = today - timedelta(days=today.weekday())
+    month_start = date(today.year, today.month, 1)
+    return min(week_start, month_start), max(week_start + timedelta(days=6), _month_end(month_start))
+
+
+def _month_end(month_start: date) -> date:
+    """Get the last day of the month starting at month_start"""
+    if month_start.month == 12:
+        return date(month_start.year + 1, 1, 1) - timedelta(days=1)
+    return date(month_start.year, month_start.month + 1, 1) - timedelta(days=1)
+
+
+def build_streak_entries(habit_rows: list) -> List[dict]:
+    """Build StreakResponse entries for the habits that have a streak row"""
+    # Streaks are listed in storage order, like a plain query on the streaks table
+    streak_rows = sorted((row for row in habit_rows if row.streak_id is not None), key=lambda row: row.streak_id)
+    return [
+        {
+            "habit_id": row.habit_id,
+            "habit_name": row.habit_name,
+            "current_streak": row.current_streak,
+            "longest_streak": row.longest_streak,
+            "last_completion_date": row.last_completion_date.isoformat() if row.last_completion_date else None,
+            "streak_start_date": row.streak_start_date.isoformat() if row.streak_start_date else None
+        }
+        for row in streak_rows
+    ]
+
+
+def build_analytics_payload(habit_rows: list, completion_overview: dict, today: date) -> dict:
+    """Assemble the AnalyticsResponse payload from habit overview rows and completion rollups"""
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    month_start = date(today.year, today.month, 1)
+    month_end = _month_end(month_start)
+    
+    daily_counts = completion_overview["daily_counts"]
+    total_completions = completion_overview["total_completions"]
+    completions_this_week = sum(count for day, count in daily_counts.items() if week_start <= day <= today)
+    completions_this_month = sum(count for day, count in daily_counts.items() if month_start <= day <= today)
+    
+    month_habit_counts = {}
+    for day, habit_counts in completion_overview["daily_habit_counts"].items():
+        if month_start <= day <= today:
+            for habit_id, count in habit_counts.items():
+                month_habit_counts[habit_id] = month_habit_counts.get(habit_id, 0) + count
+    
+    total_habits = len(habit_rows)
+    active_habits = sum(1 for row in habit_rows if row.is_active)
+    
+    # Calculate completion rate (completions / (active_habits * days))
+    days_since_start = (today - month_start).days + 1
+    expected_completions = active_habits * days_since_start if active_habits > 0 else 1
+    overall_completion_rate = (completions_this_month / expected_completions * 100) if expected_completions > 0 else 0
+    
+    streaks = build_streak_entries(habit_rows)
+    
+    habit_stats = []
+    for row in habit_rows:
+        if not row.is_active:
+            continue
+        has_streak = row.streak_id is not None
+        habit_completions = month_habit_counts.get(row.habit_id, 0)
+        days_since_habit_start = (today - row.created_at.date()).days + 1 if row.created_at else 1
+        completion_rate = (habit_completions / days_since_habit_start * 100) if days_since_habit_start > 0 else 0
+        
+        habit_stats.append({
+            "habit_id": row.habit_id,
+            "habit_name": row.habit_name,
+            "total_completions": habit_completions,
+            "current_streak": row.current_streak if has_streak else 0,
+            "longest_streak": row.longest_streak if has_streak else 0,
+            "completion_rate": completion_rate,
+            "last_completion_date": row.last_completion_date.isoformat() if has_streak and row.last_completion_date else None
+        })
+    
+    weekly_completions = {str(day): count for day, count in sorted(daily_counts.items()) if week_start <= day <= week_end}
+    monthly_completions = {str(day): count for day, count in sorted(daily_counts.items()) if month_start <= day <= month_end}
+    
+    return {
+        "total_habits": total_habits,
+        "active_habits": active_habits,
+        "total_completions": total_completions,
+        "completions_this_week": completions_this_week,
+        "completions_this_month": completions_this_month,
+        "overall_completion_rate": round(overall_completion_rate, 2),
+        "streaks": streaks,
+        "habit_stats": habit_stats,
+        "weekly_completions": weekly_completions,
+        "monthly_completions": monthly_completions
+    }
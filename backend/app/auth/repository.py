@@ -1,4 +1,6 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from app.auth.models import User
 from app.preferences.models import UserPreference
 from typing import Optional
@@ -51,3 +53,15 @@ class UserRepository:
         self.db.commit()
         return True
 
+
+
+class AsyncUserRepository:
+    """Read queries of UserRepository on an AsyncSession; writes stay on the sync repository"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        """Get user by ID"""
+        result = await self.db.execute(select(User).where(User.id == user_id))
+        return result.scalars().first()
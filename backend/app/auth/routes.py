@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.auth.service import AuthService
 from app.auth.schemas import UserCreate, UserLogin, Token, UserResponse
 from app.shared.dependencies import get_current_user
@@ -55,11 +57,12 @@ async def login(
 @router.get("/me", response_model=UserResponse)
 async def get_me(
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Get current user information"""
-    auth_service = AuthService(db)
-    user_info = auth_service.get_current_user_info(current_user.id)
+    auth_service = AuthService(db, async_db)
+    user_info = await auth_service.aget_current_user_info(current_user.id)
     if not user_info:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,17 +1,19 @@
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from app.auth.repository import UserRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.repository import UserRepository, AsyncUserRepository
 from app.auth.schemas import UserCreate, UserLogin
 from app.shared.security import verify_password, get_password_hash, create_access_token
 from app.config import settings
-from app.redis_client import set_cache, get_cache, delete_cache
+from app.redis_client import set_cache, get_or_compute, aget_or_compute, delete_cache
 from fastapi import HTTPException, status
 from typing import Optional
 
 
 class AuthService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, async_db: Optional[AsyncSession] = None):
         self.user_repo = UserRepository(db)
+        self.async_user_repo = AsyncUserRepository(async_db) if async_db is not None else None
         self.db = db
     
     def register(self, user_data: UserCreate) -> dict:
@@ -106,18 +108,29 @@ class AuthService:
     
     def get_current_user_info(self, user_id: int) -> Optional[dict]:
         """Get current user information with caching"""
-        # Try cache first
-        cache_key = f"user:{user_id}"
-        cached_user = get_cache(cache_key)
-        if cached_user:
-            return cached_user
-        
-        # Get from database
+        # Cache for 30 minutes
+        return get_or_compute(
+            f"user:{user_id}",
+            lambda: self._load_user_info(user_id),
+            ttl=1800
+        )
+    
+    async def aget_current_user_info(self, user_id: int) -> Optional[dict]:
+        """Get current user information without blocking the event loop on Redis"""
+        load = self._aload_user_info if self.async_user_repo is not None else self._load_user_info
+        return await aget_or_compute(
+            f"user:{user_id}",
+            lambda: load(user_id),
+            ttl=1800
+        )
+    
+    def _load_user_info(self, user_id: int) -> Optional[dict]:
+        """Load user information from the database"""
         user = self.user_repo.get_by_id(user_id)
         if not user:
             return None
         
-        user_data = {
+        return {
             "id": user.id,
             "email": user.email,
             "username": user.username,
@@ -126,8 +139,19 @@ class AuthService:
             "is_verified": user.is_verified,
             "created_at": user.created_at.isoformat()
         }
+    
+    async def _aload_user_info(self, user_id: int) -> Optional[dict]:
+        """Load user information through the async engine"""
+        user = await self.async_user_repo.get_by_id(user_id)
+        if not user:
+            return None
         
-        # Cache for 30 minutes
-        set_cache(cache_key, user_data, expire=1800)
-        return user_data
-
+        return {
+            "id": user.id,
+            "email": user.email,
+            "username": user.username,
+            "full_name": user.full_name,
+            "is_active": user.is_active,
+            "is_verified": user.is_verified,
+            "created_at": user.created_at.isoformat()
+        }
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select
 from app.completions.models import HabitCompletion
 from typing import List, Optional
 from datetime import date, datetime, timedelta
@@ -51,26 +52,35 @@ class HabitCompletionRepository:
         
         return query.order_by(HabitCompletion.completion_date.desc()).all()
     
-    def create(self, completion_data: dict) -> HabitCompletion:
+    def create(self, completion_data: dict, commit: bool = True) -> HabitCompletion:
         """Create a new completion"""
         completion = HabitCompletion(**completion_data)
         self.db.add(completion)
+        if not commit:
+            self.db.flush()
+            return completion
         self.db.commit()
         self.db.refresh(completion)
         return completion
     
-    def update(self, completion: HabitCompletion, completion_data: dict) -> HabitCompletion:
+    def update(self, completion: HabitCompletion, completion_data: dict, commit: bool = True) -> HabitCompletion:
         """Update completion"""
         for key, value in completion_data.items():
             if value is not None:
                 setattr(completion, key, value)
+        if not commit:
+            self.db.flush()
+            return completion
         self.db.commit()
         self.db.refresh(completion)
         return completion
     
-    def delete(self, completion: HabitCompletion) -> bool:
+    def delete(self, completion: HabitCompletion, commit: bool = True) -> bool:
         """Delete completion"""
         self.db.delete(completion)
+        if not commit:
+            self.db.flush()
+            return True
         self.db.commit()
         return True
     
@@ -83,3 +93,35 @@ class HabitCompletionRepository:
             HabitCompletion.completion_date <= end_date
         ).scalar() or 0
 
+
+
+class AsyncHabitCompletionRepository:
+    """Read queries of HabitCompletionRepository on an AsyncSession; writes stay on the sync repository"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_by_id(self, completion_id: int, user_id: int) -> Optional[HabitCompletion]:
+        """Get completion by ID for a specific user"""
+        result = await self.db.execute(
+            select(HabitCompletion).where(
+                HabitCompletion.id == completion_id,
+                HabitCompletion.user_id == user_id
+            )
+        )
+        return result.scalars().first()
+    
+    async def get_by_habit(self, user_id: int, habit_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[HabitCompletion]:
+        """Get all completions for a habit"""
+        stmt = select(HabitCompletion).where(
+            HabitCompletion.user_id == user_id,
+            HabitCompletion.habit_id == habit_id
+        )
+        
+        if start_date:
+            stmt = stmt.where(HabitCompletion.completion_date >= start_date)
+        if end_date:
+            stmt = stmt.where(HabitCompletion.completion_date <= end_date)
+        
+        result = await self.db.execute(stmt.order_by(HabitCompletion.completion_date.desc()))
+        return list(result.scalars().all())
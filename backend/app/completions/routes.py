@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import date
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.completions.service import HabitCompletionService
 from app.completions.schemas import HabitCompletionCreate, HabitCompletionUpdate, HabitCompletionResponse
 from app.shared.dependencies import get_current_user
@@ -23,7 +24,7 @@ async def create_completion(
 ):
     """Create a new habit completion"""
     completion_service = HabitCompletionService(db)
-    return completion_service.create_completion(current_user.id, completion_data)
+    return await completion_service.acreate_completion(current_user.id, completion_data)
 
 
 @router.get("/habit/{habit_id}", response_model=List[HabitCompletionResponse])
@@ -34,11 +35,12 @@ async def get_habit_completions(
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Get all completions for a specific habit"""
-    completion_service = HabitCompletionService(db)
-    return completion_service.get_habit_completions(
+    completion_service = HabitCompletionService(db, async_db)
+    return await completion_service.aget_habit_completions(
         current_user.id,
         habit_id,
         start_date,
@@ -52,11 +54,12 @@ async def get_completion(
     completion_id: int,
     request: Request,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Get a specific completion"""
-    completion_service = HabitCompletionService(db)
-    completion = completion_service.get_completion(completion_id, current_user.id)
+    completion_service = HabitCompletionService(db, async_db)
+    completion = await completion_service.aget_completion(completion_id, current_user.id)
     if not completion:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -76,7 +79,7 @@ async def update_completion(
 ):
     """Update a completion"""
     completion_service = HabitCompletionService(db)
-    return completion_service.update_completion(completion_id, current_user.id, completion_data)
+    return await completion_service.aupdate_completion(completion_id, current_user.id, completion_data)
 
 
 @router.delete("/{completion_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -89,6 +92,6 @@ async def delete_completion(
 ):
     """Delete a completion"""
     completion_service = HabitCompletionService(db)
-    completion_service.delete_completion(completion_id, current_user.id)
+    await completion_service.adelete_completion(completion_id, current_user.id)
     return None
 
@@ -1,21 +1,57 @@
 from sqlalchemy.orm import Session
-from app.completions.repository import HabitCompletionRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.completions.repository import HabitCompletionRepository, AsyncHabitCompletionRepository
 from app.habits.repository import HabitRepository
+from app.analytics.repository import CompletionRollupRepository, AnalyticsSnapshotRepository
+from app.streaks.service import StreakService, STREAK_DIRTY_KEY
 from app.completions.schemas import HabitCompletionCreate, HabitCompletionUpdate
-from app.redis_client import get_cache, set_cache, delete_cache, delete_cache_pattern
+from app.redis_client import (
+    get_or_compute, aget_or_compute, versioned_key, aversioned_key, invalidate, ainvalidate
+)
 from fastapi import HTTPException, status
 from typing import List, Optional
 from datetime import date, timedelta
 
 
 class HabitCompletionService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, async_db: Optional[AsyncSession] = None):
         self.completion_repo = HabitCompletionRepository(db)
+        self.async_completion_repo = AsyncHabitCompletionRepository(async_db) if async_db is not None else None
         self.habit_repo = HabitRepository(db)
+        self.rollup_repo = CompletionRollupRepository(db)
+        self.snapshot_repo = AnalyticsSnapshotRepository(db)
+        self.streak_service = StreakService(db)
         self.db = db
     
+    def _apply_rollup_delta(self, user_id: int, habit_id: int, completion_date: date, delta: int) -> None:
+        """Update the daily rollup and drop the frozen snapshot of a closed month it touches"""
+        self.rollup_repo.apply_delta(user_id, habit_id, completion_date, delta)
+        today = date.today()
+        if completion_date < date(today.year, today.month, 1):
+            self.snapshot_repo.invalidate(user_id, date(completion_date.year, completion_date.month, 1))
+    
+    def _write_invalidations(self, user_id: int, habit_id: int) -> dict:
+        """Cache entries affected by any completion write, and the habit's mark for the streak job"""
+        return {
+            "namespaces": [f"completions:user:{user_id}"],
+            "stale_keys": [f"analytics:user:{user_id}", f"streaks:user:{user_id}"],
+            "set_members": {STREAK_DIRTY_KEY: [habit_id]}
+        }
+    
     def create_completion(self, user_id: int, completion_data: HabitCompletionCreate) -> dict:
         """Create a new completion"""
+        completion = self._create_completion(user_id, completion_data)
+        invalidate(**self._write_invalidations(user_id, completion["habit_id"]))
+        return completion
+    
+    async def acreate_completion(self, user_id: int, completion_data: HabitCompletionCreate) -> dict:
+        """Create a new completion, invalidating caches without blocking the event loop"""
+        completion = self._create_completion(user_id, completion_data)
+        await ainvalidate(**self._write_invalidations(user_id, completion["habit_id"]))
+        return completion
+    
+    def _create_completion(self, user_id: int, completion_data: HabitCompletionCreate) -> dict:
+        """Create a new completion in the database"""
         # Verify habit belongs to user
         habit = self.habit_repo.get_by_id(completion_data.habit_id, user_id)
         if not habit:
@@ -39,23 +75,19 @@ class HabitCompletionService:
         completion_dict = completion_data.model_dump()
         completion_dict["user_id"] = user_id
         
-        completion = self.completion_repo.create(completion_dict)
-        
-        # Invalidate cache
-        delete_cache_pattern(f"completions:user:{user_id}:*")
-        delete_cache_pattern(f"streaks:user:{user_id}:habit:{completion_data.habit_id}:*")
-        delete_cache(f"analytics:user:{user_id}")
-        delete_cache(f"streaks:user:{user_id}")
+        # Write the completion, its daily rollup, its streak and the habit's bitmap in one transaction
+        try:
+            completion = self.completion_repo.create(completion_dict, commit=False)
+            self._apply_rollup_delta(user_id, completion.habit_id, completion.completion_date, 1)
+            self.streak_service.completion_added(user_id, completion.habit_id, completion.completion_date)
+            self.habit_repo.set_completion_day(completion.habit_id, completion.completion_date, True)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self.db.refresh(completion)
         
-        return {
-            "id": completion.id,
-            "user_id": completion.user_id,
-            "habit_id": completion.habit_id,
-            "completion_date": completion.completion_date.isoformat(),
-            "notes": completion.notes,
-            "created_at": completion.created_at.isoformat(),
-            "updated_at": completion.updated_at.isoformat()
-        }
+        return _completion_to_dict(completion)
     
     def get_completion(self, completion_id: int, user_id: int) -> Optional[dict]:
         """Get a completion by ID"""
@@ -63,15 +95,18 @@ class HabitCompletionService:
         if not completion:
             return None
         
-        return {
-            "id": completion.id,
-            "user_id": completion.user_id,
-            "habit_id": completion.habit_id,
-            "completion_date": completion.completion_date.isoformat(),
-            "notes": completion.notes,
-            "created_at": completion.created_at.isoformat(),
-            "updated_at": completion.updated_at.isoformat()
-        }
+        return _completion_to_dict(completion)
+    
+    async def aget_completion(self, completion_id: int, user_id: int) -> Optional[dict]:
+        """Get a completion by ID, through the async engine when it is enabled"""
+        if self.async_completion_repo is None:
+            return self.get_completion(completion_id, user_id)
+        
+        completion = await self.async_completion_repo.get_by_id(completion_id, user_id)
+        if not completion:
+            return None
+        
+        return _completion_to_dict(completion)
     
     def get_habit_completions(
         self,
@@ -81,28 +116,49 @@ class HabitCompletionService:
         end_date: Optional[date] = None
     ) -> List[dict]:
         """Get all completions for a habit"""
-        cache_key = f"completions:user:{user_id}:habit:{habit_id}:{start_date}:{end_date}"
-        cached_completions = get_cache(cache_key)
-        if cached_completions:
-            return cached_completions
-        
-        completions = self.completion_repo.get_by_habit(user_id, habit_id, start_date, end_date)
-        completions_list = [
-            {
-                "id": completion.id,
-                "user_id": completion.user_id,
-                "habit_id": completion.habit_id,
-                "completion_date": completion.completion_date.isoformat(),
-                "notes": completion.notes,
-                "created_at": completion.created_at.isoformat(),
-                "updated_at": completion.updated_at.isoformat()
-            }
-            for completion in completions
-        ]
-        
         # Cache for 15 minutes
-        set_cache(cache_key, completions_list, expire=900)
-        return completions_list
+        return get_or_compute(
+            versioned_key(f"completions:user:{user_id}", f"habit:{habit_id}:{start_date}:{end_date}"),
+            lambda: self._load_habit_completions(user_id, habit_id, start_date, end_date),
+            ttl=900
+        )
+    
+    async def aget_habit_completions(
+        self,
+        user_id: int,
+        habit_id: int,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ) -> List[dict]:
+        """Get all completions for a habit without blocking the event loop on Redis"""
+        load = self._aload_habit_completions if self.async_completion_repo is not None else self._load_habit_completions
+        return await aget_or_compute(
+            await aversioned_key(f"completions:user:{user_id}", f"habit:{habit_id}:{start_date}:{end_date}"),
+            lambda: load(user_id, habit_id, start_date, end_date),
+            ttl=900
+        )
+    
+    def _load_habit_completions(
+        self,
+        user_id: int,
+        habit_id: int,
+        start_date: Optional[date],
+        end_date: Optional[date]
+    ) -> List[dict]:
+        """Load all completions for a habit from the database"""
+        completions = self.completion_repo.get_by_habit(user_id, habit_id, start_date, end_date)
+        return [_completion_to_dict(completion) for completion in completions]
+    
+    async def _aload_habit_completions(
+        self,
+        user_id: int,
+        habit_id: int,
+        start_date: Optional[date],
+        end_date: Optional[date]
+    ) -> List[dict]:
+        """Load all completions for a habit through the async engine"""
+        completions = await self.async_completion_repo.get_by_habit(user_id, habit_id, start_date, end_date)
+        return [_completion_to_dict(completion) for completion in completions]
     
     def update_completion(
         self,
@@ -111,6 +167,28 @@ class HabitCompletionService:
         completion_data: HabitCompletionUpdate
     ) -> dict:
         """Update a completion"""
+        completion = self._update_completion(completion_id, user_id, completion_data)
+        invalidate(**self._write_invalidations(user_id, completion["habit_id"]))
+        return completion
+    
+    async def aupdate_completion(
+        self,
+        completion_id: int,
+        user_id: int,
+        completion_data: HabitCompletionUpdate
+    ) -> dict:
+        """Update a completion, invalidating caches without blocking the event loop"""
+        completion = self._update_completion(completion_id, user_id, completion_data)
+        await ainvalidate(**self._write_invalidations(user_id, completion["habit_id"]))
+        return completion
+    
+    def _update_completion(
+        self,
+        completion_id: int,
+        user_id: int,
+        completion_data: HabitCompletionUpdate
+    ) -> dict:
+        """Update a completion in the database"""
         completion = self.completion_repo.get_by_id(completion_id, user_id)
         if not completion:
             raise HTTPException(
@@ -119,26 +197,41 @@ class HabitCompletionService:
             )
         
         update_data = completion_data.model_dump(exclude_unset=True)
-        completion = self.completion_repo.update(completion, update_data)
         
-        # Invalidate cache
-        delete_cache_pattern(f"completions:user:{user_id}:*")
-        delete_cache_pattern(f"streaks:user:{user_id}:habit:{completion.habit_id}:*")
-        delete_cache(f"analytics:user:{user_id}")
-        delete_cache(f"streaks:user:{user_id}")
+        # Move the completion between rollup days and streak runs if its date changes
+        old_date = completion.completion_date
+        new_date = update_data.get("completion_date")
+        try:
+            completion = self.completion_repo.update(completion, update_data, commit=False)
+            if new_date is not None and new_date != old_date:
+                self._apply_rollup_delta(user_id, completion.habit_id, old_date, -1)
+                self._apply_rollup_delta(user_id, completion.habit_id, new_date, 1)
+                self.streak_service.completion_removed(user_id, completion.habit_id, old_date)
+                self.streak_service.completion_added(user_id, completion.habit_id, new_date)
+                self.habit_repo.set_completion_day(completion.habit_id, old_date, False)
+                self.habit_repo.set_completion_day(completion.habit_id, new_date, True)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self.db.refresh(completion)
         
-        return {
-            "id": completion.id,
-            "user_id": completion.user_id,
-            "habit_id": completion.habit_id,
-            "completion_date": completion.completion_date.isoformat(),
-            "notes": completion.notes,
-            "created_at": completion.created_at.isoformat(),
-            "updated_at": completion.updated_at.isoformat()
-        }
+        return _completion_to_dict(completion)
     
     def delete_completion(self, completion_id: int, user_id: int) -> bool:
         """Delete a completion"""
+        habit_id = self._delete_completion(completion_id, user_id)
+        invalidate(**self._write_invalidations(user_id, habit_id))
+        return True
+    
+    async def adelete_completion(self, completion_id: int, user_id: int) -> bool:
+        """Delete a completion, invalidating caches without blocking the event loop"""
+        habit_id = self._delete_completion(completion_id, user_id)
+        await ainvalidate(**self._write_invalidations(user_id, habit_id))
+        return True
+    
+    def _delete_completion(self, completion_id: int, user_id: int) -> int:
+        """Delete a completion from the database, returning its habit id"""
         completion = self.completion_repo.get_by_id(completion_id, user_id)
         if not completion:
             raise HTTPException(
@@ -147,12 +240,30 @@ class HabitCompletionService:
             )
         
         habit_id = completion.habit_id
+        completion_date = completion.completion_date
         
-        # Invalidate cache
-        delete_cache_pattern(f"completions:user:{user_id}:*")
-        delete_cache_pattern(f"streaks:user:{user_id}:habit:{habit_id}:*")
-        delete_cache(f"analytics:user:{user_id}")
-        delete_cache(f"streaks:user:{user_id}")
+        # Remove the completion, its rollup entry, its place in the streak and its bitmap day in one transaction
+        try:
+            self.completion_repo.delete(completion, commit=False)
+            self._apply_rollup_delta(user_id, habit_id, completion_date, -1)
+            self.streak_service.completion_removed(user_id, habit_id, completion_date)
+            self.habit_repo.set_completion_day(habit_id, completion_date, False)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
         
-        return self.completion_repo.delete(completion)
+        return habit_id
+
 
+def _completion_to_dict(completion) -> dict:
+    """Serialize a completion for the cache and the API"""
+    return {
+        "id": completion.id,
+        "user_id": completion.user_id,
+        "habit_id": completion.habit_id,
+        "completion_date": completion.completion_date.isoformat(),
+        "notes": completion.notes,
+        "created_at": completion.created_at.isoformat(),
+        "updated_at": completion.updated_at.isoformat()
+    }
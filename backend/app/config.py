@@ -13,9 +13,46 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "habit_tracker"
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
+    ASYNC_DATABASE_ENABLED: bool = False  # Serve API reads through the asyncpg engine instead of psycopg2
+    DB_POOL_SIZE: int = 10  # Per process and engine (sync and async); the job worker runs with a smaller pool than API workers
+    DB_MAX_OVERFLOW: int = 20
+    DATABASE_VERIFY_ON_STARTUP: bool = True  # Wait for the database at import; off for scripts that bring their own engine
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50  # Sync pool, shared by request threads and background jobs
+    REDIS_ASYNC_MAX_CONNECTIONS: int = 100  # Asyncio pool, shared by requests in flight on the event loop
+    
+    # In-process L1 cache in front of Redis
+    CACHE_L1_ENABLED: bool = False
+    CACHE_L1_MAX_ENTRIES: int = 10000
+    CACHE_L1_TTL_SECONDS: int = 30
+    
+    # Cache payload format for writes ("json" or "msgpack"); reads accept every format.
+    # Roll out in steps: deploy with these defaults until no worker predates codecs, which cannot read
+    # compressed or msgpack entries, then set a compression threshold (e.g. 4096) and/or msgpack
+    CACHE_CODEC: str = "json"
+    CACHE_COMPRESSION_THRESHOLD: int = 0  # Bytes; larger payloads are zlib-compressed, 0 disables compression
+    
+    # Streak job engine: "sql" computes all habits in one set-based statement, "python" recomputes habit by habit
+    # from completion dates, "bitmap" from each habit's completion bitmap
+    STREAK_ENGINE: str = "sql"
+    STREAK_WORKERS: int = 1  # Processes for the streak job; habits are sharded by user_id
+    STREAK_BATCH_USERS: int = 1000  # Users per commit in a full streak pass
+    STREAK_UPSERT_BATCH_SIZE: int = 500  # Habits per upsert and commit with the "python" engine
+    
+    # Background jobs run only in the process holding this Redis lease; it is renewed every third of it
+    SCHEDULER_LEASE_SECONDS: int = 30
+    RUN_SCHEDULER_IN_API: bool = True  # Off when a separate `python -m app.jobs.worker` runs the jobs
+    WORKER_METRICS_PORT: int = 9100  # Prometheus endpoint of the job worker
+    
+    # Reminder delivery: the minute job queues due reminders on a Redis stream that delivery workers drain
+    REMINDER_SENDER: str = "log"  # "log" or "fake"; see app.reminders.senders
+    REMINDER_WORKER_CONCURRENCY: int = 20  # Sends in flight per delivery worker
+    REMINDER_BATCH_SIZE: int = 100  # Stream entries read per batch
+    REMINDER_MAX_ATTEMPTS: int = 5  # Attempts before a reminder is dead-lettered
+    REMINDER_RETRY_BASE_SECONDS: float = 5  # Backoff before the first retry; doubles with each attempt
+    REMINDER_CATCH_UP_MINUTES: int = 60  # Missed minutes a late or restarted minute job still queues
     
     # JWT
     SECRET_KEY: str
@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.exc import OperationalError
 from app.config import settings
 import logging
@@ -25,18 +26,22 @@ def mask_password(url: str) -> str:
 
 logger.info(f"Initializing database connection: {mask_password(settings.DATABASE_URL)}")
 
+def create_db_engine():
+    """Create the database engine; connections are opened lazily on first use"""
+    return create_engine(
+        settings.DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        connect_args={"connect_timeout": 5}
+    )
+
 # Create engine with connection retry logic
 def create_db_engine_with_retry(max_retries=30, retry_delay=1):
     """Create database engine with retry logic for startup"""
     for attempt in range(max_retries):
         try:
-            engine = create_engine(
-                settings.DATABASE_URL,
-                pool_pre_ping=True,
-                pool_size=10,
-                max_overflow=20,
-                connect_args={"connect_timeout": 5}
-            )
+            engine = create_db_engine()
             # Test the connection
             with engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
@@ -52,7 +57,10 @@ def create_db_engine_with_retry(max_retries=30, retry_delay=1):
                 raise
 
 try:
-    engine = create_db_engine_with_retry()
+    if settings.DATABASE_VERIFY_ON_STARTUP:
+        engine = create_db_engine_with_retry()
+    else:
+        engine = create_db_engine()
 except Exception as e:
     logger.error(f"Failed to create database engine: {e}")
     logger.error(f"DATABASE_URL value: {mask_password(settings.DATABASE_URL)}")
@@ -60,6 +68,27 @@ except Exception as e:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def async_database_url(url: str) -> str:
+    """Point a postgresql:// URL at the asyncpg driver"""
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+# Asyncio engine for async route handlers; connections are opened lazily on first use
+if settings.ASYNC_DATABASE_ENABLED:
+    async_engine = create_async_engine(
+        async_database_url(settings.DATABASE_URL),
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        connect_args={"timeout": 5}
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    logger.info("Async database engine enabled")
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
 Base = declarative_base()
 
 
@@ -72,6 +101,15 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency for getting an async database session, or None when the async engine is disabled"""
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def check_database_connection():
     """Check if database connection is working"""
     try:
@@ -0,0 +1,113 @@
+import numpy as np
+from typing import Dict, Iterable, Optional, Tuple
+from datetime import date, timedelta
+
+
+class CompletionBitmap:
+    """
+    A habit's completion history as one bit per day: bit i is set if the habit was completed on
+    origin + i days. Stored packed little-endian in Habit.completion_bitmap, with trailing empty days trimmed.
+    """
+    
+    def __init__(self, origin: date, bits: Optional[np.ndarray] = None):
+        self.origin = origin
+        self.bits = bits if bits is not None else np.zeros(0, dtype=bool)
+    
+    @classmethod
+    def from_bytes(cls, origin: date, payload: bytes) -> "CompletionBitmap":
+        """Unpack a stored bitmap"""
+        return cls(origin, np.unpackbits(np.frombuffer(payload, dtype=np.uint8), bitorder="little").astype(bool))
+    
+    @classmethod
+    def from_dates(cls, origin: date, completion_dates: Iterable[date]) -> "CompletionBitmap":
+        """Build a bitmap from completion dates, moving the origin back to the earliest one"""
+        completion_dates = list(completion_dates)
+        if not completion_dates:
+            return cls(origin)
+        origin = min(origin, min(completion_dates))
+        offsets = np.fromiter((
+            (completion_date - origin).days for completion_date in completion_dates
+        ), dtype=np.int64, count=len(completion_dates))
+        bits = np.zeros(int(offsets.max()) + 1, dtype=bool)
+        bits[offsets] = True
+        return cls(origin, bits)
+    
+    def to_bytes(self) -> bytes:
+        """Pack the bitmap for storage"""
+        completed = np.flatnonzero(self.bits)
+        length = int(completed[-1]) + 1 if len(completed) else 0
+        return np.packbits(self.bits[:length], bitorder="little").tobytes()
+    
+    def set(self, day: date, completed: bool) -> None:
+        """Mark a day completed or not, growing the bitmap in either direction as needed"""
+        offset = (day - self.origin).days
+        if offset < 0:
+            if not completed:
+                return
+            self.bits = np.concatenate([np.zeros(-offset, dtype=bool), self.bits])
+            self.origin = day
+            offset = 0
+        if offset >= len(self.bits):
+            if not completed:
+                return
+            self.bits = np.concatenate([self.bits, np.zeros(offset - len(self.bits) + 1, dtype=bool)])
+        self.bits[offset] = completed
+    
+    def is_empty(self) -> bool:
+        """Whether no day is completed"""
+        return not self.bits.any()
+    
+    def last_completion_date(self) -> Optional[date]:
+        """Latest completed day, which may be in the future"""
+        completed = np.flatnonzero(self.bits)
+        if not len(completed):
+            return None
+        return self.origin + timedelta(days=int(completed[-1]))
+    
+    def longest_streak(self) -> int:
+        """Length of the longest run of consecutive completed days"""
+        edges = np.diff(np.concatenate([[0], self.bits.astype(np.int8), [0]]))
+        starts = np.flatnonzero(edges == 1)
+        if not len(starts):
+            return 0
+        return int((np.flatnonzero(edges == -1) - starts).max())
+    
+    def current_streak(self, today: date) -> Tuple[int, Optional[date]]:
+        """Current streak and its newest date, with the same rules as compute_current_streak"""
+        today_offset = (today - self.origin).days
+        completed = np.flatnonzero(self.bits[:max(today_offset + 1, 0)])
+        if not len(completed) or completed[-1] < today_offset - 1:
+            return 0, None
+        # The chain tolerates one missed day: it ends at the last gap wider than two days
+        breaks = np.flatnonzero(np.diff(completed) > 2)
+        chain_start = int(breaks[-1]) + 1 if len(breaks) else 0
+        return len(completed) - chain_start, self.origin + timedelta(days=int(completed[-1]))
+    
+    def window(self, start: date, end: date) -> np.ndarray:
+        """Bits for each day from start to end inclusive, unset outside the stored range"""
+        days = max((end - start).days + 1, 0)
+        bits = np.zeros(days, dtype=bool)
+        low = (start - self.origin).days
+        first, last = max(low, 0), min(low + days, len(self.bits))
+        if first < last:
+            bits[first - low:last - low] = self.bits[first:last]
+        return bits
+    
+    def count(self, start: date, end: date) -> int:
+        """Completed days from start to end inclusive"""
+        return int(self.window(start, end).sum())
+    
+    def heatmap(self, start: date, end: date) -> Dict[str, int]:
+        """1 or 0 for each day from start to end inclusive, keyed by ISO date"""
+        return _by_day(start, self.window(start, end).astype(int))
+    
+    def rolling_counts(self, start: date, end: date, days: int) -> Dict[str, int]:
+        """Completed days in the trailing window of `days` days ending on each day from start to end"""
+        totals = np.concatenate([[0], np.cumsum(self.window(start - timedelta(days=days - 1), end), dtype=np.int64)])
+        return _by_day(start, totals[days:] - totals[:-days])
+
+
+def _by_day(start: date, values: np.ndarray) -> Dict[str, int]:
+    """Key a per-day array by ISO date from start"""
+    day_strings = np.datetime_as_string(np.datetime64(start, "D") + np.arange(len(values)), unit="D")
+    return dict(zip(day_strings.tolist(), values.tolist()))
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, Boolean, Date, DateTime, LargeBinary, ForeignKey, Enum
+from sqlalchemy.orm import relationship, deferred
 from app.database import Base
 from datetime import datetime
 import enum
@@ -24,6 +24,15 @@ class Habit(Base):
     icon = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     reminder_time = Column(String, nullable=True)  # HH:MM format
+    reminder_minute = Column(Integer, nullable=True)  # Local minute of day of reminder_time, kept by HabitService
+    # UTC minute bucket the reminder fires in, and the days its local date is ahead of the UTC date then;
+    # valid until the owner's timezone next changes offset (see app.reminders.service)
+    reminder_utc_minute = Column(Integer, nullable=True, index=True)
+    reminder_day_shift = Column(SmallInteger, nullable=True)
+    reminder_valid_until = Column(DateTime, nullable=True, index=True)
+    # Completion history, one bit per day from the origin (see app.habits.bitmap); NULL until first built
+    completion_bitmap = deferred(Column(LargeBinary, nullable=True))
+    completion_bitmap_origin = deferred(Column(Date, nullable=True))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -1,6 +1,11 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
 from app.habits.models import Habit
-from typing import List, Optional
+from app.habits.bitmap import CompletionBitmap
+from app.completions.models import HabitCompletion
+from typing import Dict, List, Optional
+from datetime import date
 
 
 class HabitRepository:
@@ -43,4 +48,86 @@ class HabitRepository:
         self.db.delete(habit)
         self.db.commit()
         return True
+    
+    def set_completion_day(self, habit_id: int, day: date, completed: bool) -> None:
+        """Set or clear a day in a habit's completion bitmap under a row lock (caller commits)"""
+        habit = self.db.query(Habit).filter(Habit.id == habit_id).with_for_update().populate_existing().first()
+        if habit is None:
+            return
+        
+        if habit.completion_bitmap is None:
+            # Never built: the completions table already reflects this write
+            bitmap = self._build_completion_bitmap(habit.id, habit.created_at.date())
+        else:
+            bitmap = CompletionBitmap.from_bytes(habit.completion_bitmap_origin, habit.completion_bitmap)
+            bitmap.set(day, completed)
+        habit.completion_bitmap = bitmap.to_bytes()
+        habit.completion_bitmap_origin = bitmap.origin
+        self.db.flush()
+    
+    def get_completion_bitmaps(self, habit_ids: List[int]) -> Dict[int, CompletionBitmap]:
+        """Get the completion bitmaps of several habits, building and saving any not built yet (caller commits)"""
+        rows = self.db.query(
+            Habit.id, Habit.created_at, Habit.completion_bitmap, Habit.completion_bitmap_origin
+        ).filter(Habit.id.in_(habit_ids)).all()
+        
+        bitmaps = {
+            row.id: CompletionBitmap.from_bytes(row.completion_bitmap_origin, row.completion_bitmap)
+            for row in rows if row.completion_bitmap is not None
+        }
+        missing = [row for row in rows if row.completion_bitmap is None]
+        if missing:
+            # Lock the unbuilt rows (in id order) so a completion write waits for the build and then
+            # updates the saved bitmap; a row another transaction built meanwhile is read, not rebuilt
+            locked = self.db.query(
+                Habit.id, Habit.created_at, Habit.completion_bitmap, Habit.completion_bitmap_origin
+            ).filter(Habit.id.in_([row.id for row in missing])).order_by(Habit.id).with_for_update().all()
+            bitmaps.update(
+                (row.id, CompletionBitmap.from_bytes(row.completion_bitmap_origin, row.completion_bitmap))
+                for row in locked if row.completion_bitmap is not None
+            )
+            missing = [row for row in locked if row.completion_bitmap is None]
+        if missing:
+            dates_by_habit = {}
+            for habit_id, completion_date in self.db.query(HabitCompletion.habit_id, HabitCompletion.completion_date).filter(
+                HabitCompletion.habit_id.in_([row.id for row in missing])
+            ):
+                dates_by_habit.setdefault(habit_id, []).append(completion_date)
+            for row in missing:
+                bitmaps[row.id] = CompletionBitmap.from_dates(row.created_at.date(), dates_by_habit.get(row.id, []))
+            self.db.execute(update(Habit), [
+                {"id": row.id, "completion_bitmap": bitmaps[row.id].to_bytes(), "completion_bitmap_origin": bitmaps[row.id].origin}
+                for row in missing
+            ])
+        return bitmaps
+    
+    def _build_completion_bitmap(self, habit_id: int, origin: date) -> CompletionBitmap:
+        """Build a habit's completion bitmap from its completions"""
+        rows = self.db.query(HabitCompletion.completion_date).filter(HabitCompletion.habit_id == habit_id).all()
+        return CompletionBitmap.from_dates(origin, [row.completion_date for row in rows])
 
+
+
+class AsyncHabitRepository:
+    """Read queries of HabitRepository on an AsyncSession; writes stay on the sync repository"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_by_id(self, habit_id: int, user_id: int) -> Optional[Habit]:
+        """Get habit by ID for a specific user"""
+        result = await self.db.execute(
+            select(Habit).where(
+                Habit.id == habit_id,
+                Habit.user_id == user_id
+            )
+        )
+        return result.scalars().first()
+    
+    async def get_all_by_user(self, user_id: int, active_only: bool = False) -> List[Habit]:
+        """Get all habits for a user"""
+        stmt = select(Habit).where(Habit.user_id == user_id)
+        if active_only:
+            stmt = stmt.where(Habit.is_active == True)
+        result = await self.db.execute(stmt.order_by(Habit.created_at.desc()))
+        return list(result.scalars().all())
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.database import get_db, get_async_db
 from app.habits.service import HabitService
 from app.habits.schemas import HabitCreate, HabitUpdate, HabitResponse
 from app.shared.dependencies import get_current_user
@@ -22,7 +23,7 @@ async def create_habit(
 ):
     """Create a new habit"""
     habit_service = HabitService(db)
-    return habit_service.create_habit(current_user.id, habit_data)
+    return await habit_service.acreate_habit(current_user.id, habit_data)
 
 
 @router.get("", response_model=List[HabitResponse])
@@ -31,11 +32,12 @@ async def get_habits(
     request: Request,
     active_only: bool = False,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Get all habits for the current user"""
-    habit_service = HabitService(db)
-    return habit_service.get_user_habits(current_user.id, active_only)
+    habit_service = HabitService(db, async_db)
+    return await habit_service.aget_user_habits(current_user.id, active_only)
 
 
 @router.get("/{habit_id}", response_model=HabitResponse)
@@ -44,11 +46,12 @@ async def get_habit(
     habit_id: int,
     request: Request,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Get a specific habit"""
-    habit_service = HabitService(db)
-    habit = habit_service.get_habit(habit_id, current_user.id)
+    habit_service = HabitService(db, async_db)
+    habit = await habit_service.aget_habit(habit_id, current_user.id)
     if not habit:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -68,7 +71,7 @@ async def update_habit(
 ):
     """Update a habit"""
     habit_service = HabitService(db)
-    return habit_service.update_habit(habit_id, current_user.id, habit_data)
+    return await habit_service.aupdate_habit(habit_id, current_user.id, habit_data)
 
 
 @router.delete("/{habit_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -81,6 +84,6 @@ async def delete_habit(
 ):
     """Delete a habit"""
     habit_service = HabitService(db)
-    habit_service.delete_habit(habit_id, current_user.id)
+    await habit_service.adelete_habit(habit_id, current_user.id)
     return None
 
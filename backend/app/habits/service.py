@@ -1,105 +1,138 @@
 from sqlalchemy.orm import Session
-from app.habits.repository import HabitRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.habits.repository import HabitRepository, AsyncHabitRepository
+from app.analytics.repository import CompletionRollupRepository, AnalyticsSnapshotRepository
 from app.habits.schemas import HabitCreate, HabitUpdate
-from app.redis_client import get_cache, set_cache, delete_cache, delete_cache_pattern
+from app.streaks.service import STREAK_DIRTY_KEY
+from app.reminders.service import ReminderService
+from app.redis_client import (
+    get_or_compute, aget_or_compute, versioned_key, aversioned_key, invalidate, ainvalidate
+)
 from fastapi import HTTPException, status
 from typing import List, Optional
+from datetime import date
+import re
+
+# Reminder times the reminder index understands, as "H:MM" or "HH:MM"
+REMINDER_TIME_PATTERN = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
 
 
 class HabitService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, async_db: Optional[AsyncSession] = None):
         self.habit_repo = HabitRepository(db)
+        self.async_habit_repo = AsyncHabitRepository(async_db) if async_db is not None else None
+        self.rollup_repo = CompletionRollupRepository(db)
+        self.snapshot_repo = AnalyticsSnapshotRepository(db)
+        self.reminder_service = ReminderService(db)
         self.db = db
     
     def create_habit(self, user_id: int, habit_data: HabitCreate) -> dict:
         """Create a new habit"""
+        habit = self._create_habit(user_id, habit_data)
+        invalidate(**self._create_invalidations(user_id, habit["id"]))
+        return habit
+    
+    async def acreate_habit(self, user_id: int, habit_data: HabitCreate) -> dict:
+        """Create a new habit, invalidating caches without blocking the event loop"""
+        habit = self._create_habit(user_id, habit_data)
+        await ainvalidate(**self._create_invalidations(user_id, habit["id"]))
+        return habit
+    
+    def _create_habit(self, user_id: int, habit_data: HabitCreate) -> dict:
+        """Create a new habit in the database"""
         habit_dict = habit_data.model_dump()
         habit_dict["user_id"] = user_id
+        habit_dict["reminder_minute"] = reminder_minute(habit_dict.get("reminder_time"))
+        habit_dict.update(self.reminder_service.schedule(user_id, habit_dict["reminder_minute"]))
         
         habit = self.habit_repo.create(habit_dict)
         
-        # Invalidate cache
-        delete_cache_pattern(f"habits:user:{user_id}:*")
-        delete_cache(f"habit:{habit.id}")
-        
+        return _habit_to_dict(habit)
+    
+    def _create_invalidations(self, user_id: int, habit_id: int) -> dict:
+        """Cache entries affected by creating a habit"""
         return {
-            "id": habit.id,
-            "user_id": habit.user_id,
-            "name": habit.name,
-            "description": habit.description,
-            "frequency": habit.frequency.value,
-            "target_days": habit.target_days,
-            "color": habit.color,
-            "icon": habit.icon,
-            "is_active": habit.is_active,
-            "reminder_time": habit.reminder_time,
-            "created_at": habit.created_at.isoformat(),
-            "updated_at": habit.updated_at.isoformat()
+            "keys": [f"habit:{habit_id}"],
+            "namespaces": [f"habits:user:{user_id}"],
+            "stale_keys": [f"analytics:user:{user_id}"]
         }
     
     def get_habit(self, habit_id: int, user_id: int) -> Optional[dict]:
         """Get a habit by ID"""
-        # Try cache first
-        cache_key = f"habit:{habit_id}"
-        cached_habit = get_cache(cache_key)
-        if cached_habit and cached_habit.get("user_id") == user_id:
-            return cached_habit
-        
-        habit = self.habit_repo.get_by_id(habit_id, user_id)
-        if not habit:
-            return None
-        
-        habit_dict = {
-            "id": habit.id,
-            "user_id": habit.user_id,
-            "name": habit.name,
-            "description": habit.description,
-            "frequency": habit.frequency.value,
-            "target_days": habit.target_days,
-            "color": habit.color,
-            "icon": habit.icon,
-            "is_active": habit.is_active,
-            "reminder_time": habit.reminder_time,
-            "created_at": habit.created_at.isoformat(),
-            "updated_at": habit.updated_at.isoformat()
-        }
-        
         # Cache for 1 hour
-        set_cache(cache_key, habit_dict, expire=3600)
-        return habit_dict
+        habit_dict = get_or_compute(
+            f"habit:{habit_id}",
+            lambda: self._load_habit(habit_id, user_id),
+            ttl=3600
+        )
+        if habit_dict and habit_dict.get("user_id") == user_id:
+            return habit_dict
+        return None
+    
+    async def aget_habit(self, habit_id: int, user_id: int) -> Optional[dict]:
+        """Get a habit by ID without blocking the event loop on Redis"""
+        load = self._aload_habit if self.async_habit_repo is not None else self._load_habit
+        habit_dict = await aget_or_compute(
+            f"habit:{habit_id}",
+            lambda: load(habit_id, user_id),
+            ttl=3600
+        )
+        if habit_dict and habit_dict.get("user_id") == user_id:
+            return habit_dict
+        return None
+    
+    def _load_habit(self, habit_id: int, user_id: int) -> Optional[dict]:
+        """Load a habit from the database"""
+        habit = self.habit_repo.get_by_id(habit_id, user_id)
+        return _habit_to_dict(habit) if habit else None
+    
+    async def _aload_habit(self, habit_id: int, user_id: int) -> Optional[dict]:
+        """Load a habit through the async engine"""
+        habit = await self.async_habit_repo.get_by_id(habit_id, user_id)
+        return _habit_to_dict(habit) if habit else None
     
     def get_user_habits(self, user_id: int, active_only: bool = False) -> List[dict]:
         """Get all habits for a user"""
-        cache_key = f"habits:user:{user_id}:active:{active_only}"
-        cached_habits = get_cache(cache_key)
-        if cached_habits:
-            return cached_habits
-        
-        habits = self.habit_repo.get_all_by_user(user_id, active_only)
-        habits_list = [
-            {
-                "id": habit.id,
-                "user_id": habit.user_id,
-                "name": habit.name,
-                "description": habit.description,
-                "frequency": habit.frequency.value,
-                "target_days": habit.target_days,
-                "color": habit.color,
-                "icon": habit.icon,
-                "is_active": habit.is_active,
-                "reminder_time": habit.reminder_time,
-                "created_at": habit.created_at.isoformat(),
-                "updated_at": habit.updated_at.isoformat()
-            }
-            for habit in habits
-        ]
-        
         # Cache for 30 minutes
-        set_cache(cache_key, habits_list, expire=1800)
-        return habits_list
+        return get_or_compute(
+            versioned_key(f"habits:user:{user_id}", f"active:{active_only}"),
+            lambda: self._load_user_habits(user_id, active_only),
+            ttl=1800
+        )
+    
+    async def aget_user_habits(self, user_id: int, active_only: bool = False) -> List[dict]:
+        """Get all habits for a user without blocking the event loop on Redis"""
+        load = self._aload_user_habits if self.async_habit_repo is not None else self._load_user_habits
+        return await aget_or_compute(
+            await aversioned_key(f"habits:user:{user_id}", f"active:{active_only}"),
+            lambda: load(user_id, active_only),
+            ttl=1800
+        )
+    
+    def _load_user_habits(self, user_id: int, active_only: bool) -> List[dict]:
+        """Load all habits for a user from the database"""
+        habits = self.habit_repo.get_all_by_user(user_id, active_only)
+        return [_habit_to_dict(habit) for habit in habits]
+    
+    async def _aload_user_habits(self, user_id: int, active_only: bool) -> List[dict]:
+        """Load all habits for a user through the async engine"""
+        habits = await self.async_habit_repo.get_all_by_user(user_id, active_only)
+        return [_habit_to_dict(habit) for habit in habits]
     
     def update_habit(self, habit_id: int, user_id: int, habit_data: HabitUpdate) -> dict:
         """Update a habit"""
+        habit = self._update_habit(habit_id, user_id, habit_data)
+        invalidate(**self._update_invalidations(user_id, habit_id))
+        return habit
+    
+    async def aupdate_habit(self, habit_id: int, user_id: int, habit_data: HabitUpdate) -> dict:
+        """Update a habit, invalidating caches without blocking the event loop"""
+        habit = self._update_habit(habit_id, user_id, habit_data)
+        await ainvalidate(**self._update_invalidations(user_id, habit_id))
+        return habit
+    
+    def _update_habit(self, habit_id: int, user_id: int, habit_data: HabitUpdate) -> dict:
+        """Update a habit in the database"""
         habit = self.habit_repo.get_by_id(habit_id, user_id)
         if not habit:
             raise HTTPException(
@@ -108,29 +141,38 @@ class HabitService:
             )
         
         update_data = habit_data.model_dump(exclude_unset=True)
+        if update_data.get("reminder_time") is not None:
+            # Set directly: the repository skips None, which would leave an invalid time at its old minute
+            habit.reminder_minute = reminder_minute(update_data["reminder_time"])
+            for column, value in self.reminder_service.schedule(user_id, habit.reminder_minute).items():
+                setattr(habit, column, value)
         habit = self.habit_repo.update(habit, update_data)
         
-        # Invalidate cache
-        delete_cache(f"habit:{habit.id}")
-        delete_cache_pattern(f"habits:user:{user_id}:*")
-        
+        return _habit_to_dict(habit)
+    
+    def _update_invalidations(self, user_id: int, habit_id: int) -> dict:
+        """Cache entries affected by updating a habit; (de)activating it also changes what the streak job covers"""
         return {
-            "id": habit.id,
-            "user_id": habit.user_id,
-            "name": habit.name,
-            "description": habit.description,
-            "frequency": habit.frequency.value,
-            "target_days": habit.target_days,
-            "color": habit.color,
-            "icon": habit.icon,
-            "is_active": habit.is_active,
-            "reminder_time": habit.reminder_time,
-            "created_at": habit.created_at.isoformat(),
-            "updated_at": habit.updated_at.isoformat()
+            "keys": [f"habit:{habit_id}"],
+            "namespaces": [f"habits:user:{user_id}"],
+            "stale_keys": [f"analytics:user:{user_id}", f"streaks:user:{user_id}"],
+            "set_members": {STREAK_DIRTY_KEY: [habit_id]}
         }
     
     def delete_habit(self, habit_id: int, user_id: int) -> bool:
         """Delete a habit"""
+        deleted = self._delete_habit(habit_id, user_id)
+        invalidate(**self._delete_invalidations(user_id, habit_id))
+        return deleted
+    
+    async def adelete_habit(self, habit_id: int, user_id: int) -> bool:
+        """Delete a habit, invalidating caches without blocking the event loop"""
+        deleted = self._delete_habit(habit_id, user_id)
+        await ainvalidate(**self._delete_invalidations(user_id, habit_id))
+        return deleted
+    
+    def _delete_habit(self, habit_id: int, user_id: int) -> bool:
+        """Delete a habit from the database"""
         habit = self.habit_repo.get_by_id(habit_id, user_id)
         if not habit:
             raise HTTPException(
@@ -138,10 +180,44 @@ class HabitService:
                 detail="Habit not found"
             )
         
-        # Invalidate cache
-        delete_cache(f"habit:{habit.id}")
-        delete_cache_pattern(f"habits:user:{user_id}:*")
-        delete_cache_pattern(f"streaks:user:{user_id}:habit:{habit_id}:*")
-        
+        # Completions are removed by cascade, so take them out of the rollup and snapshots in the same transaction.
+        # Every closed month since the habit's first day lists it, even without completions
+        days = self.rollup_repo.remove_habit(user_id, habit_id)
+        self.snapshot_repo.invalidate_closed_months(user_id, min([habit.created_at.date(), *days]), date.today())
         return self.habit_repo.delete(habit)
+    
+    def _delete_invalidations(self, user_id: int, habit_id: int) -> dict:
+        """Cache entries affected by deleting a habit and its completions"""
+        return {
+            "keys": [f"habit:{habit_id}"],
+            "namespaces": [f"habits:user:{user_id}", f"completions:user:{user_id}"],
+            "stale_keys": [f"analytics:user:{user_id}", f"streaks:user:{user_id}"]
+        }
+
+
+def _habit_to_dict(habit) -> dict:
+    """Serialize a habit for the cache and the API"""
+    return {
+        "id": habit.id,
+        "user_id": habit.user_id,
+        "name": habit.name,
+        "description": habit.description,
+        "frequency": habit.frequency.value,
+        "target_days": habit.target_days,
+        "color": habit.color,
+        "icon": habit.icon,
+        "is_active": habit.is_active,
+        "reminder_time": habit.reminder_time,
+        "created_at": habit.created_at.isoformat(),
+        "updated_at": habit.updated_at.isoformat()
+    }
+
 
+def reminder_minute(reminder_time: Optional[str]) -> Optional[int]:
+    """Minute of day of an "HH:MM" reminder time, or None if it is missing or malformed"""
+    if not reminder_time:
+        return None
+    match = REMINDER_TIME_PATTERN.match(reminder_time)
+    if not match:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
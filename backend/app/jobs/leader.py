@@ -0,0 +1,136 @@
+from prometheus_client import Gauge
+from app.config import settings
+from app.redis_client import redis_client, _RELEASE_LOCK_SCRIPT
+from typing import Callable, Optional
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Redis key holding the identity of the process that runs scheduled jobs
+SCHEDULER_LEADER_KEY = "scheduler:leader"
+
+# Every scheduler skips missed runs beyond the latest and never overlaps a job with itself
+JOB_DEFAULTS = {"coalesce": True, "max_instances": 1, "misfire_grace_time": 300}
+
+# Take the lease if it is free, or extend it if we already hold it
+_ACQUIRE_OR_RENEW_SCRIPT = """
+local holder = redis.call('get', KEYS[1])
+if not holder then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+if holder == ARGV[1] then
+    redis.call('pexpire', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+scheduler_leader = Gauge(
+    "scheduler_leader",
+    "1 while this instance holds the scheduler lease and runs background jobs",
+    ["instance"]
+)
+
+
+class LeaderElection:
+    """
+    Redis lease held by one process in the cluster. Every process campaigns on a background
+    thread, renewing every third of the lease; if the holder dies, another takes over once it expires.
+    """
+    
+    def __init__(self, key: str, lease_seconds: int):
+        self.key = key
+        self.lease_seconds = lease_seconds
+        self.identity = _instance_identity()
+        self._lease_deadline = 0.0
+        self._leader = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def is_leader(self) -> bool:
+        """Whether our last acquisition or renewal guarantees we still hold the lease"""
+        return time.monotonic() < self._lease_deadline
+    
+    def start(self) -> None:
+        """Start campaigning for the lease"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        # A worker forked after import must not share its parent's identity
+        self.identity = _instance_identity()
+        scheduler_leader.labels(instance=self.identity).set(0)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler-leader", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop campaigning and hand the lease back so another instance takes over at once"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._leader:
+            try:
+                redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, self.key, self.identity)
+            except Exception as e:
+                logger.warning(f"Error releasing scheduler lease: {e}")
+        self._lease_deadline = 0.0
+        self._set_leader(False)
+    
+    def campaign(self) -> bool:
+        """Acquire or renew the lease once; returns whether we hold it"""
+        started = time.monotonic()
+        try:
+            held = bool(redis_client.eval(
+                _ACQUIRE_OR_RENEW_SCRIPT, 1, self.key, self.identity, self.lease_seconds * 1000
+            ))
+        except Exception as e:
+            # Keep acting as leader until the lease we last confirmed runs out
+            logger.warning(f"Scheduler lease renewal error: {e}")
+            held = self.is_leader()
+        else:
+            # Measured from before the call, so the lease never outlives our view of it
+            self._lease_deadline = started + self.lease_seconds if held else 0.0
+        
+        self._set_leader(held)
+        return held
+    
+    def _run(self) -> None:
+        """Campaign until stopped"""
+        while not self._stop.is_set():
+            self.campaign()
+            self._stop.wait(self.lease_seconds / 3)
+    
+    def _set_leader(self, leader: bool) -> None:
+        """Record a change of leadership in the log and the gauge"""
+        if leader == self._leader:
+            return
+        self._leader = leader
+        scheduler_leader.labels(instance=self.identity).set(1 if leader else 0)
+        if leader:
+            logger.info(f"Acquired scheduler leadership as {self.identity}")
+        else:
+            logger.info(f"Lost scheduler leadership as {self.identity}")
+
+
+def _instance_identity() -> str:
+    """Identity of this process in the lease and the gauge"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+leader_election = LeaderElection(SCHEDULER_LEADER_KEY, settings.SCHEDULER_LEASE_SECONDS)
+
+
+def leader_only(job: Callable) -> Callable:
+    """Wrap a scheduled job so it only runs in the process holding the scheduler lease"""
+    @functools.wraps(job)
+    def run(*args, **kwargs):
+        if not leader_election.is_leader():
+            return None
+        return job(*args, **kwargs)
+    return run
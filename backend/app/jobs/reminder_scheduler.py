@@ -1,89 +1,54 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from sqlalchemy.orm import Session
 from app.database import SessionLocal
-from app.habits.repository import HabitRepository
-from app.preferences.models import UserPreference
-from app.completions.repository import HabitCompletionRepository
-from datetime import date, datetime, time
+from app.reminders.repository import ReminderRepository
+from app.reminders.service import ReminderService
+from app.reminders.delivery import enqueue_reminders
+from app.jobs.leader import leader_only, JOB_DEFAULTS
+from app.redis_client import redis_client
+from app.config import settings
+from typing import List
+from datetime import datetime, timedelta, timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
-
-def send_reminder(user_id: int, habit_id: int, habit_name: str, reminder_time: str):
-    """Send reminder for a habit (placeholder for email/push notification)"""
-    try:
-        # TODO: Integrate with email service (SendGrid, SES) or push notification service
-        # For now, just log the reminder
-        logger.info(f"Reminder: User {user_id} should complete habit '{habit_name}' (ID: {habit_id}) at {reminder_time}")
-        
-        # Example: Send email
-        # email_service.send_reminder(user_email, habit_name, reminder_time)
-        
-        # Example: Send push notification
-        # push_service.send_notification(user_id, f"Don't forget: {habit_name}")
-        
-    except Exception as e:
-        logger.error(f"Error sending reminder: {e}")
+# UTC minute (minutes since the epoch) whose reminders the minute job last queued
+REMINDER_LAST_MINUTE_KEY = "reminders:last_minute"
 
 
 def check_and_send_reminders():
-    """Check for habits that need reminders and send them"""
+    """
+    Queue reminders for habits due in every minute since the last one processed, up to the current
+    one; delivery workers send them. Minutes a late or missed tick skipped are caught up, and the
+    send ledger drops reminders queued twice.
+    """
     db = None
     try:
         db = SessionLocal()
-        from app.habits.models import Habit
         
-        # Get current time
-        now = datetime.now()
-        current_time = now.strftime("%H:%M")
-        today = date.today()
+        # Reminders are bucketed by UTC minute; move the buckets a DST change has made stale first
+        now = datetime.now(timezone.utc)
+        rescheduled = ReminderService(db).reschedule_expired(now)
+        if rescheduled:
+            logger.info(f"Rescheduled {rescheduled} reminders after a timezone offset change")
         
-        # Get all active habits with reminders enabled
-        habits = db.query(Habit).filter(
-            Habit.is_active == True,
-            Habit.reminder_time.isnot(None)
-        ).all()
-        
-        for habit in habits:
-            # Check if reminder time matches current time (within 1 minute window)
-            reminder_time = habit.reminder_time
-            if reminder_time:
-                # Parse reminder time
-                try:
-                    reminder_hour, reminder_minute = map(int, reminder_time.split(":"))
-                    reminder_datetime = datetime.now().replace(hour=reminder_hour, minute=reminder_minute, second=0, microsecond=0)
-                    
-                    # Check if it's time to send reminder (within 1 minute)
-                    time_diff = abs((now - reminder_datetime).total_seconds())
-                    if time_diff <= 60:  # Within 1 minute
-                        # Check user preferences
-                        user_pref = db.query(UserPreference).filter(
-                            UserPreference.user_id == habit.user_id
-                        ).first()
-                        
-                        if user_pref and user_pref.reminder_enabled:
-                            # Check if habit is already completed today
-                            completion_repo = HabitCompletionRepository(db)
-                            today_completion = completion_repo.get_by_date(
-                                habit.user_id,
-                                habit.id,
-                                today
-                            )
-                            
-                            if not today_completion:
-                                # Send reminder
-                                send_reminder(
-                                    habit.user_id,
-                                    habit.id,
-                                    habit.name,
-                                    reminder_time
-                                )
-                                logger.info(f"Sent reminder for habit {habit.id} to user {habit.user_id}")
-                
-                except ValueError:
-                    logger.warning(f"Invalid reminder time format for habit {habit.id}: {reminder_time}")
+        current_minute = now.replace(second=0, microsecond=0)
+        queued = 0
+        for minute in minutes_to_process(current_minute):
+            # Due habits, their owners' preferences and completions on their local date in one query
+            reminders = ReminderRepository(db).get_due(minute.hour * 60 + minute.minute, minute.date())
+            
+            queued += enqueue_reminders({
+                "habit_id": reminder.habit_id,
+                "user_id": reminder.user_id,
+                "habit_name": reminder.name,
+                "reminder_time": reminder.reminder_time,
+                "date": (minute.date() + timedelta(days=reminder.reminder_day_shift)).isoformat()
+            } for reminder in reminders)
+        save_last_processed_minute(current_minute)
+        if queued:
+            logger.info(f"Queued {queued} reminders for delivery")
         
     except Exception as e:
         logger.error(f"Error in check_and_send_reminders: {e}", exc_info=True)
@@ -95,19 +60,53 @@ def check_and_send_reminders():
                 logger.error(f"Error closing database session: {e}")
 
 
+def minutes_to_process(current_minute: datetime) -> List[datetime]:
+    """
+    UTC minutes after the last processed one, up to and including the current one, going back at
+    most REMINDER_CATCH_UP_MINUTES. Just the current minute when none was processed or Redis fails.
+    """
+    try:
+        last = redis_client.get(REMINDER_LAST_MINUTE_KEY)
+    except Exception as e:
+        logger.warning(f"Reminder catch-up unavailable, processing the current minute only: {e}")
+        last = None
+    if last is None:
+        return [current_minute]
+    
+    missed = (current_minute - datetime.fromtimestamp(int(last) * 60, timezone.utc)) // timedelta(minutes=1)
+    if missed > settings.REMINDER_CATCH_UP_MINUTES:
+        logger.warning(
+            f"Skipping {missed - settings.REMINDER_CATCH_UP_MINUTES} reminder minutes older than "
+            f"{settings.REMINDER_CATCH_UP_MINUTES} minutes"
+        )
+        missed = settings.REMINDER_CATCH_UP_MINUTES
+    return [current_minute - timedelta(minutes=i) for i in range(max(missed, 1) - 1, -1, -1)]
+
+
+def save_last_processed_minute(minute: datetime) -> None:
+    """Record the last UTC minute whose reminders were queued, for the next tick to continue from"""
+    try:
+        redis_client.set(REMINDER_LAST_MINUTE_KEY, int(minute.timestamp()) // 60)
+    except Exception as e:
+        logger.warning(f"Error saving the last processed reminder minute: {e}")
+
+
 def start_reminder_scheduler():
     """Start the reminder scheduler"""
-    scheduler = BackgroundScheduler()
-    
+    scheduler = BackgroundScheduler(job_defaults=JOB_DEFAULTS)
+    register_reminder_jobs(scheduler)
+    scheduler.start()
+    logger.info("Reminder scheduler started")
+
+
+def register_reminder_jobs(scheduler) -> None:
+    """Add the reminder jobs to a scheduler"""
     # Run every minute to check for reminders
     scheduler.add_job(
-        check_and_send_reminders,
+        leader_only(check_and_send_reminders),
         trigger=CronTrigger(minute="*"),  # Run every minute
         id='reminder_scheduler',
         name='Check and send habit reminders',
         replace_existing=True
     )
-    
-    scheduler.start()
-    logger.info("Reminder scheduler started")
 
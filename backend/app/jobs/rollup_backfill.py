@@ -0,0 +1,43 @@
+from sqlalchemy import distinct
+from app.database import SessionLocal
+from app.auth.models import User
+from app.analytics.repository import CompletionRollupRepository
+from typing import Optional
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_completion_rollup(user_id: Optional[int] = None) -> int:
+    """Rebuild completion_daily_rollup from habit_completions, one user per transaction"""
+    db = SessionLocal()
+    try:
+        rollup_repo = CompletionRollupRepository(db)
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            user_ids = [row[0] for row in db.query(distinct(User.id)).order_by(User.id).all()]
+        
+        total_rows = 0
+        for uid in user_ids:
+            try:
+                total_rows += rollup_repo.rebuild_user(uid)
+                db.commit()
+            except Exception as e:
+                logger.error(f"Error rebuilding completion rollup for user {uid}: {e}")
+                db.rollback()
+        
+        logger.info(f"Rebuilt {total_rows} completion rollup rows for {len(user_ids)} users")
+        return total_rows
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the completion daily rollup table")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's rollup")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    backfill_completion_rollup(args.user_id)
@@ -1,143 +1,278 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from sqlalchemy.orm import Session
+from sqlalchemy import func
+from app.config import settings
 from app.database import SessionLocal
+from app.habits.models import Habit
+from app.preferences.models import UserPreference
 from app.habits.repository import HabitRepository
-from app.completions.repository import HabitCompletionRepository
-from app.streaks.models import Streak
-from app.redis_client import delete_cache_pattern
-from datetime import date, timedelta
+from app.streaks.repository import StreakRepository
+from app.streaks.service import (
+    StreakService, StreakWriter, claim_dirty_habits, release_dirty_habits, invalidate_streak_caches
+)
+from app.jobs.leader import leader_only, JOB_DEFAULTS
+from app.redis_client import redis_client
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Set, Tuple
+from datetime import datetime, timezone
+import multiprocessing
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Unix time of the last streak rollover; each run resets only the timezones whose midnight passed since
+STREAK_ROLLOVER_LAST_RUN_KEY = "streaks:rollover:last_run"
+
 
 def calculate_streak_for_habit(db: Session, user_id: int, habit_id: int):
-    """Calculate streak for a specific habit"""
+    """Recalculate streak for a specific habit from its full history"""
     try:
-        completion_repo = HabitCompletionRepository(db)
-        habit_repo = HabitRepository(db)
-        
-        # Get all completions for this habit, ordered by date
-        completions = completion_repo.get_by_habit(user_id, habit_id)
-        completion_dates = sorted([c.completion_date for c in completions], reverse=True)
-        
-        if not completion_dates:
-            # No completions, reset streak
-            streak = db.query(Streak).filter(
-                Streak.user_id == user_id,
-                Streak.habit_id == habit_id
-            ).first()
-            
-            if streak:
-                streak.current_streak = 0
-                streak.last_completion_date = None
-                streak.streak_start_date = None
-                db.commit()
-            return
-        
-        # Calculate current streak
-        today = date.today()
-        current_streak = 0
-        longest_streak = 0
-        last_completion_date = completion_dates[0]
-        streak_start_date = None
-        
-        # Calculate longest streak
-        temp_streak = 1
-        longest_start = completion_dates[0]
-        for i in range(1, len(completion_dates)):
-            if (completion_dates[i-1] - completion_dates[i]).days == 1:
-                temp_streak += 1
-            else:
-                if temp_streak > longest_streak:
-                    longest_streak = temp_streak
-                temp_streak = 1
-        if temp_streak > longest_streak:
-            longest_streak = temp_streak
-        
-        # Calculate current streak from today backwards
-        expected_date = today
-        for completion_date in completion_dates:
-            if completion_date == expected_date or completion_date == expected_date - timedelta(days=1):
-                if current_streak == 0:
-                    streak_start_date = completion_date
-                current_streak += 1
-                expected_date = completion_date - timedelta(days=1)
-            elif completion_date < expected_date:
-                break
-        
-        # Get or create streak record
-        streak = db.query(Streak).filter(
-            Streak.user_id == user_id,
-            Streak.habit_id == habit_id
-        ).first()
-        
-        if not streak:
-            streak = Streak(
-                user_id=user_id,
-                habit_id=habit_id,
-                current_streak=current_streak,
-                longest_streak=longest_streak,
-                last_completion_date=last_completion_date,
-                streak_start_date=streak_start_date
-            )
-            db.add(streak)
-        else:
-            streak.current_streak = current_streak
-            streak.longest_streak = max(streak.longest_streak, longest_streak)
-            streak.last_completion_date = last_completion_date
-            streak.streak_start_date = streak_start_date
-        
+        # Completion writes keep streaks current; this full recompute is the repair path
+        streak = StreakService(db).recompute(user_id, habit_id)
         db.commit()
+        if streak is None:
+            return
         
         # Invalidate cache
-        delete_cache_pattern(f"streaks:user:{user_id}:habit:{habit_id}:*")
-        delete_cache_pattern(f"analytics:user:{user_id}")
-        
-        logger.info(f"Calculated streak for user {user_id}, habit {habit_id}: {current_streak}")
+        invalidate_streak_caches([user_id])
         
+        logger.info(f"Calculated streak for user {user_id}, habit {habit_id}: {streak.current_streak}")
+    
     except Exception as e:
         logger.error(f"Error calculating streak: {e}")
         db.rollback()
 
 
 def calculate_all_streaks():
-    """Calculate streaks for all active habits"""
+    """Calculate streaks for habits written since the last run and habits crossing the day boundary"""
+    dirty_habit_ids = claim_dirty_habits()
+    if dirty_habit_ids is None:
+        # Without the dirty set there is no telling what changed
+        logger.warning("Streak dirty set unavailable; recalculating all streaks")
+        repair_all_streaks()
+        return
+    
+    if recalculate_streaks(dirty_habit_ids):
+        release_dirty_habits()
+
+
+def roll_over_streaks():
+    """Zero current streaks broken by the passing day, in the timezones whose midnight passed since the last run"""
+    db = None
+    try:
+        now = datetime.now(timezone.utc)
+        since = last_rollover_run()
+        db = SessionLocal()
+        user_ids = StreakService(db).roll_over(now, since)
+        db.commit()
+        save_last_rollover_run(now)
+        
+        # Invalidate cache for users whose streaks were reset
+        invalidate_streak_caches(user_ids)
+        logger.info(f"Streak rollover reset streaks for {len(user_ids)} users")
+    except Exception as e:
+        logger.error(f"Error rolling over streaks: {e}", exc_info=True)
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+
+def last_rollover_run() -> Optional[datetime]:
+    """When the rollover last ran, or None (roll over every timezone) if it never did or Redis fails"""
+    try:
+        last = redis_client.get(STREAK_ROLLOVER_LAST_RUN_KEY)
+    except Exception as e:
+        logger.warning(f"Last streak rollover unavailable, rolling over every timezone: {e}")
+        return None
+    return datetime.fromtimestamp(int(last), timezone.utc) if last is not None else None
+
+
+def save_last_rollover_run(now: datetime) -> None:
+    """Record when the rollover ran, for the next run to pick the timezones whose midnight passed since"""
+    try:
+        redis_client.set(STREAK_ROLLOVER_LAST_RUN_KEY, int(now.timestamp()))
+    except Exception as e:
+        logger.warning(f"Error saving the last streak rollover run: {e}")
+
+
+def repair_all_streaks():
+    """Calculate streaks for all active habits from their full history"""
+    recalculate_streaks(None)
+
+
+def recalculate_streaks(dirty_habit_ids: Optional[List[int]]) -> bool:
+    """
+    Recalculate due habits, or every active habit if dirty_habit_ids is None; returns True on success.
+    With STREAK_WORKERS > 1 habits are partitioned by user_id across a process pool.
+    """
+    started = time.monotonic()
+    shard_count = max(settings.STREAK_WORKERS, 1)
+    
+    if shard_count == 1:
+        results = [run_streak_shard(0, 1, dirty_habit_ids)]
+    else:
+        results = []
+        # Spawned workers start clean instead of inheriting the parent's connections and scheduler threads
+        with ProcessPoolExecutor(
+            max_workers=shard_count,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_shard_worker
+        ) as pool:
+            futures = {
+                pool.submit(run_streak_shard, shard, shard_count, dirty_habit_ids): shard
+                for shard in range(shard_count)
+            }
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Streak shard {futures[future]}/{shard_count} crashed: {e}", exc_info=True)
+                    results.append({"shard": futures[future], "ok": False, "habits": 0, "users_changed": 0})
+    
+    failed = sorted(result["shard"] for result in results if not result["ok"])
+    logger.info(
+        f"Streak calculation finished in {time.monotonic() - started:.1f}s across {shard_count} shards: "
+        f"{sum(result['habits'] for result in results)} habits, "
+        f"streaks changed for {sum(result['users_changed'] for result in results)} users"
+        + (f"; failed shards {failed}" if failed else "")
+    )
+    return not failed
+
+
+def _init_shard_worker():
+    """Configure logging in a spawned shard process; it opens its own database engine on import"""
+    from app.logging_config import setup_logging
+    setup_logging()
+
+
+def run_streak_shard(shard: int, shard_count: int, dirty_habit_ids: Optional[List[int]]) -> dict:
+    """Recalculate the habits of users with user_id % shard_count == shard, committing in batches"""
+    started = time.monotonic()
+    shard_criteria = [Habit.user_id % shard_count == shard] if shard_count > 1 else []
+    result = {"shard": shard, "ok": False, "habits": 0, "users_changed": 0}
     db = None
     try:
         db = SessionLocal()
-        # Get all active habits
-        from app.habits.models import Habit
-        habits = db.query(Habit).filter(Habit.is_active == True).all()
+        if dirty_habit_ids is None:
+            # A full pass commits every STREAK_BATCH_USERS users to keep transactions short
+            user_ids = [
+                user_id
+                for user_id, in db.query(Habit.user_id).filter(Habit.is_active == True, *shard_criteria).distinct().order_by(Habit.user_id)
+            ]
+            batches = [
+                [Habit.is_active == True, Habit.user_id.in_(user_ids[i:i + settings.STREAK_BATCH_USERS])]
+                for i in range(0, len(user_ids), settings.STREAK_BATCH_USERS)
+            ]
+        else:
+            batches = [[StreakService(db).due_scope(dirty_habit_ids), *shard_criteria]]
         
-        for habit in habits:
-            calculate_streak_for_habit(db, habit.user_id, habit.id)
+        for index, batch_criteria in enumerate(batches, start=1):
+            habits, user_ids_changed = _recalculate_batch(db, batch_criteria)
+            result["habits"] += habits
+            result["users_changed"] += len(user_ids_changed)
+            logger.info(
+                f"Streak shard {shard}/{shard_count}: batch {index}/{len(batches)} done "
+                f"({result['habits']} habits, {result['users_changed']} users changed, {time.monotonic() - started:.1f}s)"
+            )
         
-        logger.info("Completed streak calculation for all habits")
+        result["ok"] = True
     except Exception as e:
-        logger.error(f"Error in calculate_all_streaks: {e}", exc_info=True)
+        logger.error(f"Error in streak shard {shard}/{shard_count}: {e}", exc_info=True)
+        if db:
+            db.rollback()
     finally:
         if db:
             try:
                 db.close()
             except Exception as e:
                 logger.error(f"Error closing database session: {e}")
+    
+    result["seconds"] = round(time.monotonic() - started, 3)
+    logger.info(f"Streak shard {shard}/{shard_count} finished in {result['seconds']:.1f}s")
+    return result
+
+
+def _recalculate_batch(db: Session, habit_criteria: list) -> Tuple[int, Set[int]]:
+    """Recalculate the habits matching habit_criteria and commit; returns the habit count and changed user ids"""
+    if settings.STREAK_ENGINE == "python":
+        habits = _habits_with_timezones(db, habit_criteria)
+        streak_repo = StreakRepository(db)
+        writer = StreakWriter(db)
+        for i in range(0, len(habits), writer.batch_size):
+            chunk = habits[i:i + writer.batch_size]
+            dates_by_habit = streak_repo.get_dates_by_habit([habit_id for _, habit_id, _ in chunk])
+            for user_id, habit_id, timezone_name in chunk:
+                writer.add(user_id, habit_id, dates_by_habit.get(habit_id, []), timezone_name)
+        writer.flush()
+        return len(habits), writer.user_ids_changed
+    
+    if settings.STREAK_ENGINE == "bitmap":
+        habits = _habits_with_timezones(db, habit_criteria)
+        habit_repo = HabitRepository(db)
+        writer = StreakWriter(db)
+        for i in range(0, len(habits), writer.batch_size):
+            chunk = habits[i:i + writer.batch_size]
+            # Bitmaps built here for the first time are committed with the batch
+            bitmaps = habit_repo.get_completion_bitmaps([habit_id for _, habit_id, _ in chunk])
+            for user_id, habit_id, timezone_name in chunk:
+                writer.add_bitmap(user_id, habit_id, bitmaps[habit_id], timezone_name)
+        writer.flush()
+        return len(habits), writer.user_ids_changed
+    
+    habits = db.query(func.count(Habit.id)).filter(*habit_criteria).scalar() or 0
+    user_ids = StreakService(db).recompute_set(*habit_criteria)
+    db.commit()
+    
+    # Invalidate cache for users whose streaks changed
+    invalidate_streak_caches(user_ids)
+    return habits, user_ids
+
+
+def _habits_with_timezones(db: Session, habit_criteria: list) -> List[Tuple[int, int, Optional[str]]]:
+    """(user_id, habit_id, owner's timezone) of the habits matching habit_criteria, by habit id"""
+    return db.query(Habit.user_id, Habit.id, UserPreference.timezone).outerjoin(
+        UserPreference, UserPreference.user_id == Habit.user_id
+    ).filter(*habit_criteria).order_by(Habit.id).all()
 
 
 def start_streak_calculator():
     """Start the streak calculator scheduler"""
-    scheduler = BackgroundScheduler()
-    
+    scheduler = BackgroundScheduler(job_defaults=JOB_DEFAULTS)
+    register_streak_jobs(scheduler)
+    scheduler.start()
+    logger.info("Streak calculator scheduler started")
+
+
+def register_streak_jobs(scheduler) -> None:
+    """Add the streak jobs to a scheduler"""
     # Run every hour
     scheduler.add_job(
-        calculate_all_streaks,
+        leader_only(calculate_all_streaks),
         trigger=CronTrigger(minute=0),  # Run at the top of every hour
         id='streak_calculator',
-        name='Calculate streaks for all habits',
+        name='Calculate streaks for changed habits',
         replace_existing=True
     )
     
-    scheduler.start()
-    logger.info("Streak calculator scheduler started")
-
+    # Every quarter hour, zero the chains broken in the timezones that just reached local midnight;
+    # UTC offsets are whole quarter hours, so each zone is reset at its own midnight
+    scheduler.add_job(
+        leader_only(roll_over_streaks),
+        trigger=CronTrigger(minute="*/15"),
+        id='streak_rollover',
+        name='Reset streaks at local midnight',
+        replace_existing=True
+    )
+    
+    # Full repair once a day, catching anything the dirty set missed
+    scheduler.add_job(
+        leader_only(repair_all_streaks),
+        trigger=CronTrigger(hour=3, minute=30),
+        id='streak_repair',
+        name='Recalculate streaks for all habits',
+        replace_existing=True
+    )
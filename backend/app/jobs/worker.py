@@ -0,0 +1,63 @@
+"""
+Standalone process running every scheduled job, so API workers only serve requests.
+
+    python -m app.jobs.worker
+
+Run it with RUN_SCHEDULER_IN_API=false on the API. Several workers may run; the scheduler
+lease lets only one of them execute jobs at a time, while every worker delivers queued reminders.
+"""
+from apscheduler.schedulers.blocking import BlockingScheduler
+from prometheus_client import start_http_server
+from app.config import settings
+from app.logging_config import setup_logging
+from app.jobs.leader import leader_election, JOB_DEFAULTS
+from app.jobs.streak_calculator import register_streak_jobs
+from app.jobs.reminder_scheduler import register_reminder_jobs
+from app.reminders.delivery import start_reminder_delivery, stop_reminder_delivery
+import logging
+import os
+import signal
+
+logger = logging.getLogger(__name__)
+
+
+def build_scheduler() -> BlockingScheduler:
+    """One scheduler holding every background job"""
+    scheduler = BlockingScheduler(job_defaults=JOB_DEFAULTS)
+    register_streak_jobs(scheduler)
+    register_reminder_jobs(scheduler)
+    return scheduler
+
+
+def run_worker() -> None:
+    """Run the scheduler and reminder delivery until SIGTERM or SIGINT, then hand over the lease and close connections"""
+    from app.database import engine
+    from app.redis_client import redis_pool
+    
+    scheduler = build_scheduler()
+    
+    def shutdown(signum, frame):
+        logger.info(f"Job worker received signal {signum}, shutting down")
+        scheduler.shutdown(wait=False)
+    
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    
+    start_http_server(settings.WORKER_METRICS_PORT)
+    leader_election.start()
+    start_reminder_delivery()
+    logger.info(f"Job worker started with jobs {[job.id for job in scheduler.get_jobs()]}")
+    try:
+        scheduler.start()
+    finally:
+        stop_reminder_delivery()
+        leader_election.stop()
+        redis_pool.disconnect()
+        engine.dispose()
+        logger.info("Job worker stopped")
+
+
+if __name__ == "__main__":
+    os.makedirs('logs', exist_ok=True)
+    setup_logging()
+    run_worker()
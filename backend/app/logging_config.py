@@ -1,4 +1,5 @@
 import logging
+import os
 import sys
 from logging.handlers import RotatingFileHandler
 from app.config import settings
@@ -13,7 +14,8 @@ def setup_logging():
     console_handler.setLevel(log_level)
     console_handler.setFormatter(logging.Formatter(log_format))
     
-    # File handler with rotation
+    # File handler with rotation; the log directory is not tracked, so create it on first run
+    os.makedirs('logs', exist_ok=True)
     file_handler = RotatingFileHandler(
         'logs/habit_tracker.log',
         maxBytes=10 * 1024 * 1024,  # 10MB
@@ -13,8 +13,11 @@ from app.auth.routes import router as auth_router
 from app.habits.routes import router as habits_router
 from app.completions.routes import router as completions_router
 from app.analytics.routes import router as analytics_router
+from app.preferences.routes import router as preferences_router
 from app.jobs.streak_calculator import start_streak_calculator
 from app.jobs.reminder_scheduler import start_reminder_scheduler
+from app.jobs.leader import leader_election
+from app.reminders.delivery import start_reminder_delivery, stop_reminder_delivery
 from app.logging_config import setup_logging
 import os
 
@@ -85,9 +88,27 @@ async def startup_event():
         raise RuntimeError("Database connection failed on startup")
     logger.info("Database connection verified successfully")
     
-    # Initialize background jobs
-    start_streak_calculator()
-    start_reminder_scheduler()
+    # Initialize background jobs; every worker schedules them, but only the lease holder runs them
+    if settings.RUN_SCHEDULER_IN_API:
+        leader_election.start()
+        start_streak_calculator()
+        start_reminder_scheduler()
+        start_reminder_delivery()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Shutdown event - release pooled Redis and database connections"""
+    from app.redis_client import async_redis_pool, redis_pool
+    from app.database import async_engine
+    
+    # Settle in-flight reminders and hand over the scheduler lease before the Redis pool goes away
+    stop_reminder_delivery()
+    leader_election.stop()
+    await async_redis_pool.disconnect()
+    redis_pool.disconnect()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 
 @app.get("/")
@@ -123,6 +144,7 @@ app.include_router(auth_router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(habits_router, prefix="/api/v1/habits", tags=["Habits"])
 app.include_router(completions_router, prefix="/api/v1/completions", tags=["Completions"])
 app.include_router(analytics_router, prefix="/api/v1/analytics", tags=["Analytics"])
+app.include_router(preferences_router, prefix="/api/v1/preferences", tags=["Preferences"])
 
 
 @app.exception_handler(Exception)
@@ -0,0 +1,25 @@
+from sqlalchemy.orm import Session
+from app.preferences.models import UserPreference
+
+
+class PreferenceRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_or_create(self, user_id: int) -> UserPreference:
+        """Get a user's preferences, creating the defaults for users registered without them"""
+        preferences = self.db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+        if preferences is None:
+            preferences = UserPreference(user_id=user_id)
+            self.db.add(preferences)
+            self.db.commit()
+            self.db.refresh(preferences)
+        return preferences
+    
+    def update(self, preferences: UserPreference, preference_data: dict) -> UserPreference:
+        """Update preferences"""
+        for key, value in preference_data.items():
+            setattr(preferences, key, value)
+        self.db.commit()
+        self.db.refresh(preferences)
+        return preferences
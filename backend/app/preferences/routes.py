@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.preferences.service import PreferenceService
+from app.preferences.schemas import PreferenceUpdate, PreferenceResponse
+from app.shared.dependencies import get_current_user
+from app.shared.rate_limiter import get_rate_limiter
+
+router = APIRouter()
+limiter = get_rate_limiter()
+
+
+@router.get("", response_model=PreferenceResponse)
+@limiter.limit("60/minute")
+async def get_preferences(
+    request: Request,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the current user's preferences"""
+    preference_service = PreferenceService(db)
+    return preference_service.get_preferences(current_user.id)
+
+
+@router.put("", response_model=PreferenceResponse)
+@limiter.limit("30/minute")
+async def update_preferences(
+    preference_data: PreferenceUpdate,
+    request: Request,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update the current user's preferences"""
+    preference_service = PreferenceService(db)
+    return preference_service.update_preferences(current_user.id, preference_data)
@@ -0,0 +1,43 @@
+from pydantic import BaseModel, field_validator
+from typing import Optional, Dict, Any
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+
+class PreferenceUpdate(BaseModel):
+    timezone: Optional[str] = None
+    language: Optional[str] = None
+    theme: Optional[str] = None
+    email_notifications: Optional[bool] = None
+    push_notifications: Optional[bool] = None
+    reminder_enabled: Optional[bool] = None
+    weekly_report: Optional[bool] = None
+    settings: Optional[Dict[str, Any]] = None
+    
+    @field_validator('timezone')
+    @classmethod
+    def validate_timezone(cls, v: Optional[str]) -> Optional[str]:
+        """Validate that the timezone is an IANA zone name"""
+        if v is None:
+            return v
+        try:
+            ZoneInfo(v)
+        except Exception:
+            raise ValueError(f'Unknown timezone: {v}')
+        return v
+
+
+class PreferenceResponse(BaseModel):
+    user_id: int
+    timezone: str
+    language: str
+    theme: str
+    email_notifications: bool
+    push_notifications: bool
+    reminder_enabled: bool
+    weekly_report: bool
+    settings: Optional[Dict[str, Any]]
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,50 @@
+from sqlalchemy.orm import Session
+from app.preferences.models import UserPreference
+from app.preferences.repository import PreferenceRepository
+from app.preferences.schemas import PreferenceUpdate
+from app.reminders.service import ReminderService
+from app.streaks.service import invalidate_streak_caches
+from typing import Optional
+from datetime import datetime
+
+
+class PreferenceService:
+    def __init__(self, db: Session):
+        self.preference_repo = PreferenceRepository(db)
+        self.reminder_service = ReminderService(db)
+        self.db = db
+    
+    def get_preferences(self, user_id: int) -> dict:
+        """Get a user's preferences"""
+        return _preferences_to_dict(self.preference_repo.get_or_create(user_id))
+    
+    def update_preferences(self, user_id: int, preference_data: PreferenceUpdate, now: Optional[datetime] = None) -> dict:
+        """Update a user's preferences, moving their reminders and local dates to a new timezone"""
+        preferences = self.preference_repo.get_or_create(user_id)
+        update_data = preference_data.model_dump(exclude_unset=True, exclude_none=True)
+        timezone_changed = "timezone" in update_data and update_data["timezone"] != preferences.timezone
+        
+        preferences = self.preference_repo.update(preferences, update_data)
+        
+        if timezone_changed:
+            # Reminder buckets and the local date streaks and analytics count from follow the timezone
+            self.reminder_service.reschedule_user(user_id, now)
+            invalidate_streak_caches([user_id])
+        
+        return _preferences_to_dict(preferences)
+
+
+def _preferences_to_dict(preferences: UserPreference) -> dict:
+    """Serialize preferences for the API"""
+    return {
+        "user_id": preferences.user_id,
+        "timezone": preferences.timezone,
+        "language": preferences.language,
+        "theme": preferences.theme,
+        "email_notifications": preferences.email_notifications,
+        "push_notifications": preferences.push_notifications,
+        "reminder_enabled": preferences.reminder_enabled,
+        "weekly_report": preferences.weekly_report,
+        "settings": preferences.settings,
+        "updated_at": preferences.updated_at
+    }
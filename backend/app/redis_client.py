@@ -1,22 +1,281 @@
 import redis
+import redis.asyncio
 from app.config import settings
+from prometheus_client import Counter
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+import asyncio
+import inspect
 import json
-from typing import Optional, Any
+import msgpack
+import threading
+import time
+import uuid
+import zlib
+from typing import Optional, Any, Callable, Dict, Tuple, Awaitable, Union, Iterable
 
-redis_client = redis.from_url(
+# Values are stored as codec-framed bytes, so responses are not decoded to str.
+# Blocking pools wait for a free connection instead of failing when exhausted.
+redis_pool = redis.BlockingConnectionPool.from_url(
     settings.REDIS_URL,
-    decode_responses=True,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=5,
+    decode_responses=False,
     socket_connect_timeout=5,
     socket_timeout=5
 )
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+async_redis_pool = redis.asyncio.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_ASYNC_MAX_CONNECTIONS,
+    timeout=5,
+    decode_responses=False,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+async_redis_client = redis.asyncio.Redis(connection_pool=async_redis_pool)
+
+# Payload format markers. Legacy JSON payloads carry no marker; JSON text never starts with these bytes
+FORMAT_MSGPACK = b"\x01"
+FORMAT_MSGPACK_ZLIB = b"\x02"
+FORMAT_JSON_ZLIB = b"\x03"
+
+
+class JsonCodec:
+    """JSON payloads, readable by workers that predate codecs unless compressed (threshold 0 never compresses)"""
+    
+    def __init__(self, compression_threshold: int):
+        self.compression_threshold = compression_threshold
+    
+    def encode(self, value: Any) -> bytes:
+        payload = json.dumps(value, default=str).encode("utf-8")
+        if self.compression_threshold and len(payload) > self.compression_threshold:
+            return FORMAT_JSON_ZLIB + zlib.compress(payload, 1)
+        return payload
+
+
+class MsgpackCodec:
+    """Binary msgpack payloads, faster to encode and decode and smaller than JSON"""
+    
+    def __init__(self, compression_threshold: int):
+        self.compression_threshold = compression_threshold
+    
+    def encode(self, value: Any) -> bytes:
+        payload = msgpack.packb(value, default=str, use_bin_type=True)
+        if self.compression_threshold and len(payload) > self.compression_threshold:
+            return FORMAT_MSGPACK_ZLIB + zlib.compress(payload, 1)
+        return FORMAT_MSGPACK + payload
+
+
+CACHE_CODECS = {
+    "json": JsonCodec,
+    "msgpack": MsgpackCodec,
+}
+
+codec = CACHE_CODECS[settings.CACHE_CODEC](settings.CACHE_COMPRESSION_THRESHOLD)
+
+
+def encode_value(value: Any) -> bytes:
+    """Encode a cache value with the configured codec"""
+    return codec.encode(value)
+
+
+def decode_value(payload: bytes) -> Any:
+    """Decode a cache payload written by any codec"""
+    marker = payload[:1]
+    if marker == FORMAT_MSGPACK:
+        return msgpack.unpackb(payload[1:], raw=False, strict_map_key=False)
+    if marker == FORMAT_MSGPACK_ZLIB:
+        return msgpack.unpackb(zlib.decompress(payload[1:]), raw=False, strict_map_key=False)
+    if marker == FORMAT_JSON_ZLIB:
+        return json.loads(zlib.decompress(payload[1:]))
+    return json.loads(payload)
+
+
+# Background refreshes for stale-while-revalidate entries
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+# Upper bound on one background refresh before another worker may take over
+SWR_REFRESH_LOCK_SECONDS = 60
+# Lifetime of the counter that marking a stale-while-revalidate entry stale bumps; outlives any hard TTL
+SWR_VERSION_TTL_SECONDS = 2 * 86400
+
+# Store a stale-while-revalidate entry only if no write marked it stale since its value was read
+_SET_SWR_IF_VERSION_SCRIPT = """
+if (redis.call('get', KEYS[3]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('setex', KEYS[1], ARGV[2], ARGV[4])
+redis.call('setex', KEYS[2], ARGV[3], 1)
+return 1
+"""
+
+# Single-flight: how long a compute lock is held, and how long other workers wait on it
+COMPUTE_LOCK_MILLISECONDS = 10000
+COMPUTE_LOCK_WAIT_SECONDS = 5
+COMPUTE_LOCK_POLL_SECONDS = 0.05
+
+# Release a lock only if we still own it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Computations in flight in this process, keyed by cache key
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+# Computations in flight on this worker's event loop, keyed by cache key
+_ainflight: Dict[str, "asyncio.Future"] = {}
+
+# Keys deleted anywhere are announced here so every worker drops its L1 copy
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+cache_requests = Counter(
+    "cache_requests_total",
+    "Cache lookups by layer and result",
+    ["layer", "result"]
+)
+
+
+class LocalCache:
+    """
+    Bounded in-process cache with per-entry TTL and LRU eviction.
+    Every invalidation advances a sequence number; a value read from Redis is only stored
+    if no invalidation arrived since the read began, as it may predate that invalidation.
+    """
+    
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sequence = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Get (hit, value) for a key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, sequence: Optional[int] = None) -> None:
+        """Store a value, evicting the least recently used entry when full; skipped if invalidated since `sequence`"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            if sequence is not None and sequence != self.sequence:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def delete(self, key: str) -> None:
+        """Drop a key"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self.sequence += 1
+    
+    def clear(self) -> None:
+        """Drop every key"""
+        with self._lock:
+            self._entries.clear()
+            self.sequence += 1
+
+
+# Values served from L1 are shared between callers and must not be mutated
+local_cache = LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TTL_SECONDS) if settings.CACHE_L1_ENABLED else None
+_listener_started = False
+_listener_lock = threading.Lock()
+
+
+def _ensure_invalidation_listener() -> None:
+    """Start the pub/sub thread that applies other workers' invalidations to L1"""
+    global _listener_started
+    if _listener_started:
+        return
+    with _listener_lock:
+        if _listener_started:
+            return
+        threading.Thread(target=_listen_for_invalidations, name="cache-invalidation", daemon=True).start()
+        _listener_started = True
+
+
+def _listen_for_invalidations() -> None:
+    """Drop L1 entries announced on the invalidation channel, reconnecting on failure"""
+    backoff = 1
+    while True:
+        pubsub = None
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while we were not subscribed is lost, so start clean
+            local_cache.clear()
+            backoff = 1
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message and message["type"] == "message":
+                    local_cache.delete(message["data"].decode("utf-8"))
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            local_cache.clear()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def _invalidate_local(*keys: str) -> None:
+    """Drop keys from this worker's L1 and announce them to the others"""
+    if local_cache is None:
+        return
+    for key in keys:
+        local_cache.delete(key)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.publish(INVALIDATION_CHANNEL, key)
+        pipe.execute()
+    except Exception as e:
+        print(f"Cache invalidation publish error: {e}")
 
 
 def get_cache(key: str) -> Optional[Any]:
-    """Get value from cache"""
+    """Get value from cache, checking the in-process L1 before Redis"""
+    if local_cache is not None:
+        _ensure_invalidation_listener()
+        hit, value = local_cache.get(key)
+        cache_requests.labels(layer="l1", result="hit" if hit else "miss").inc()
+        if hit:
+            return value
+        sequence = local_cache.sequence
+    
+    value = _get_from_redis(key)
+    if value is not None and local_cache is not None:
+        local_cache.set(key, value, sequence=sequence)
+    return value
+
+
+def _get_from_redis(key: str) -> Optional[Any]:
+    """Get value from Redis only"""
     try:
         value = redis_client.get(key)
+        cache_requests.labels(layer="redis", result="hit" if value else "miss").inc()
         if value:
-            return json.loads(value)
+            return decode_value(value)
         return None
     except Exception as e:
         print(f"Cache get error: {e}")
@@ -29,8 +288,10 @@ def set_cache(key: str, value: Any, expire: int = 3600) -> bool:
         redis_client.setex(
             key,
             expire,
-            json.dumps(value, default=str)
+            encode_value(value)
         )
+        if local_cache is not None:
+            local_cache.set(key, value, expire)
         return True
     except Exception as e:
         print(f"Cache set error: {e}")
@@ -41,6 +302,7 @@ def delete_cache(key: str) -> bool:
     """Delete value from cache"""
     try:
         redis_client.delete(key)
+        _invalidate_local(key)
         return True
     except Exception as e:
         print(f"Cache delete error: {e}")
@@ -48,13 +310,565 @@ def delete_cache(key: str) -> bool:
 
 
 def delete_cache_pattern(pattern: str) -> int:
-    """Delete all keys matching pattern"""
+    """
+    Delete all keys matching pattern.
+    Walks the keyspace with SCAN, so it does not block Redis, but its cost still
+    grows with the keyspace. Request paths invalidate namespaces with invalidate instead.
+    """
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            return redis_client.delete(*keys)
-        return 0
+        deleted = 0
+        batch = []
+        for key in redis_client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += redis_client.unlink(*batch)
+        return deleted
     except Exception as e:
         print(f"Cache delete pattern error: {e}")
         return 0
 
+
+def _generation_key(namespace: str) -> str:
+    """Counter key holding the current generation of a namespace"""
+    return f"gen:{namespace}"
+
+
+def get_namespace_generation(namespace: str) -> int:
+    """Get the current generation of a cache namespace"""
+    generation_key = _generation_key(namespace)
+    if local_cache is not None:
+        _ensure_invalidation_listener()
+        hit, generation = local_cache.get(generation_key)
+        if hit:
+            return generation
+        sequence = local_cache.sequence
+    
+    try:
+        generation = redis_client.get(generation_key)
+        if generation is None:
+            # Seed from the clock so a counter lost to eviction never reuses an old generation
+            redis_client.set(generation_key, int(time.time() * 1000), nx=True)
+            generation = redis_client.get(generation_key)
+        generation = int(generation)
+        if local_cache is not None:
+            local_cache.set(generation_key, generation, sequence=sequence)
+        return generation
+    except Exception as e:
+        print(f"Cache generation error: {e}")
+        return 0
+
+
+def versioned_key(namespace: str, suffix: str) -> str:
+    """Build a cache key inside the current generation of a namespace"""
+    return f"{namespace}:g{get_namespace_generation(namespace)}:{suffix}"
+
+
+def invalidate(
+    keys: Iterable[str] = (),
+    namespaces: Iterable[str] = (),
+    stale_keys: Iterable[str] = (),
+    set_members: Optional[Dict[str, Iterable[str]]] = None
+) -> bool:
+    """
+    Delete keys, bump namespaces and mark stale-while-revalidate keys stale in one round trip.
+    set_members adds members to sets (e.g. work queues for background jobs) in the same round trip.
+    """
+    keys, namespaces, stale_keys = list(keys), list(namespaces), list(stale_keys)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.delete(key)
+        for namespace in namespaces:
+            pipe.set(_generation_key(namespace), int(time.time() * 1000), nx=True)
+            pipe.incr(_generation_key(namespace))
+        for key in stale_keys:
+            _queue_mark_stale(pipe, key)
+        for set_key, members in (set_members or {}).items():
+            members = list(members)
+            if members:
+                pipe.sadd(set_key, *members)
+        pipe.execute()
+        _invalidate_local(*keys, *[_generation_key(namespace) for namespace in namespaces])
+        return True
+    except Exception as e:
+        print(f"Cache invalidate error: {e}")
+        return False
+
+
+def get_or_compute(key: str, fn: Callable[[], Any], ttl: int = 3600) -> Any:
+    """
+    Get value from cache, computing and caching it on a miss.
+    Exactly one caller computes a missing key: concurrent callers in this process
+    share its result, and callers in other workers wait on a short Redis lock and
+    read the value it stores. A None result is returned but not cached.
+    """
+    value = get_cache(key)
+    if value is not None:
+        return value
+    
+    return _single_flight(
+        key,
+        fn,
+        store=lambda result: set_cache(key, result, expire=ttl),
+        lookup=lambda: get_cache(key)
+    )
+
+
+def _single_flight(key: str, fn: Callable[[], Any], store: Callable[[Any], Any], lookup: Callable[[], Any]) -> Any:
+    """Coalesce concurrent computations of a key within this process"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+    
+    if not is_leader:
+        return future.result()
+    
+    try:
+        result = _compute_with_lock(key, fn, store, lookup)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _compute_with_lock(key: str, fn: Callable[[], Any], store: Callable[[Any], Any], lookup: Callable[[], Any]) -> Any:
+    """Compute a key under a Redis lock so only one worker hits the database"""
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    try:
+        acquired = bool(redis_client.set(lock_key, token, nx=True, px=COMPUTE_LOCK_MILLISECONDS))
+    except Exception as e:
+        print(f"Cache lock error: {e}")
+        acquired, token = False, None
+    
+    if not acquired and token is not None:
+        deadline = time.monotonic() + COMPUTE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(COMPUTE_LOCK_POLL_SECONDS)
+            value = lookup()
+            if value is not None:
+                return value
+        # The lock holder is slow or gone; compute rather than fail the request
+    
+    try:
+        result = fn()
+        if result is not None:
+            store(result)
+        return result
+    finally:
+        if acquired:
+            try:
+                redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                print(f"Cache unlock error: {e}")
+
+
+def _fresh_key(key: str) -> str:
+    """Marker key whose presence means a stale-while-revalidate entry is still fresh"""
+    return f"{key}:fresh"
+
+
+def _version_key(key: str) -> str:
+    """Counter bumped each time a stale-while-revalidate entry is marked stale"""
+    return f"{key}:version"
+
+
+def _swr_version(version: Optional[bytes]) -> str:
+    """Version as read from Redis; a missing counter is version 0"""
+    return version.decode("utf-8") if version else "0"
+
+
+def _queue_mark_stale(pipe, key: str) -> None:
+    """Queue marking an entry stale: drop its fresh marker and bump its version so refreshes already running do not store"""
+    pipe.delete(_fresh_key(key))
+    pipe.incr(_version_key(key))
+    pipe.expire(_version_key(key), SWR_VERSION_TTL_SECONDS)
+
+
+def set_cache_swr(key: str, value: Any, soft_ttl: int, hard_ttl: int, version: Optional[str] = None) -> bool:
+    """
+    Set a stale-while-revalidate entry: fresh for soft_ttl, servable until hard_ttl.
+    With a version, the entry is only stored if it has not been marked stale since that version was read.
+    """
+    try:
+        if version is not None:
+            return bool(redis_client.eval(
+                _SET_SWR_IF_VERSION_SCRIPT, 3, key, _fresh_key(key), _version_key(key),
+                version, hard_ttl, soft_ttl, encode_value(value)
+            ))
+        pipe = redis_client.pipeline()
+        pipe.setex(key, hard_ttl, encode_value(value))
+        pipe.setex(_fresh_key(key), soft_ttl, 1)
+        pipe.execute()
+        return True
+    except Exception as e:
+        print(f"Cache set error: {e}")
+        return False
+
+
+def get_cache_swr(
+    key: str,
+    compute: Callable[[], Any],
+    refresh: Optional[Callable[[], Any]] = None,
+    soft_ttl: int = 300,
+    hard_ttl: int = 3600
+) -> Any:
+    """
+    Get value with stale-while-revalidate semantics.
+    A fresh entry is returned as is. A stale entry is returned immediately while
+    one background refresh rebuilds it. A missing entry is computed synchronously.
+    refresh runs on a worker thread, so it must not reuse request-scoped resources
+    such as the caller's database session; it defaults to compute.
+    """
+    try:
+        # The version is read before any database read, so a write landing meanwhile voids the store
+        value, fresh, version = redis_client.mget(key, _fresh_key(key), _version_key(key))
+    except Exception as e:
+        print(f"Cache get error: {e}")
+        return compute()
+    
+    if value is not None:
+        if fresh is None:
+            _schedule_refresh(key, refresh or compute, soft_ttl, hard_ttl, _swr_version(version))
+        return decode_value(value)
+    
+    return _single_flight(
+        key,
+        compute,
+        store=lambda result: set_cache_swr(key, result, soft_ttl, hard_ttl, _swr_version(version)),
+        lookup=lambda: _get_from_redis(key)
+    )
+
+
+def mark_stale(key: str) -> bool:
+    """Mark a stale-while-revalidate entry stale so the next read triggers a refresh"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_mark_stale(pipe, key)
+        pipe.execute()
+        return True
+    except Exception as e:
+        print(f"Cache mark stale error: {e}")
+        return False
+
+
+def _schedule_refresh(key: str, refresh: Callable[[], Any], soft_ttl: int, hard_ttl: int, version: str) -> None:
+    """Start a background refresh unless another worker is already refreshing the key"""
+    refresh_lock = f"{key}:refreshing"
+    try:
+        if not redis_client.set(refresh_lock, 1, nx=True, ex=SWR_REFRESH_LOCK_SECONDS):
+            return
+        _refresh_executor.submit(_run_refresh, key, refresh, soft_ttl, hard_ttl, refresh_lock, version)
+    except Exception as e:
+        print(f"Cache refresh schedule error: {e}")
+
+
+def _run_refresh(
+    key: str,
+    refresh: Callable[[], Any],
+    soft_ttl: int,
+    hard_ttl: int,
+    refresh_lock: str,
+    version: str
+) -> None:
+    """Rebuild a stale entry, unless a write marks it stale again meanwhile, and release the refresh lock"""
+    try:
+        value = refresh()
+        if value is not None:
+            set_cache_swr(key, value, soft_ttl, hard_ttl, version)
+    except Exception as e:
+        print(f"Cache refresh error for {key}: {e}")
+    finally:
+        try:
+            redis_client.delete(refresh_lock)
+        except Exception as e:
+            print(f"Cache delete error: {e}")
+
+
+# Asyncio cache API, mirroring the synchronous functions above for async route handlers
+
+
+async def _resolve(result: Union[Any, Awaitable[Any]]) -> Any:
+    """Await a result if a compute function returned an awaitable"""
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def aget_cache(key: str) -> Optional[Any]:
+    """Get value from cache without blocking the event loop"""
+    if local_cache is not None:
+        _ensure_invalidation_listener()
+        hit, value = local_cache.get(key)
+        cache_requests.labels(layer="l1", result="hit" if hit else "miss").inc()
+        if hit:
+            return value
+        sequence = local_cache.sequence
+    
+    value = await _aget_from_redis(key)
+    if value is not None and local_cache is not None:
+        local_cache.set(key, value, sequence=sequence)
+    return value
+
+
+async def _aget_from_redis(key: str) -> Optional[Any]:
+    """Get value from Redis only"""
+    try:
+        value = await async_redis_client.get(key)
+        cache_requests.labels(layer="redis", result="hit" if value else "miss").inc()
+        if value:
+            return decode_value(value)
+        return None
+    except Exception as e:
+        print(f"Cache get error: {e}")
+        return None
+
+
+async def aset_cache(key: str, value: Any, expire: int = 3600) -> bool:
+    """Set value in cache with expiration"""
+    try:
+        await async_redis_client.setex(key, expire, encode_value(value))
+        if local_cache is not None:
+            local_cache.set(key, value, expire)
+        return True
+    except Exception as e:
+        print(f"Cache set error: {e}")
+        return False
+
+
+async def _ainvalidate_local(*keys: str) -> None:
+    """Drop keys from this worker's L1 and announce them to the others"""
+    if local_cache is None:
+        return
+    for key in keys:
+        local_cache.delete(key)
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.publish(INVALIDATION_CHANNEL, key)
+        await pipe.execute()
+    except Exception as e:
+        print(f"Cache invalidation publish error: {e}")
+
+
+async def aget_namespace_generation(namespace: str) -> int:
+    """Get the current generation of a cache namespace"""
+    generation_key = _generation_key(namespace)
+    if local_cache is not None:
+        _ensure_invalidation_listener()
+        hit, generation = local_cache.get(generation_key)
+        if hit:
+            return generation
+        sequence = local_cache.sequence
+    
+    try:
+        generation = await async_redis_client.get(generation_key)
+        if generation is None:
+            # Seed from the clock so a counter lost to eviction never reuses an old generation
+            await async_redis_client.set(generation_key, int(time.time() * 1000), nx=True)
+            generation = await async_redis_client.get(generation_key)
+        generation = int(generation)
+        if local_cache is not None:
+            local_cache.set(generation_key, generation, sequence=sequence)
+        return generation
+    except Exception as e:
+        print(f"Cache generation error: {e}")
+        return 0
+
+
+async def aversioned_key(namespace: str, suffix: str) -> str:
+    """Build a cache key inside the current generation of a namespace"""
+    return f"{namespace}:g{await aget_namespace_generation(namespace)}:{suffix}"
+
+
+async def ainvalidate(
+    keys: Iterable[str] = (),
+    namespaces: Iterable[str] = (),
+    stale_keys: Iterable[str] = (),
+    set_members: Optional[Dict[str, Iterable[str]]] = None
+) -> bool:
+    """
+    Delete keys, bump namespaces and mark stale-while-revalidate keys stale in one round trip.
+    set_members adds members to sets (e.g. work queues for background jobs) in the same round trip.
+    """
+    keys, namespaces, stale_keys = list(keys), list(namespaces), list(stale_keys)
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.delete(key)
+        for namespace in namespaces:
+            pipe.set(_generation_key(namespace), int(time.time() * 1000), nx=True)
+            pipe.incr(_generation_key(namespace))
+        for key in stale_keys:
+            _queue_mark_stale(pipe, key)
+        for set_key, members in (set_members or {}).items():
+            members = list(members)
+            if members:
+                pipe.sadd(set_key, *members)
+        await pipe.execute()
+        await _ainvalidate_local(*keys, *[_generation_key(namespace) for namespace in namespaces])
+        return True
+    except Exception as e:
+        print(f"Cache invalidate error: {e}")
+        return False
+
+
+async def aget_or_compute(key: str, fn: Callable[[], Any], ttl: int = 3600) -> Any:
+    """
+    Get value from cache, computing and caching it on a miss.
+    Same single-flight guarantees as get_or_compute; fn may be sync or return an awaitable.
+    """
+    value = await aget_cache(key)
+    if value is not None:
+        return value
+    
+    return await _asingle_flight(
+        key,
+        fn,
+        store=lambda result: aset_cache(key, result, expire=ttl),
+        lookup=lambda: aget_cache(key)
+    )
+
+
+async def _asingle_flight(
+    key: str,
+    fn: Callable[[], Any],
+    store: Callable[[Any], Awaitable[Any]],
+    lookup: Callable[[], Awaitable[Any]]
+) -> Any:
+    """Coalesce concurrent computations of a key on this event loop"""
+    future = _ainflight.get(key)
+    if future is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The leader was cancelled, not us: take over the computation
+            return await _asingle_flight(key, fn, store, lookup)
+    
+    future = asyncio.get_running_loop().create_future()
+    _ainflight[key] = future
+    try:
+        result = await _acompute_with_lock(key, fn, store, lookup)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        # Followers see the exception; mark it retrieved so an unobserved one is not logged
+        future.exception()
+        raise
+    finally:
+        _ainflight.pop(key, None)
+        # Cancelled (e.g. the client disconnected): cancel the followers' wait too instead of leaving it pending
+        if not future.done():
+            future.cancel()
+
+
+async def _acompute_with_lock(
+    key: str,
+    fn: Callable[[], Any],
+    store: Callable[[Any], Awaitable[Any]],
+    lookup: Callable[[], Awaitable[Any]]
+) -> Any:
+    """Compute a key under a Redis lock so only one worker hits the database"""
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    try:
+        acquired = bool(await async_redis_client.set(lock_key, token, nx=True, px=COMPUTE_LOCK_MILLISECONDS))
+    except Exception as e:
+        print(f"Cache lock error: {e}")
+        acquired, token = False, None
+    
+    if not acquired and token is not None:
+        deadline = time.monotonic() + COMPUTE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(COMPUTE_LOCK_POLL_SECONDS)
+            value = await lookup()
+            if value is not None:
+                return value
+        # The lock holder is slow or gone; compute rather than fail the request
+    
+    try:
+        result = await _resolve(fn())
+        if result is not None:
+            await store(result)
+        return result
+    finally:
+        if acquired:
+            try:
+                await async_redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                print(f"Cache unlock error: {e}")
+
+
+async def aset_cache_swr(key: str, value: Any, soft_ttl: int, hard_ttl: int, version: Optional[str] = None) -> bool:
+    """Set a stale-while-revalidate entry, like set_cache_swr"""
+    try:
+        if version is not None:
+            return bool(await async_redis_client.eval(
+                _SET_SWR_IF_VERSION_SCRIPT, 3, key, _fresh_key(key), _version_key(key),
+                version, hard_ttl, soft_ttl, encode_value(value)
+            ))
+        pipe = async_redis_client.pipeline()
+        pipe.setex(key, hard_ttl, encode_value(value))
+        pipe.setex(_fresh_key(key), soft_ttl, 1)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        print(f"Cache set error: {e}")
+        return False
+
+
+async def aget_cache_swr(
+    key: str,
+    compute: Callable[[], Any],
+    refresh: Optional[Callable[[], Any]] = None,
+    soft_ttl: int = 300,
+    hard_ttl: int = 3600
+) -> Any:
+    """
+    Get value with stale-while-revalidate semantics, like get_cache_swr.
+    compute may be sync or return an awaitable. refresh is synchronous and runs on
+    the background refresh thread pool with its own resources; without it, stale
+    entries are served until their hard TTL.
+    """
+    try:
+        # The version is read before any database read, so a write landing meanwhile voids the store
+        value, fresh, version = await async_redis_client.mget(key, _fresh_key(key), _version_key(key))
+    except Exception as e:
+        print(f"Cache get error: {e}")
+        return await _resolve(compute())
+    
+    if value is not None:
+        if fresh is None and refresh is not None:
+            await _aschedule_refresh(key, refresh, soft_ttl, hard_ttl, _swr_version(version))
+        return decode_value(value)
+    
+    return await _asingle_flight(
+        key,
+        compute,
+        store=lambda result: aset_cache_swr(key, result, soft_ttl, hard_ttl, _swr_version(version)),
+        lookup=lambda: _aget_from_redis(key)
+    )
+
+
+async def _aschedule_refresh(key: str, refresh: Callable[[], Any], soft_ttl: int, hard_ttl: int, version: str) -> None:
+    """Start a background refresh unless another worker is already refreshing the key"""
+    refresh_lock = f"{key}:refreshing"
+    try:
+        if not await async_redis_client.set(refresh_lock, 1, nx=True, ex=SWR_REFRESH_LOCK_SECONDS):
+            return
+        _refresh_executor.submit(_run_refresh, key, refresh, soft_ttl, hard_ttl, refresh_lock, version)
+    except Exception as e:
+        print(f"Cache refresh schedule error: {e}")
@@ -0,0 +1,257 @@
+from prometheus_client import Counter
+from app.config import settings
+from app.redis_client import redis_client
+from app.reminders.senders import ReminderSender, get_reminder_sender
+from typing import Iterable, List, Optional, Tuple
+from datetime import date, datetime
+import redis.asyncio
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Reminders waiting for a delivery worker, read through a consumer group
+REMINDER_STREAM_KEY = "reminders:stream"
+REMINDER_GROUP = "reminder-senders"
+REMINDER_STREAM_MAXLEN = 100000
+# Failed deliveries waiting out their backoff, scored by the time they are due again
+REMINDER_RETRY_KEY = "reminders:retry"
+# Deliveries that failed REMINDER_MAX_ATTEMPTS times, newest first
+REMINDER_DEAD_LETTER_KEY = "reminders:dead"
+# Send ledger: one key per habit and local date, claimed before sending so a reminder queued twice
+# (overlapping ticks, a scheduler failover) is sent once. It outlives the longest local day.
+REMINDER_LEDGER_PREFIX = "reminders:sent:"
+REMINDER_LEDGER_TTL_SECONDS = 26 * 3600
+# Entries read by a consumer that died before acknowledging them are taken over after this long
+REMINDER_CLAIM_IDLE_MILLISECONDS = 60000
+
+# Move due retries back onto the stream; members are "attempt|entry id|payload"
+_PROMOTE_RETRIES_SCRIPT = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    local attempt, payload = string.match(member, '^(%d+)|[^|]*|(.*)$')
+    redis.call('zrem', KEYS[1], member)
+    redis.call('xadd', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'payload', payload, 'attempt', attempt)
+end
+return #due
+"""
+
+reminder_deliveries = Counter(
+    "reminder_deliveries_total",
+    "Reminder delivery attempts by result",
+    ["result"]
+)
+reminder_duplicates_suppressed = Counter(
+    "reminder_duplicates_suppressed_total",
+    "Reminders dropped because the send ledger already held them"
+)
+
+
+def reminder_ledger_key(reminder: dict) -> str:
+    """Send ledger key of a reminder; entries queued before reminders carried a date fall back to today"""
+    return f"{REMINDER_LEDGER_PREFIX}{reminder['habit_id']}:{reminder.get('date') or date.today().isoformat()}"
+
+
+def enqueue_reminders(reminders: Iterable[dict]) -> int:
+    """Queue reminders (habit_id, user_id, habit_name, reminder_time, date) for delivery in one round trip"""
+    pipe = redis_client.pipeline(transaction=False)
+    count = 0
+    for reminder in reminders:
+        pipe.xadd(
+            REMINDER_STREAM_KEY,
+            {"payload": json.dumps(reminder), "attempt": 0},
+            maxlen=REMINDER_STREAM_MAXLEN,
+            approximate=True
+        )
+        count += 1
+    if count:
+        pipe.execute()
+    return count
+
+
+class ReminderDeliveryWorker:
+    """
+    Drains the reminder stream in batches, sending up to `concurrency` reminders at once.
+    A failed send is retried after exponential backoff, and dead-lettered after `max_attempts`.
+    """
+    
+    def __init__(
+        self,
+        sender: Optional[ReminderSender] = None,
+        redis_client: Optional[redis.asyncio.Redis] = None,
+        consumer: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        retry_base_seconds: Optional[float] = None
+    ):
+        self.sender = sender or get_reminder_sender()
+        self.redis = redis_client
+        self.consumer = consumer or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency or settings.REMINDER_WORKER_CONCURRENCY
+        self.batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.REMINDER_MAX_ATTEMPTS
+        self.retry_base_seconds = retry_base_seconds or settings.REMINDER_RETRY_BASE_SECONDS
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+    
+    async def run(self) -> None:
+        """Deliver reminders until stopped"""
+        # A client of our own, bound to the event loop this worker runs on
+        owns_client = self.redis is None
+        if owns_client:
+            self.redis = redis.asyncio.Redis(connection_pool=redis.asyncio.ConnectionPool.from_url(
+                settings.REDIS_URL,
+                decode_responses=False,
+                socket_connect_timeout=5,
+                socket_timeout=5
+            ))
+        try:
+            await self.ensure_group()
+            while not self._stopping:
+                try:
+                    await self.run_once(block_milliseconds=1000)
+                except Exception as e:
+                    logger.error(f"Reminder delivery error: {e}", exc_info=True)
+                    await asyncio.sleep(1)
+        finally:
+            if owns_client:
+                await self.redis.connection_pool.disconnect()
+    
+    def start(self) -> None:
+        """Run the worker on its own event loop in a daemon thread"""
+        self._stopping = False
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(),), name="reminder-delivery", daemon=True)
+        self._thread.start()
+        logger.info(f"Reminder delivery worker {self.consumer} started")
+    
+    def stop(self, timeout: float = 10) -> None:
+        """Stop after the batch in progress, waiting for it to be settled"""
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    async def ensure_group(self) -> None:
+        """Create the stream and its consumer group if they do not exist"""
+        try:
+            await self.redis.xgroup_create(REMINDER_STREAM_KEY, REMINDER_GROUP, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+    
+    async def run_once(self, block_milliseconds: Optional[int] = None) -> int:
+        """Deliver one batch: entries abandoned by dead consumers first, then new ones; returns the batch size"""
+        await self.redis.eval(
+            _PROMOTE_RETRIES_SCRIPT, 2, REMINDER_RETRY_KEY, REMINDER_STREAM_KEY,
+            time.time(), self.batch_size, REMINDER_STREAM_MAXLEN
+        )
+        
+        _, entries, _ = await self.redis.xautoclaim(
+            REMINDER_STREAM_KEY, REMINDER_GROUP, self.consumer,
+            min_idle_time=REMINDER_CLAIM_IDLE_MILLISECONDS, start_id="0-0", count=self.batch_size
+        )
+        if not entries:
+            response = await self.redis.xreadgroup(
+                REMINDER_GROUP, self.consumer, {REMINDER_STREAM_KEY: ">"},
+                count=self.batch_size, block=block_milliseconds
+            )
+            entries = response[0][1] if response else []
+        if not entries:
+            return 0
+        
+        claims = await self._claim(entries)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcomes = await asyncio.gather(*(
+            self._send(semaphore, entry_id, fields)
+            for (entry_id, fields), claimed in zip(entries, claims) if claimed
+        ))
+        duplicates = [entry_id for (entry_id, _), claimed in zip(entries, claims) if not claimed]
+        await self._settle(outcomes, duplicates)
+        return len(entries)
+    
+    async def _claim(self, entries: List[Tuple[bytes, dict]]) -> List[bool]:
+        """
+        Claim each entry's reminder in the send ledger in one round trip; False where another entry
+        already claimed it. An entry taken over from a dead consumer finds its own claim and keeps it.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for entry_id, fields in entries:
+            ledger_key = reminder_ledger_key(json.loads(fields[b"payload"]))
+            pipe.set(ledger_key, entry_id, nx=True, ex=REMINDER_LEDGER_TTL_SECONDS)
+            pipe.get(ledger_key)
+        results = await pipe.execute()
+        return [
+            bool(claimed) or holder == entry_id
+            for (entry_id, _), claimed, holder in zip(entries, results[::2], results[1::2])
+        ]
+    
+    async def _send(self, semaphore: asyncio.Semaphore, entry_id: bytes, fields: dict) -> Tuple[bytes, bytes, int, Optional[str]]:
+        """Send one entry; returns its id, payload, attempt number and the error if the send failed"""
+        payload = fields[b"payload"]
+        attempt = int(fields[b"attempt"])
+        async with semaphore:
+            try:
+                await self.sender.send(json.loads(payload))
+                return entry_id, payload, attempt, None
+            except Exception as e:
+                logger.warning(f"Reminder send failed (attempt {attempt + 1}/{self.max_attempts}): {e}")
+                return entry_id, payload, attempt, str(e) or type(e).__name__
+    
+    async def _settle(self, outcomes: List[Tuple[bytes, bytes, int, Optional[str]]], duplicates: List[bytes]) -> None:
+        """
+        Schedule retries, dead-letter exhausted reminders and acknowledge the batch, duplicates included,
+        in one transaction. Failed reminders give up their ledger claim so a retry can send them.
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        results = []
+        for entry_id, payload, attempt, error in outcomes:
+            if error is None:
+                results.append("sent")
+                continue
+            pipe.delete(reminder_ledger_key(json.loads(payload)))
+            if attempt + 1 < self.max_attempts:
+                backoff = self.retry_base_seconds * 2 ** attempt * random.uniform(1, 1.25)
+                pipe.zadd(REMINDER_RETRY_KEY, {
+                    f"{attempt + 1}|{entry_id.decode()}|{payload.decode()}": time.time() + backoff
+                })
+                results.append("retried")
+            else:
+                pipe.lpush(REMINDER_DEAD_LETTER_KEY, json.dumps({
+                    "reminder": json.loads(payload),
+                    "attempts": attempt + 1,
+                    "error": error,
+                    "failed_at": datetime.utcnow().isoformat()
+                }))
+                results.append("dead")
+        entry_ids = [outcome[0] for outcome in outcomes] + duplicates
+        pipe.xack(REMINDER_STREAM_KEY, REMINDER_GROUP, *entry_ids)
+        pipe.xdel(REMINDER_STREAM_KEY, *entry_ids)
+        await pipe.execute()
+        
+        for result in results:
+            reminder_deliveries.labels(result=result).inc()
+        if duplicates:
+            reminder_duplicates_suppressed.inc(len(duplicates))
+
+
+reminder_delivery: Optional[ReminderDeliveryWorker] = None
+
+
+def start_reminder_delivery() -> None:
+    """Start this process's delivery worker"""
+    global reminder_delivery
+    reminder_delivery = ReminderDeliveryWorker()
+    reminder_delivery.start()
+
+
+def stop_reminder_delivery() -> None:
+    """Stop this process's delivery worker, if one was started"""
+    if reminder_delivery is not None:
+        reminder_delivery.stop()
@@ -0,0 +1,65 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, func, update
+from sqlalchemy.engine import Row
+from app.habits.models import Habit
+from app.preferences.models import UserPreference
+from app.completions.models import HabitCompletion
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+
+
+class ReminderRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_due(self, utc_minute: int, utc_today: date) -> List[Row]:
+        """
+        Get the reminders to send for a UTC minute of the day in one query: active habits due then
+        whose owner has reminders enabled and that are not yet completed on the owner's local date
+        """
+        # The local date is the UTC date moved by the habit's day shift, one of -1, 0 or 1
+        local_today = or_(*(
+            and_(Habit.reminder_day_shift == shift, HabitCompletion.completion_date == utc_today + timedelta(days=shift))
+            for shift in (-1, 0, 1)
+        ))
+        return self.db.query(
+            Habit.id.label("habit_id"),
+            Habit.user_id,
+            Habit.name,
+            Habit.reminder_time,
+            Habit.reminder_day_shift
+        ).join(
+            UserPreference, UserPreference.user_id == Habit.user_id
+        ).outerjoin(
+            HabitCompletion,
+            and_(HabitCompletion.habit_id == Habit.id, local_today)
+        ).filter(
+            Habit.reminder_utc_minute == utc_minute,
+            Habit.is_active == True,
+            UserPreference.reminder_enabled == True,
+            HabitCompletion.id.is_(None)
+        ).order_by(Habit.id).all()
+    
+    def get_timezone(self, user_id: int) -> str:
+        """Get a user's timezone, UTC if they have no preferences"""
+        timezone = self.db.query(UserPreference.timezone).filter(UserPreference.user_id == user_id).scalar()
+        return timezone or "UTC"
+    
+    def get_schedule_inputs(self, user_id: Optional[int] = None, expired_at: Optional[datetime] = None) -> List[Row]:
+        """Get (habit_id, reminder_minute, timezone) of habits with a reminder, for one user or with buckets expired at a time"""
+        query = self.db.query(
+            Habit.id.label("habit_id"),
+            Habit.reminder_minute,
+            func.coalesce(UserPreference.timezone, "UTC").label("timezone")
+        ).outerjoin(
+            UserPreference, UserPreference.user_id == Habit.user_id
+        ).filter(Habit.reminder_minute.isnot(None))
+        if user_id is not None:
+            query = query.filter(Habit.user_id == user_id)
+        if expired_at is not None:
+            query = query.filter(Habit.reminder_valid_until <= expired_at.replace(tzinfo=None))
+        return query.all()
+    
+    def save_schedules(self, schedules: List[dict]) -> None:
+        """Save reminder buckets, each a dict of id and bucket columns, in one statement (caller commits)"""
+        self.db.execute(update(Habit), schedules)
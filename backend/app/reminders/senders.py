@@ -0,0 +1,53 @@
+from app.config import settings
+from typing import Dict, List, Type
+from abc import ABC, abstractmethod
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderSender(ABC):
+    """
+    Delivers one reminder to a provider. Raise to have the delivery retried with backoff;
+    blocking provider SDKs should be called through asyncio.to_thread.
+    """
+    
+    @abstractmethod
+    async def send(self, reminder: dict) -> None:
+        """Deliver a reminder, raising if the provider did not accept it"""
+
+
+class LogReminderSender(ReminderSender):
+    """Logs reminders instead of delivering them"""
+    
+    async def send(self, reminder: dict) -> None:
+        logger.info(
+            f"Reminder: User {reminder['user_id']} should complete habit '{reminder['habit_name']}' "
+            f"(ID: {reminder['habit_id']}) at {reminder['reminder_time']}"
+        )
+
+
+class FakeReminderSender(ReminderSender):
+    """Records reminders in memory, failing the first `failures` sends, for local runs and tests"""
+    
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = 0
+        self.sent: List[dict] = []
+    
+    async def send(self, reminder: dict) -> None:
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise RuntimeError(f"Fake send failure {self.attempts}/{self.failures}")
+        self.sent.append(reminder)
+
+
+REMINDER_SENDERS: Dict[str, Type[ReminderSender]] = {
+    "log": LogReminderSender,
+    "fake": FakeReminderSender,
+}
+
+
+def get_reminder_sender() -> ReminderSender:
+    """The sender selected by REMINDER_SENDER"""
+    return REMINDER_SENDERS[settings.REMINDER_SENDER]()
@@ -0,0 +1,122 @@
+from sqlalchemy.orm import Session
+from app.reminders.repository import ReminderRepository
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import logging
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class ReminderService:
+    """
+    Keeps each habit's reminder in its UTC minute bucket: the UTC minute of day at which the local
+    reminder_minute fires in its owner's timezone, valid until that zone's next offset change
+    """
+    
+    def __init__(self, db: Session):
+        self.reminder_repo = ReminderRepository(db)
+        self.db = db
+    
+    def schedule(self, user_id: int, local_minute: Optional[int], now: Optional[datetime] = None) -> dict:
+        """Bucket columns for a habit of this user reminding at a local minute of day"""
+        return reminder_schedule(local_minute, self.reminder_repo.get_timezone(user_id), now)
+    
+    def reschedule_user(self, user_id: int, now: Optional[datetime] = None) -> int:
+        """Recompute a user's reminder buckets; call after their timezone changes. Returns habits rescheduled"""
+        return self._reschedule(self.reminder_repo.get_schedule_inputs(user_id=user_id), now)
+    
+    def reschedule_expired(self, now: Optional[datetime] = None) -> int:
+        """Recompute the buckets that a DST or other offset change has made stale. Returns habits rescheduled"""
+        now = now or datetime.now(timezone.utc)
+        return self._reschedule(self.reminder_repo.get_schedule_inputs(expired_at=now), now)
+    
+    def _reschedule(self, rows, now: Optional[datetime]) -> int:
+        """Compute each habit's bucket, once per distinct local minute and timezone, and save them in one statement"""
+        schedules: Dict[Tuple[int, str], dict] = {}
+        updates = []
+        for row in rows:
+            key = (row.reminder_minute, row.timezone)
+            if key not in schedules:
+                schedules[key] = reminder_schedule(row.reminder_minute, row.timezone, now)
+            updates.append({"id": row.habit_id, **schedules[key]})
+        if updates:
+            self.reminder_repo.save_schedules(updates)
+            self.db.commit()
+        return len(updates)
+
+
+def reminder_schedule(local_minute: Optional[int], timezone_name: Optional[str], now: Optional[datetime] = None) -> dict:
+    """
+    Bucket columns for a reminder at a local minute of day: the UTC minute it fires at, the days the
+    local date is ahead of the UTC date then, and the naive UTC instant the zone's offset next changes
+    """
+    if local_minute is None:
+        return {"reminder_utc_minute": None, "reminder_day_shift": None, "reminder_valid_until": None}
+    now = now or datetime.now(timezone.utc)
+    zone = _zone(timezone_name)
+    offset = int(now.astimezone(zone).utcoffset().total_seconds()) // 60
+    utc_day_minute = local_minute - offset
+    valid_until = next_transition(zone.key, now)
+    if valid_until is not None:
+        # A local time skipped or repeated at the change keeps this bucket until it fires on the day of
+        # the change: late in a skipped hour, and only in the first pass of a repeated one
+        change_day = valid_until.astimezone(zone).date()
+        for day in (change_day - timedelta(days=1), change_day):
+            wall = datetime.combine(day, time(local_minute // 60, local_minute % 60), tzinfo=zone)
+            earlier, later = sorted((wall.astimezone(timezone.utc), wall.replace(fold=1).astimezone(timezone.utc)))
+            if earlier != later:
+                valid_until = max(valid_until, later + timedelta(minutes=1))
+    return {
+        "reminder_utc_minute": utc_day_minute % MINUTES_PER_DAY,
+        "reminder_day_shift": -(utc_day_minute // MINUTES_PER_DAY),
+        "reminder_valid_until": valid_until.replace(tzinfo=None) if valid_until else None
+    }
+
+
+def next_transition(timezone_name: str, after: datetime) -> Optional[datetime]:
+    """First instant after `after` at which the zone's UTC offset changes, or None if it has no upcoming changes"""
+    for year in (after.year, after.year + 1):
+        for transition in _transitions(timezone_name, year):
+            if transition > after:
+                return transition
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _transitions(timezone_name: str, year: int) -> List[datetime]:
+    """UTC offset changes of a zone during a year, to the minute"""
+    zone = ZoneInfo(timezone_name)
+    start = datetime(year, 1, 1, tzinfo=timezone.utc)
+    days = (datetime(year + 1, 1, 1, tzinfo=timezone.utc) - start).days
+    
+    def offset_at(minute: int) -> timedelta:
+        return (start + timedelta(minutes=minute)).astimezone(zone).utcoffset()
+    
+    transitions = []
+    for day in range(days):
+        low, high = day * MINUTES_PER_DAY, (day + 1) * MINUTES_PER_DAY
+        before = offset_at(low)
+        if offset_at(high) == before:
+            continue
+        # Bisect to the first minute with the new offset
+        while high - low > 1:
+            middle = (low + high) // 2
+            if offset_at(middle) == before:
+                low = middle
+            else:
+                high = middle
+        transitions.append(start + timedelta(minutes=high))
+    return transitions
+
+
+def _zone(timezone_name: Optional[str]) -> ZoneInfo:
+    """A user's timezone, falling back to UTC when it is unset or unknown"""
+    try:
+        return ZoneInfo(timezone_name or "UTC")
+    except Exception:
+        logger.warning(f"Scheduling reminders in UTC for unknown timezone {timezone_name!r}")
+        return ZoneInfo("UTC")
@@ -1,16 +1,19 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.database import get_db, get_async_db
 from app.shared.security import decode_access_token
-from app.auth.repository import UserRepository
+from app.auth.repository import UserRepository, AsyncUserRepository
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """Dependency to get current authenticated user"""
     credentials_exception = HTTPException(
@@ -27,8 +30,10 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
     
-    user_repo = UserRepository(db)
-    user = user_repo.get_by_id(user_id)
+    if async_db is not None:
+        user = await AsyncUserRepository(async_db).get_by_id(user_id)
+    else:
+        user = UserRepository(db).get_by_id(user_id)
     if user is None:
         raise credentials_exception
     
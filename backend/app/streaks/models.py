@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime, date
@@ -14,6 +14,11 @@ class Streak(Base):
     longest_streak = Column(Integer, default=0)
     last_completion_date = Column(Date, nullable=True)
     streak_start_date = Column(Date, nullable=True)
+    # Where the run of consecutive days and the chain ending at last_completion_date start, and the
+    # chain's length; kept by completion writes, NULL until a write walks the history to fill them
+    run_start_date = Column(Date, nullable=True)
+    chain_start_date = Column(Date, nullable=True)
+    chain_length = Column(Integer, nullable=True)
     last_calculated_at = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -22,8 +27,13 @@ class Streak(Base):
     user = relationship("User", back_populates="streaks")
     habit = relationship("Habit", back_populates="streaks")
     
-    # Unique constraint on user_id and habit_id
+    # Unique constraint on user_id and habit_id; partial index over live chains for the day rollover
     __table_args__ = (
         UniqueConstraint('user_id', 'habit_id', name='uq_user_habit_streak'),
+        Index(
+            'ix_streaks_current_chain', 'user_id', 'streak_start_date',
+            postgresql_where=text('current_streak > 0'),
+            sqlite_where=text('current_streak > 0')
+        ),
     )
 
@@ -0,0 +1,337 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update, exists, case, and_, or_, literal, cast, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app.streaks.models import Streak
+from app.habits.models import Habit
+from app.completions.models import HabitCompletion
+from app.auth.models import User
+from app.preferences.models import UserPreference
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
+
+
+class StreakRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_for_update(self, user_id: int, habit_id: int) -> Optional[Streak]:
+        """Get the streak row of a habit, locked until the caller commits"""
+        return self.db.query(Streak).filter(
+            Streak.user_id == user_id,
+            Streak.habit_id == habit_id
+        ).with_for_update().first()
+    
+    def create(self, user_id: int, habit_id: int) -> Streak:
+        """Create an empty streak row, returning the existing one if a concurrent write created it first"""
+        try:
+            with self.db.begin_nested():
+                streak = Streak(user_id=user_id, habit_id=habit_id, current_streak=0, longest_streak=0)
+                self.db.add(streak)
+            return streak
+        except IntegrityError:
+            return self.get_for_update(user_id, habit_id)
+    
+    def get_dates_on_or_before(self, user_id: int, habit_id: int, day: date, limit: int) -> List[date]:
+        """Get up to `limit` completion dates on or before a day, newest first"""
+        rows = self.db.query(HabitCompletion.completion_date).filter(
+            HabitCompletion.user_id == user_id,
+            HabitCompletion.habit_id == habit_id,
+            HabitCompletion.completion_date <= day
+        ).order_by(HabitCompletion.completion_date.desc()).limit(limit).all()
+        return [row.completion_date for row in rows]
+    
+    def get_dates_on_or_after(self, user_id: int, habit_id: int, day: date, limit: int) -> List[date]:
+        """Get up to `limit` completion dates on or after a day, oldest first"""
+        rows = self.db.query(HabitCompletion.completion_date).filter(
+            HabitCompletion.user_id == user_id,
+            HabitCompletion.habit_id == habit_id,
+            HabitCompletion.completion_date >= day
+        ).order_by(HabitCompletion.completion_date).limit(limit).all()
+        return [row.completion_date for row in rows]
+    
+    def get_all_dates(self, user_id: int, habit_id: int) -> List[date]:
+        """Get every completion date of a habit, newest first"""
+        rows = self.db.query(HabitCompletion.completion_date).filter(
+            HabitCompletion.user_id == user_id,
+            HabitCompletion.habit_id == habit_id
+        ).order_by(HabitCompletion.completion_date.desc()).all()
+        return [row.completion_date for row in rows]
+    
+    def get_last_completion_date(self, user_id: int, habit_id: int) -> Optional[date]:
+        """Get the latest completion date of a habit"""
+        return self.db.query(func.max(HabitCompletion.completion_date)).filter(
+            HabitCompletion.user_id == user_id,
+            HabitCompletion.habit_id == habit_id
+        ).scalar()
+    
+    def upsert_computed(self, today: date, *habit_criteria) -> List[int]:
+        """
+        Compute current and longest streaks for every habit matching habit_criteria in one
+        set-based statement and upsert them. Returns the user ids whose rows changed (caller commits).
+        """
+        dialect = self.db.get_bind().dialect.name
+        summary = streak_summary_query(dialect, today, *habit_criteria).subquery()
+        now = datetime.utcnow()
+        
+        insert = _insert_for(dialect)(Streak).from_select(
+            [
+                "user_id", "habit_id", "current_streak", "longest_streak", "last_completion_date",
+                "streak_start_date", "last_calculated_at", "created_at", "updated_at"
+            ],
+            select(
+                summary.c.user_id,
+                summary.c.habit_id,
+                summary.c.current_streak,
+                summary.c.longest_streak,
+                summary.c.last_completion_date,
+                summary.c.streak_start_date,
+                literal(now),
+                literal(now),
+                literal(now)
+            ).where(summary.c.habit_id.isnot(None))
+        )
+        return [row.user_id for row in self.db.execute(_upsert_changed(dialect, insert))]
+    
+    def upsert_many(self, rows: List[dict]) -> List[int]:
+        """
+        Upsert computed streak rows (user_id, habit_id, current_streak, longest_streak,
+        last_completion_date, streak_start_date) in one statement. Returns the user ids whose rows changed (caller commits).
+        """
+        if not rows:
+            return []
+        dialect = self.db.get_bind().dialect.name
+        now = datetime.utcnow()
+        insert = _insert_for(dialect)(Streak).values([
+            {**row, "last_calculated_at": now, "created_at": now, "updated_at": now}
+            for row in rows
+        ])
+        return [row.user_id for row in self.db.execute(_upsert_changed(dialect, insert))]
+    
+    def reset_habits(self, habit_ids: List[int]) -> List[int]:
+        """Zero the existing streak rows of habits that have no completions (caller commits)"""
+        if not habit_ids:
+            return []
+        return self.reset_without_completions(Habit.id.in_(habit_ids))
+    
+    def get_dates_by_habit(self, habit_ids: List[int]) -> Dict[int, List[date]]:
+        """Get the completion dates of several habits in one query, newest first per habit"""
+        rows = self.db.query(HabitCompletion.habit_id, HabitCompletion.completion_date).filter(
+            HabitCompletion.habit_id.in_(habit_ids)
+        ).order_by(HabitCompletion.habit_id, HabitCompletion.completion_date.desc()).all()
+        
+        dates_by_habit = {}
+        for row in rows:
+            dates_by_habit.setdefault(row.habit_id, []).append(row.completion_date)
+        return dates_by_habit
+    
+    def boundary_habit_ids(self, today: date):
+        """
+        Select active habits with a recent or future-dated completion not yet in the current chain.
+        Chains broken by the passing day are zeroed by roll_over in the user's own timezone.
+        """
+        yesterday = today - timedelta(days=1)
+        return select(Streak.habit_id).join(
+            Habit, Habit.id == Streak.habit_id
+        ).where(
+            Habit.is_active == True,
+            Streak.last_completion_date >= yesterday,
+            or_(Streak.streak_start_date.is_(None), Streak.last_completion_date > Streak.streak_start_date)
+        )
+    
+    def get_timezones(self) -> List[str]:
+        """Get the distinct timezones users have chosen, plus UTC for users without preferences"""
+        rows = self.db.query(UserPreference.timezone).filter(UserPreference.timezone.isnot(None)).distinct().all()
+        return sorted({row.timezone for row in rows} | {"UTC"})
+    
+    def get_timezone(self, user_id: int) -> str:
+        """Get a user's timezone, UTC if they have no preferences"""
+        timezone = self.db.query(UserPreference.timezone).filter(UserPreference.user_id == user_id).scalar()
+        return timezone or "UTC"
+    
+    def users_in_timezones(self, timezones: List[str]):
+        """Select the ids of users in the given timezones; users without a preference row count as UTC"""
+        return select(User.id).outerjoin(
+            UserPreference, UserPreference.user_id == User.id
+        ).where(func.coalesce(UserPreference.timezone, "UTC").in_(timezones))
+    
+    def roll_over(self, local_today: date, timezones: List[str]) -> List[int]:
+        """
+        Zero the current streaks of users in the given timezones whose chain ended before
+        local yesterday, in one statement on ix_streaks_current_chain. Returns the user ids (caller commits).
+        """
+        if not timezones:
+            return []
+        local_yesterday = local_today - timedelta(days=1)
+        
+        stmt = update(Streak).where(
+            Streak.current_streak > 0,
+            Streak.user_id.in_(self.users_in_timezones(timezones)),
+            or_(Streak.streak_start_date.is_(None), Streak.streak_start_date < local_yesterday)
+        ).values(
+            current_streak=0,
+            streak_start_date=None,
+            last_calculated_at=datetime.utcnow()
+        ).returning(Streak.user_id).execution_options(synchronize_session=False)
+        
+        return [row.user_id for row in self.db.execute(stmt)]
+    
+    def reset_without_completions(self, *habit_criteria) -> List[int]:
+        """Zero the streak rows of matching habits that have no completions left (caller commits)"""
+        stmt = update(Streak).where(
+            Streak.habit_id.in_(select(Habit.id).where(*habit_criteria)),
+            ~exists().where(HabitCompletion.habit_id == Streak.habit_id),
+            or_(
+                Streak.current_streak != 0,
+                Streak.last_completion_date.isnot(None),
+                Streak.streak_start_date.isnot(None)
+            )
+        ).values(
+            current_streak=0,
+            last_completion_date=None,
+            streak_start_date=None,
+            run_start_date=None,
+            chain_start_date=None,
+            chain_length=None,
+            last_calculated_at=datetime.utcnow()
+        ).returning(Streak.user_id).execution_options(synchronize_session=False)
+        
+        return [row.user_id for row in self.db.execute(stmt)]
+
+
+def streak_summary_query(dialect: str, today: date, *habit_criteria):
+    """
+    Gaps-and-islands over completion dates, one row per habit that has completions:
+    longest_streak is the largest run of consecutive days; current_streak is the chain ending
+    at the latest date on or before today, allowing one missed day, if that date is today or yesterday.
+    """
+    completions = select(
+        HabitCompletion.user_id,
+        HabitCompletion.habit_id,
+        HabitCompletion.completion_date,
+        _day_number(dialect, HabitCompletion.completion_date).label("day_number")
+    ).join(
+        Habit, Habit.id == HabitCompletion.habit_id
+    ).where(*habit_criteria).subquery("completions")
+    
+    # Consecutive days share day_number - row_number
+    runs = select(
+        completions.c.user_id,
+        completions.c.habit_id,
+        completions.c.completion_date,
+        (
+            completions.c.day_number
+            - func.row_number().over(partition_by=completions.c.habit_id, order_by=completions.c.completion_date)
+        ).label("run_key")
+    ).subquery("runs")
+    
+    run_lengths = select(
+        runs.c.user_id,
+        runs.c.habit_id,
+        func.count().label("run_length"),
+        func.max(runs.c.completion_date).label("run_end")
+    ).group_by(runs.c.user_id, runs.c.habit_id, runs.c.run_key).subquery("run_lengths")
+    
+    longest = select(
+        run_lengths.c.user_id,
+        run_lengths.c.habit_id,
+        func.max(run_lengths.c.run_length).label("longest_streak"),
+        func.max(run_lengths.c.run_end).label("last_completion_date")
+    ).group_by(run_lengths.c.user_id, run_lengths.c.habit_id).subquery("longest")
+    
+    # The current chain tolerates gaps of up to two days between completions
+    gaps = select(
+        completions.c.habit_id,
+        completions.c.completion_date,
+        (
+            completions.c.day_number
+            - func.lag(completions.c.day_number).over(partition_by=completions.c.habit_id, order_by=completions.c.completion_date)
+        ).label("gap")
+    ).where(completions.c.completion_date <= today).subquery("gaps")
+    
+    chains = select(
+        gaps.c.habit_id,
+        gaps.c.completion_date,
+        func.sum(
+            case((or_(gaps.c.gap.is_(None), gaps.c.gap > 2), 1), else_=0)
+        ).over(
+            partition_by=gaps.c.habit_id,
+            order_by=gaps.c.completion_date,
+            rows=(None, 0)
+        ).label("chain_id")
+    ).subquery("chains")
+    
+    last_chain = select(
+        chains.c.habit_id,
+        chains.c.completion_date,
+        chains.c.chain_id,
+        func.max(chains.c.chain_id).over(partition_by=chains.c.habit_id).label("last_chain_id")
+    ).subquery("last_chain")
+    
+    current = select(
+        last_chain.c.habit_id,
+        func.count().label("chain_length"),
+        func.max(last_chain.c.completion_date).label("chain_end")
+    ).where(
+        last_chain.c.chain_id == last_chain.c.last_chain_id
+    ).group_by(last_chain.c.habit_id).subquery("current_chain")
+    
+    chain_is_current = and_(current.c.chain_end.isnot(None), current.c.chain_end >= today - timedelta(days=1))
+    return select(
+        longest.c.user_id,
+        longest.c.habit_id,
+        case((chain_is_current, current.c.chain_length), else_=0).label("current_streak"),
+        longest.c.longest_streak,
+        longest.c.last_completion_date,
+        case((chain_is_current, current.c.chain_end), else_=None).label("streak_start_date")
+    ).outerjoin(current, current.c.habit_id == longest.c.habit_id)
+
+
+def _upsert_changed(dialect: str, insert):
+    """
+    ON CONFLICT clause that only rewrites rows whose values changed; the longest streak never decreases.
+    The engine does not compute run and chain boundaries, so rewritten rows have them cleared for the next
+    completion write to rebuild.
+    """
+    excluded = insert.excluded
+    return insert.on_conflict_do_update(
+        index_elements=["user_id", "habit_id"],
+        set_={
+            "current_streak": excluded.current_streak,
+            "longest_streak": _greatest(dialect, Streak.longest_streak, excluded.longest_streak),
+            "last_completion_date": excluded.last_completion_date,
+            "streak_start_date": excluded.streak_start_date,
+            "run_start_date": None,
+            "chain_start_date": None,
+            "chain_length": None,
+            "last_calculated_at": excluded.last_calculated_at,
+            "updated_at": excluded.updated_at
+        },
+        where=or_(
+            Streak.current_streak.is_distinct_from(excluded.current_streak),
+            Streak.longest_streak < excluded.longest_streak,
+            Streak.last_completion_date.is_distinct_from(excluded.last_completion_date),
+            Streak.streak_start_date.is_distinct_from(excluded.streak_start_date)
+        )
+    ).returning(Streak.user_id)
+
+
+def _day_number(dialect: str, column):
+    """Whole days since a fixed epoch, so date differences are integer arithmetic"""
+    if dialect == "sqlite":
+        return cast(func.julianday(column), Integer)
+    return column - cast(literal("1970-01-01"), column.type)
+
+
+def _greatest(dialect: str, left, right):
+    """Larger of two values"""
+    if dialect == "sqlite":
+        return func.max(left, right)
+    return func.greatest(left, right)
+
+
+def _insert_for(dialect: str):
+    """Dialect insert construct supporting ON CONFLICT"""
+    if dialect == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
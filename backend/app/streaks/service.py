@@ -0,0 +1,450 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from app.streaks.repository import StreakRepository
+from app.streaks.models import Streak
+from app.habits.models import Habit
+from app.habits.bitmap import CompletionBitmap
+from app.redis_client import redis_client, invalidate
+from app.config import settings
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Completion dates fetched per query while walking a run
+DATE_PAGE_SIZE = 32
+
+# Redis set of the ids of habits whose streaks changed since the last streak job
+STREAK_DIRTY_KEY = "streaks:dirty"
+# Members claimed by a running streak job; a failed run leaves them for the next one
+STREAK_DIRTY_PROCESSING_KEY = "streaks:dirty:processing"
+
+
+class StreakService:
+    """Keeps a habit's Streak row current as completions are written (callers commit)"""
+    
+    def __init__(self, db: Session):
+        self.streak_repo = StreakRepository(db)
+        self.db = db
+    
+    def completion_added(self, user_id: int, habit_id: int, completion_date: date) -> None:
+        """Extend the run and chain ending at the last completion date, or merge runs around a back-dated date"""
+        streak = self.streak_repo.get_for_update(user_id, habit_id)
+        if streak is None:
+            # No row yet, so there is no longest streak to build on
+            self.recompute(user_id, habit_id)
+            return
+        
+        last_date = streak.last_completion_date
+        if last_date is not None and completion_date <= last_date:
+            # A back-dated date joins the runs that ended the day before and started the day after
+            run_length = (
+                1
+                + _consecutive(self._dates_before(user_id, habit_id, completion_date - timedelta(days=1)), completion_date, -1)
+                + _consecutive(self._dates_after(user_id, habit_id, completion_date + timedelta(days=1)), completion_date, 1)
+            )
+            streak.longest_streak = max(streak.longest_streak or 0, run_length)
+            # Only a date within two days of the chain can merge into it
+            if streak.chain_length is None or completion_date >= streak.chain_start_date - timedelta(days=2):
+                self._rebuild_boundaries(streak, user_id, habit_id)
+        elif streak.chain_length is None:
+            streak.last_completion_date = completion_date
+            self._rebuild_boundaries(streak, user_id, habit_id)
+        else:
+            # The common case, completing today: extend the run and chain without reading any dates
+            gap = (completion_date - last_date).days
+            if gap > 1:
+                streak.run_start_date = completion_date
+            if gap > 2:
+                streak.chain_start_date = completion_date
+                streak.chain_length = 1
+            else:
+                streak.chain_length += 1
+            streak.last_completion_date = completion_date
+        
+        streak.longest_streak = max(
+            streak.longest_streak or 0,
+            (streak.last_completion_date - streak.run_start_date).days + 1
+        )
+        self._set_current(streak, user_id)
+    
+    def completion_removed(self, user_id: int, habit_id: int, completion_date: date) -> None:
+        """Shrink the run and chain ending at the last completion date, or split the chain around a removed date"""
+        streak = self.streak_repo.get_for_update(user_id, habit_id)
+        if streak is None or streak.last_completion_date is None:
+            return
+        
+        # The longest streak is a high-water mark and is kept when its run is split
+        last_date = streak.last_completion_date
+        known = streak.chain_length is not None
+        if known and not streak.chain_start_date <= completion_date <= last_date:
+            # Outside the chain, which is left as it is
+            return
+        if known and streak.run_start_date < completion_date == last_date:
+            # The run ends a day earlier
+            streak.last_completion_date = last_date - timedelta(days=1)
+            streak.chain_length -= 1
+        elif known and streak.run_start_date < completion_date < last_date:
+            # The run restarts after the removed day; the chain tolerates the one missed day
+            streak.run_start_date = completion_date + timedelta(days=1)
+            streak.chain_length -= 1
+        elif known and streak.run_start_date == completion_date < last_date:
+            # The day before the run was missed, so the chain breaks where the run restarts
+            streak.run_start_date = streak.chain_start_date = completion_date + timedelta(days=1)
+            streak.chain_length = (last_date - completion_date).days
+        else:
+            # Splitting the chain before its run, or removing a run of one day: walk the dates left
+            if completion_date == last_date:
+                streak.last_completion_date = self.streak_repo.get_last_completion_date(user_id, habit_id)
+            self._rebuild_boundaries(streak, user_id, habit_id)
+        self._set_current(streak, user_id)
+    
+    def recompute(self, user_id: int, habit_id: int) -> Optional[Streak]:
+        """Rebuild a habit's streak from its full completion history (repair path)"""
+        completion_dates = self.streak_repo.get_all_dates(user_id, habit_id)
+        streak = self.streak_repo.get_for_update(user_id, habit_id)
+        
+        if not completion_dates:
+            if streak:
+                streak.current_streak = 0
+                streak.last_completion_date = None
+                streak.streak_start_date = None
+                streak.run_start_date = None
+                streak.chain_start_date = None
+                streak.chain_length = None
+                streak.last_calculated_at = datetime.utcnow()
+                self.db.flush()
+            return streak
+        
+        current_streak, streak_start_date = compute_current_streak(completion_dates, self._today(user_id))
+        if streak is None:
+            streak = self.streak_repo.create(user_id, habit_id)
+        streak.current_streak = current_streak
+        streak.longest_streak = max(streak.longest_streak or 0, compute_longest_streak(completion_dates))
+        streak.last_completion_date = completion_dates[0]
+        streak.streak_start_date = streak_start_date
+        streak.run_start_date, streak.chain_start_date, streak.chain_length = _chain_back(completion_dates)
+        streak.last_calculated_at = datetime.utcnow()
+        self.db.flush()
+        return streak
+    
+    def recompute_set(self, *habit_criteria) -> Set[int]:
+        """
+        Rebuild the streaks of every matching habit with the set-based SQL engine, one statement per
+        local date its owners' timezones are on, returning affected user ids
+        """
+        user_ids = set()
+        for local_today, timezones in zones_by_local_date(self.streak_repo.get_timezones()).items():
+            user_ids.update(self.streak_repo.upsert_computed(
+                local_today, Habit.user_id.in_(self.streak_repo.users_in_timezones(timezones)), *habit_criteria
+            ))
+        user_ids.update(self.streak_repo.reset_without_completions(*habit_criteria))
+        return user_ids
+    
+    def recompute_due(self, dirty_habit_ids: Iterable[int], *habit_criteria) -> Set[int]:
+        """Rebuild the streaks of dirty habits and habits whose streak may have changed at the day boundary"""
+        return self.recompute_set(self.due_scope(dirty_habit_ids), *habit_criteria)
+    
+    def due_scope(self, dirty_habit_ids: Iterable[int]):
+        """Criterion matching dirty habits and habits whose streak may have changed at the day boundary"""
+        # The earliest local date any owner is on covers every later one
+        earliest_today = min(zones_by_local_date(self.streak_repo.get_timezones()))
+        scope = Habit.id.in_(self.streak_repo.boundary_habit_ids(earliest_today))
+        dirty_habit_ids = sorted(set(dirty_habit_ids))
+        if dirty_habit_ids:
+            scope = or_(scope, Habit.id.in_(dirty_habit_ids))
+        return scope
+    
+    def roll_over(self, now: Optional[datetime] = None, since: Optional[datetime] = None) -> Set[int]:
+        """
+        Zero the chains broken in the timezones whose local midnight passed after `since`, or in every
+        timezone without it, returning affected user ids; safe to repeat
+        """
+        now = now or datetime.now(timezone.utc)
+        timezones = self.streak_repo.get_timezones()
+        if since is not None:
+            timezones = [name for name in timezones if local_today(name, since) != local_today(name, now)]
+        user_ids = set()
+        for local_today_date, zone_group in zones_by_local_date(timezones, now).items():
+            user_ids.update(self.streak_repo.roll_over(local_today_date, zone_group))
+        return user_ids
+    
+    def _set_current(self, streak: Streak, user_id: int) -> None:
+        """Set the current streak from the stored chain, which is current if it ends today or yesterday"""
+        today = self._today(user_id)
+        last_date = streak.last_completion_date
+        if last_date is not None and last_date > today:
+            # A future-dated completion ends the stored chain, so walk back from today instead
+            self._refresh_current(streak, user_id, streak.habit_id, today)
+            return
+        if last_date is not None and last_date >= today - timedelta(days=1):
+            streak.current_streak, streak.streak_start_date = streak.chain_length, last_date
+        else:
+            streak.current_streak, streak.streak_start_date = 0, None
+        streak.last_calculated_at = datetime.utcnow()
+        self.db.flush()
+    
+    def _refresh_current(self, streak: Streak, user_id: int, habit_id: int, today: date) -> None:
+        """Walk the current chain back from the owner's local today, one page of dates at a time"""
+        streak.current_streak, streak.streak_start_date = compute_current_streak(
+            self._dates_before(user_id, habit_id, today),
+            today
+        )
+        streak.last_calculated_at = datetime.utcnow()
+        self.db.flush()
+    
+    def _rebuild_boundaries(self, streak: Streak, user_id: int, habit_id: int) -> None:
+        """Walk back from the last completion date to where its run and chain start, one page of dates at a time"""
+        if streak.last_completion_date is None:
+            streak.run_start_date = streak.chain_start_date = streak.chain_length = None
+            return
+        streak.run_start_date, streak.chain_start_date, streak.chain_length = _chain_back(
+            self._dates_before(user_id, habit_id, streak.last_completion_date)
+        )
+    
+    def _today(self, user_id: int) -> date:
+        """The current date in a user's timezone"""
+        return local_today(self.streak_repo.get_timezone(user_id))
+    
+    def _dates_before(self, user_id: int, habit_id: int, day: date) -> Iterator[date]:
+        """Lazily yield completion dates on or before a day, newest first"""
+        return _paged(lambda cursor: self.streak_repo.get_dates_on_or_before(user_id, habit_id, cursor, DATE_PAGE_SIZE), day, -1)
+    
+    def _dates_after(self, user_id: int, habit_id: int, day: date) -> Iterator[date]:
+        """Lazily yield completion dates on or after a day, oldest first"""
+        return _paged(lambda cursor: self.streak_repo.get_dates_on_or_after(user_id, habit_id, cursor, DATE_PAGE_SIZE), day, 1)
+
+
+class StreakWriter:
+    """
+    Accumulates streaks computed habit by habit and persists them in batches: one upsert,
+    one reset statement and one commit per batch, then one pipelined round trip marking
+    the affected users' caches stale.
+    """
+    
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        self.streak_repo = StreakRepository(db)
+        self.db = db
+        self.batch_size = batch_size or settings.STREAK_UPSERT_BATCH_SIZE
+        self.now = datetime.now(timezone.utc)
+        self.today_by_timezone: Dict[Optional[str], date] = {}
+        self.pending_rows = []
+        self.pending_resets = []
+        self.user_ids_changed = set()
+    
+    def add(self, user_id: int, habit_id: int, completion_dates: List[date], timezone_name: Optional[str] = None) -> None:
+        """Queue the streak computed from a habit's completion dates, newest first, in its owner's timezone"""
+        if not completion_dates:
+            self._queue_reset(habit_id)
+            return
+        
+        current_streak, streak_start_date = compute_current_streak(completion_dates, self.today(timezone_name))
+        self._queue_row(
+            user_id, habit_id, current_streak, compute_longest_streak(completion_dates),
+            completion_dates[0], streak_start_date
+        )
+    
+    def add_bitmap(self, user_id: int, habit_id: int, bitmap: CompletionBitmap, timezone_name: Optional[str] = None) -> None:
+        """Queue the streak computed from a habit's completion bitmap, in its owner's timezone"""
+        if bitmap.is_empty():
+            self._queue_reset(habit_id)
+            return
+        
+        current_streak, streak_start_date = bitmap.current_streak(self.today(timezone_name))
+        self._queue_row(
+            user_id, habit_id, current_streak, bitmap.longest_streak(),
+            bitmap.last_completion_date(), streak_start_date
+        )
+    
+    def today(self, timezone_name: Optional[str]) -> date:
+        """The date in a timezone when this writer was created, UTC for users without one"""
+        if timezone_name not in self.today_by_timezone:
+            self.today_by_timezone[timezone_name] = local_today(timezone_name, self.now)
+        return self.today_by_timezone[timezone_name]
+    
+    def _queue_row(
+        self,
+        user_id: int,
+        habit_id: int,
+        current_streak: int,
+        longest_streak: int,
+        last_completion_date: date,
+        streak_start_date: Optional[date]
+    ) -> None:
+        """Queue a computed streak row for the next upsert"""
+        self.pending_rows.append({
+            "user_id": user_id,
+            "habit_id": habit_id,
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+            "last_completion_date": last_completion_date,
+            "streak_start_date": streak_start_date
+        })
+        self._flush_if_full()
+    
+    def _queue_reset(self, habit_id: int) -> None:
+        """Queue a habit without completions; like a full recompute, this only resets an existing row"""
+        self.pending_resets.append(habit_id)
+        self._flush_if_full()
+    
+    def _flush_if_full(self) -> None:
+        """Flush once a batch has accumulated"""
+        if len(self.pending_rows) + len(self.pending_resets) >= self.batch_size:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Write and commit the queued streaks, then invalidate caches of users whose streaks changed"""
+        if not self.pending_rows and not self.pending_resets:
+            return
+        
+        try:
+            user_ids = set(self.streak_repo.upsert_many(self.pending_rows))
+            user_ids.update(self.streak_repo.reset_habits(self.pending_resets))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self.pending_rows = []
+            self.pending_resets = []
+        
+        invalidate_streak_caches(user_ids)
+        self.user_ids_changed.update(user_ids)
+
+
+def compute_current_streak(completion_dates: Iterable[date], today: date) -> Tuple[int, Optional[date]]:
+    """
+    Count the current streak from completion dates, newest first.
+    The chain starts today or yesterday and tolerates one missed day between completions;
+    the returned start date is the newest date in the chain.
+    """
+    current_streak = 0
+    streak_start_date = None
+    expected_date = today
+    for completion_date in completion_dates:
+        if completion_date == expected_date or completion_date == expected_date - timedelta(days=1):
+            if current_streak == 0:
+                streak_start_date = completion_date
+            current_streak += 1
+            expected_date = completion_date - timedelta(days=1)
+        elif completion_date < expected_date:
+            break
+    return current_streak, streak_start_date
+
+
+def compute_longest_streak(completion_dates: List[date]) -> int:
+    """Length of the longest run of consecutive days in completion dates, newest first"""
+    if not completion_dates:
+        return 0
+    
+    longest_streak = 0
+    temp_streak = 1
+    for i in range(1, len(completion_dates)):
+        if (completion_dates[i-1] - completion_dates[i]).days == 1:
+            temp_streak += 1
+        else:
+            if temp_streak > longest_streak:
+                longest_streak = temp_streak
+            temp_streak = 1
+    if temp_streak > longest_streak:
+        longest_streak = temp_streak
+    return longest_streak
+
+
+def zones_by_local_date(timezones: Iterable[str], now: Optional[datetime] = None) -> Dict[date, List[str]]:
+    """Group timezones by their current local date; unknown zones are on the UTC date"""
+    now = now or datetime.now(timezone.utc)
+    zones_by_date = {}
+    for name in timezones:
+        zones_by_date.setdefault(local_today(name, now), []).append(name)
+    return zones_by_date
+
+
+def local_today(timezone_name: Optional[str], now: Optional[datetime] = None) -> date:
+    """The current date in a timezone, in UTC when it is unset or unknown"""
+    now = now or datetime.now(timezone.utc)
+    try:
+        return now.astimezone(ZoneInfo(timezone_name or "UTC")).date()
+    except Exception:
+        logger.warning(f"Using the UTC date for unknown timezone {timezone_name!r}")
+        return now.astimezone(timezone.utc).date()
+
+
+def _paged(fetch: Callable[[date], List[date]], start: date, step: int) -> Iterator[date]:
+    """Yield dates page by page, moving the cursor past the last date of each full page"""
+    cursor = start
+    while True:
+        page = fetch(cursor)
+        yield from page
+        if len(page) < DATE_PAGE_SIZE:
+            return
+        cursor = page[-1] + timedelta(days=step)
+
+
+def _chain_back(completion_dates: Iterable[date]) -> Tuple[date, date, int]:
+    """
+    Walk completion dates back from the newest: where the run of consecutive days and the chain
+    allowing one missed day that end at the newest date start, and how many dates the chain holds
+    """
+    run_start = chain_start = None
+    chain_length = 0
+    for completion_date in completion_dates:
+        if chain_start is None:
+            run_start = completion_date
+        elif (chain_start - completion_date).days > 2:
+            break
+        elif run_start == chain_start and (run_start - completion_date).days == 1:
+            run_start = completion_date
+        chain_start = completion_date
+        chain_length += 1
+    return run_start, chain_start, chain_length
+
+
+def _consecutive(completion_dates: Iterable[date], anchor: date, step: int) -> int:
+    """Count dates that continue a run day by day away from an anchor date"""
+    count = 0
+    expected_date = anchor + timedelta(days=step)
+    for completion_date in completion_dates:
+        if completion_date != expected_date:
+            break
+        count += 1
+        expected_date += timedelta(days=step)
+    return count
+
+
+def invalidate_streak_caches(user_ids: Iterable[int]) -> None:
+    """Mark the analytics and streak caches of users whose streaks changed stale, in one round trip"""
+    invalidate(stale_keys=[
+        key
+        for user_id in sorted(user_ids)
+        for key in (f"analytics:user:{user_id}", f"streaks:user:{user_id}")
+    ])
+
+
+def claim_dirty_habits() -> Optional[List[int]]:
+    """
+    Atomically move the dirty set aside for processing and return its habit ids,
+    including any left behind by a failed run. Returns None if Redis is unavailable.
+    """
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.sunionstore(STREAK_DIRTY_PROCESSING_KEY, [STREAK_DIRTY_PROCESSING_KEY, STREAK_DIRTY_KEY])
+        pipe.delete(STREAK_DIRTY_KEY)
+        pipe.smembers(STREAK_DIRTY_PROCESSING_KEY)
+        _, _, members = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Streak dirty set claim error: {e}")
+        return None
+    
+    # Members written before the set held plain ids are "user_id:habit_id"
+    return [int(member.rsplit(b":", 1)[-1]) for member in members]
+
+
+def release_dirty_habits() -> None:
+    """Drop the claimed dirty set once its habits are committed"""
+    try:
+        redis_client.delete(STREAK_DIRTY_PROCESSING_KEY)
+    except Exception as e:
+        logger.error(f"Streak dirty set release error: {e}")
@@ -0,0 +1,119 @@
+"""
+Compare cache codecs on realistic analytics payloads.
+
+Run from the backend directory:
+
+    python -m benchmarks.cache_codec_benchmark --habits 40 --iterations 2000
+
+Reports payload size and mean encode/decode time per codec, with and without
+compression, for AnalyticsResponse-shaped dicts with 30-day charts and per-habit stats.
+"""
+import os
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.redis_client import JsonCodec, MsgpackCodec, decode_value
+from datetime import date, timedelta
+import argparse
+import random
+import time
+
+NO_COMPRESSION = 1 << 30
+
+
+def build_analytics_payload(habit_count: int, seed: int) -> dict:
+    """Build an analytics dict shaped like AnalyticsResponse"""
+    rng = random.Random(seed)
+    today = date.today()
+    month_start = date(today.year, today.month, 1)
+    week_start = today - timedelta(days=today.weekday())
+    
+    def day_chart(start: date, days: int) -> dict:
+        return {
+            (start + timedelta(days=offset)).isoformat(): rng.randint(0, habit_count)
+            for offset in range(days)
+        }
+    
+    streaks = []
+    habit_stats = []
+    for habit_id in range(1, habit_count + 1):
+        last_completion = (today - timedelta(days=rng.randint(0, 5))).isoformat()
+        streaks.append({
+            "habit_id": habit_id,
+            "habit_name": f"Habit number {habit_id}",
+            "current_streak": rng.randint(0, 60),
+            "longest_streak": rng.randint(0, 365),
+            "last_completion_date": last_completion,
+            "streak_start_date": last_completion
+        })
+        habit_stats.append({
+            "habit_id": habit_id,
+            "habit_name": f"Habit number {habit_id}",
+            "total_completions": rng.randint(0, 31),
+            "current_streak": rng.randint(0, 60),
+            "longest_streak": rng.randint(0, 365),
+            "completion_rate": rng.random() * 100,
+            "last_completion_date": last_completion
+        })
+    
+    return {
+        "total_habits": habit_count,
+        "active_habits": habit_count,
+        "total_completions": rng.randint(0, 100000),
+        "completions_this_week": rng.randint(0, 300),
+        "completions_this_month": rng.randint(0, 1200),
+        "overall_completion_rate": round(rng.random() * 100, 2),
+        "streaks": streaks,
+        "habit_stats": habit_stats,
+        "weekly_completions": day_chart(week_start, 7),
+        "monthly_completions": day_chart(month_start, 30)
+    }
+
+
+def time_codec(codec, payloads: list, iterations: int) -> dict:
+    """Time encode and decode of payloads with one codec"""
+    encoded = [codec.encode(payload) for payload in payloads]
+    
+    start = time.perf_counter()
+    for i in range(iterations):
+        codec.encode(payloads[i % len(payloads)])
+    encode_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for i in range(iterations):
+        decode_value(encoded[i % len(encoded)])
+    decode_seconds = time.perf_counter() - start
+    
+    return {
+        "size": sum(len(payload) for payload in encoded) / len(encoded),
+        "encode_us": encode_seconds / iterations * 1e6,
+        "decode_us": decode_seconds / iterations * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cache codecs on analytics payloads")
+    parser.add_argument("--habits", type=int, default=40, help="Habits per analytics payload")
+    parser.add_argument("--payloads", type=int, default=20, help="Distinct payloads to cycle through")
+    parser.add_argument("--iterations", type=int, default=2000, help="Encode/decode calls per codec")
+    parser.add_argument("--threshold", type=int, default=4096, help="Compression threshold in bytes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    payloads = [build_analytics_payload(args.habits, args.seed + i) for i in range(args.payloads)]
+    codecs = [
+        ("json", JsonCodec(NO_COMPRESSION)),
+        ("json+zlib", JsonCodec(args.threshold)),
+        ("msgpack", MsgpackCodec(NO_COMPRESSION)),
+        ("msgpack+zlib", MsgpackCodec(args.threshold)),
+    ]
+    
+    print(f"{args.payloads} analytics payloads with {args.habits} habits, {args.iterations} iterations")
+    print(f"{'codec':<14}{'avg bytes':>12}{'encode us':>12}{'decode us':>12}")
+    for name, codec in codecs:
+        result = time_codec(codec, payloads, args.iterations)
+        print(f"{name:<14}{result['size']:>12.0f}{result['encode_us']:>12.1f}{result['decode_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+
+# Settings are read at import; tests bring their own SQLite engine instead of the Postgres one
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DATABASE_VERIFY_ON_STARTUP", "false")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+# Register every table on Base.metadata
+from app.auth.models import User  # noqa: F401
+from app.habits.models import Habit  # noqa: F401
+from app.completions.models import HabitCompletion  # noqa: F401
+from app.preferences.models import UserPreference  # noqa: F401
+from app.streaks.models import Streak  # noqa: F401
+from app.analytics.models import CompletionDailyRollup, AnalyticsMonthlySnapshot  # noqa: F401
+
+
+@pytest.fixture
+def db():
+    """Session on a fresh in-memory SQLite database with every table created"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
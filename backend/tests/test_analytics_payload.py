@@ -0,0 +1,165 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from app.analytics.repository import AnalyticsRepository, CompletionRollupRepository
+from app.analytics.service import build_analytics_payload, _chart_window
+from app.auth.models import User
+from app.completions.models import HabitCompletion
+from app.habits.models import Habit
+from app.habits.repository import HabitRepository
+from app.streaks.models import Streak
+
+
+# Per-habit queries the analytics endpoint ran before the grouped overview; kept here as the oracle
+
+
+def completion_count(db, user_id: int, start_date: date, end_date: date, habit_id: int = None) -> int:
+    """Completions of a user, or of one of their habits, in a date range"""
+    query = db.query(func.count(HabitCompletion.id)).filter(
+        HabitCompletion.user_id == user_id,
+        HabitCompletion.completion_date >= start_date,
+        HabitCompletion.completion_date <= end_date
+    )
+    if habit_id is not None:
+        query = query.filter(HabitCompletion.habit_id == habit_id)
+    return query.scalar() or 0
+
+
+def daily_completions(db, user_id: int, start_date: date, end_date: date) -> dict:
+    """Completion counts per day in a date range"""
+    rows = db.query(
+        func.date(HabitCompletion.completion_date).label('date'),
+        func.count(HabitCompletion.id).label('count')
+    ).filter(
+        HabitCompletion.user_id == user_id,
+        HabitCompletion.completion_date >= start_date,
+        HabitCompletion.completion_date <= end_date
+    ).group_by(func.date(HabitCompletion.completion_date)).all()
+    return {str(row.date): row.count for row in rows}
+
+
+def per_habit_analytics(db, user_id: int, today: date) -> dict:
+    """The analytics payload as the per-habit queries built it before build_analytics_payload"""
+    habit_repo = HabitRepository(db)
+    week_start = today - timedelta(days=today.weekday())
+    month_start = date(today.year, today.month, 1)
+    next_month = date(today.year + 1, 1, 1) if today.month == 12 else date(today.year, today.month + 1, 1)
+    
+    total_habits = db.query(func.count(Habit.id)).filter(Habit.user_id == user_id).scalar() or 0
+    active_habits = db.query(func.count(Habit.id)).filter(Habit.user_id == user_id, Habit.is_active.is_(True)).scalar() or 0
+    total_completions = completion_count(db, user_id, date(2000, 1, 1), today)
+    completions_this_week = completion_count(db, user_id, week_start, today)
+    completions_this_month = completion_count(db, user_id, month_start, today)
+    
+    days_since_start = (today - month_start).days + 1
+    expected_completions = active_habits * days_since_start if active_habits > 0 else 1
+    overall_completion_rate = (completions_this_month / expected_completions * 100) if expected_completions > 0 else 0
+    
+    streaks = []
+    for streak in db.query(Streak).filter(Streak.user_id == user_id).all():
+        habit = habit_repo.get_by_id(streak.habit_id, user_id)
+        if habit:
+            streaks.append({
+                "habit_id": streak.habit_id,
+                "habit_name": habit.name,
+                "current_streak": streak.current_streak,
+                "longest_streak": streak.longest_streak,
+                "last_completion_date": streak.last_completion_date.isoformat() if streak.last_completion_date else None,
+                "streak_start_date": streak.streak_start_date.isoformat() if streak.streak_start_date else None
+            })
+    
+    habit_stats = []
+    for habit in habit_repo.get_all_by_user(user_id, active_only=True):
+        habit_completions = completion_count(db, user_id, month_start, today, habit_id=habit.id)
+        streak = db.query(Streak).filter(Streak.user_id == user_id, Streak.habit_id == habit.id).first()
+        days_since_habit_start = (today - habit.created_at.date()).days + 1 if habit.created_at else 1
+        completion_rate = (habit_completions / days_since_habit_start * 100) if days_since_habit_start > 0 else 0
+        habit_stats.append({
+            "habit_id": habit.id,
+            "habit_name": habit.name,
+            "total_completions": habit_completions,
+            "current_streak": streak.current_streak if streak else 0,
+            "longest_streak": streak.longest_streak if streak else 0,
+            "completion_rate": completion_rate,
+            "last_completion_date": streak.last_completion_date.isoformat() if streak and streak.last_completion_date else None
+        })
+    
+    return {
+        "total_habits": total_habits,
+        "active_habits": active_habits,
+        "total_completions": total_completions,
+        "completions_this_week": completions_this_week,
+        "completions_this_month": completions_this_month,
+        "overall_completion_rate": round(overall_completion_rate, 2),
+        "streaks": streaks,
+        "habit_stats": habit_stats,
+        "weekly_completions": daily_completions(db, user_id, week_start, week_start + timedelta(days=6)),
+        "monthly_completions": daily_completions(db, user_id, month_start, next_month - timedelta(days=1))
+    }
+
+
+def grouped_analytics(db, user_id: int, today: date) -> dict:
+    """The analytics payload from the habit overview, the completion rollup and build_analytics_payload"""
+    analytics_repo = AnalyticsRepository(db)
+    chart_start, chart_end = _chart_window(today)
+    return build_analytics_payload(
+        analytics_repo.get_habit_overview(user_id),
+        analytics_repo.get_completion_overview(user_id, chart_start, chart_end, today),
+        today
+    )
+
+
+def seed_users(db, today: date, seed: int, users: int = 4, habits_per_user: int = 6) -> list:
+    """Users with active and inactive habits, completions around today (some future-dated) and streak rows for some habits"""
+    rng = random.Random(seed)
+    user_ids = []
+    created_at = datetime.combine(today, datetime.min.time()) - timedelta(days=120)
+    for u in range(users):
+        user = User(email=f"user{seed}-{u}@example.com", username=f"user{seed}-{u}", hashed_password="x")
+        db.add(user)
+        db.flush()
+        user_ids.append(user.id)
+        for h in range(habits_per_user):
+            # Distinct creation times keep the newest-first habit order unambiguous
+            created_at += timedelta(hours=rng.randint(1, 48))
+            habit = Habit(user_id=user.id, name=f"habit {u}-{h}", is_active=rng.random() > 0.3, created_at=created_at)
+            db.add(habit)
+            db.flush()
+            days = {today - timedelta(days=rng.randint(-5, 90)) for _ in range(rng.randint(0, 50))}
+            db.add_all(HabitCompletion(user_id=user.id, habit_id=habit.id, completion_date=day) for day in days)
+            if rng.random() > 0.3:
+                last_completion_date = max(days) if days and rng.random() > 0.2 else None
+                db.add(Streak(
+                    user_id=user.id,
+                    habit_id=habit.id,
+                    current_streak=rng.randint(0, 9),
+                    longest_streak=rng.randint(0, 20),
+                    last_completion_date=last_completion_date,
+                    streak_start_date=last_completion_date if rng.random() > 0.5 else None
+                ))
+    
+    # A user without habits
+    db.add(User(email=f"empty{seed}@example.com", username=f"empty{seed}", hashed_password="x"))
+    db.flush()
+    user_ids.append(db.query(User.id).filter(User.username == f"empty{seed}").scalar())
+    
+    rollup_repo = CompletionRollupRepository(db)
+    for user_id in user_ids:
+        rollup_repo.rebuild_user(user_id)
+    db.commit()
+    return user_ids
+
+
+@pytest.mark.parametrize("today", [
+    date(2026, 10, 17),  # Mid-month Saturday
+    date(2026, 11, 1),  # First of the month, on a Sunday
+    date(2026, 12, 31),  # Last day of the year, midweek
+    date(2026, 6, 29),  # Monday whose week spans the month end
+])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_grouped_payload_matches_per_habit_queries(db, today, seed):
+    for user_id in seed_users(db, today, seed):
+        assert grouped_analytics(db, user_id, today) == per_habit_analytics(db, user_id, today)
@@ -0,0 +1,107 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.analytics.models import AnalyticsMonthlySnapshot
+from app.analytics.service import AnalyticsService
+from app.auth.models import User
+from app.completions import service as completion_service_module
+from app.completions.schemas import HabitCompletionCreate
+from app.completions.service import HabitCompletionService
+from app.habits import service as habit_service_module
+from app.habits.models import Habit
+from app.habits.service import HabitService
+
+TODAY = date.today()
+CURRENT_MONTH = date(TODAY.year, TODAY.month, 1)
+LAST_MONTH = (CURRENT_MONTH - timedelta(days=1)).replace(day=1)
+TWO_MONTHS_AGO = (LAST_MONTH - timedelta(days=1)).replace(day=1)
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    """Service writes run without Redis"""
+    monkeypatch.setattr(completion_service_module, "invalidate", lambda **kwargs: True)
+    monkeypatch.setattr(habit_service_module, "invalidate", lambda **kwargs: True)
+
+
+@pytest.fixture
+def habit(db) -> Habit:
+    user = User(email="user@example.com", username="user", hashed_password="x")
+    db.add(user)
+    db.flush()
+    habit = Habit(user_id=user.id, name="habit", created_at=datetime.combine(TWO_MONTHS_AGO, datetime.min.time()))
+    db.add(habit)
+    db.commit()
+    return habit
+
+
+def complete(db, habit: Habit, day: date) -> None:
+    HabitCompletionService(db).create_completion(habit.user_id, HabitCompletionCreate(habit_id=habit.id, completion_date=day))
+
+
+def last_month_total(db, habit: Habit) -> int:
+    history = AnalyticsService(db).get_history(habit.user_id, months=3)
+    return next(month["total_completions"] for month in history if month["month"] == LAST_MONTH.isoformat())
+
+
+def stored(db, habit: Habit, month: date) -> AnalyticsMonthlySnapshot:
+    db.expire_all()
+    return db.query(AnalyticsMonthlySnapshot).filter(
+        AnalyticsMonthlySnapshot.user_id == habit.user_id,
+        AnalyticsMonthlySnapshot.month == month
+    ).one_or_none()
+
+
+def test_back_dated_write_refreezes_a_closed_month(db, habit):
+    complete(db, habit, LAST_MONTH)
+    assert last_month_total(db, habit) == 1
+    frozen = stored(db, habit, LAST_MONTH)
+    frozen_version = frozen.version
+    assert frozen.payload["t"] == 1
+    
+    complete(db, habit, LAST_MONTH + timedelta(days=1))
+    snapshot = stored(db, habit, LAST_MONTH)
+    assert (snapshot.payload, snapshot.version) == (None, frozen_version + 1)
+    
+    assert last_month_total(db, habit) == 2
+    assert stored(db, habit, LAST_MONTH).payload["t"] == 2
+
+
+def test_snapshot_built_across_a_back_dated_write_is_not_stored(db, habit, monkeypatch):
+    complete(db, habit, LAST_MONTH)
+    analytics_service = AnalyticsService(db)
+    get_daily_rollups = analytics_service.rollup_repo.get_daily_rollups
+    
+    def rollups_then_write(*args):
+        # The build reads the rollups, then a back-dated write commits before the build stores its snapshot
+        rollups = [
+            SimpleNamespace(day=rollup.day, count=rollup.count, habit_counts=dict(rollup.habit_counts))
+            for rollup in get_daily_rollups(*args)
+        ]
+        complete(db, habit, LAST_MONTH + timedelta(days=1))
+        return rollups
+    
+    monkeypatch.setattr(analytics_service.rollup_repo, "get_daily_rollups", rollups_then_write)
+    analytics_service.get_history(habit.user_id, months=3)
+    
+    assert stored(db, habit, LAST_MONTH).payload is None
+    assert last_month_total(db, habit) == 2
+
+
+def test_deleting_a_habit_marks_every_closed_month_since_its_start_stale(db, habit):
+    complete(db, habit, LAST_MONTH)
+    snapshot_repo = AnalyticsService(db).snapshot_repo
+    assert last_month_total(db, habit) == 1
+    # A build of both closed months claims them before the habit is deleted
+    versions = snapshot_repo.claim(habit.user_id, [TWO_MONTHS_AGO, LAST_MONTH])
+    db.query(AnalyticsMonthlySnapshot).filter(AnalyticsMonthlySnapshot.month == TWO_MONTHS_AGO).delete()
+    db.commit()
+    
+    HabitService(db).delete_habit(habit.id, habit.user_id)
+    
+    for month in (TWO_MONTHS_AGO, LAST_MONTH):
+        assert stored(db, habit, month).payload is None
+        assert not snapshot_repo.save(habit.user_id, month, {"t": 1}, versions[month])
+    assert last_month_total(db, habit) == 0
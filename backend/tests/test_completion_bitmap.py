@@ -0,0 +1,127 @@
+from datetime import date, datetime, timedelta
+
+from app.auth.models import User
+from app.completions.models import HabitCompletion
+from app.habits.bitmap import CompletionBitmap
+from app.habits.models import Habit
+from app.habits.repository import HabitRepository
+
+ORIGIN = date(2026, 10, 1)
+
+
+def completed_days(bitmap: CompletionBitmap) -> list:
+    return [bitmap.origin + timedelta(days=int(offset)) for offset in bitmap.bits.nonzero()[0]]
+
+
+def test_set_grows_before_origin():
+    bitmap = CompletionBitmap.from_dates(ORIGIN, [ORIGIN, ORIGIN + timedelta(days=2)])
+    
+    bitmap.set(ORIGIN - timedelta(days=3), True)
+    
+    assert bitmap.origin == ORIGIN - timedelta(days=3)
+    assert completed_days(bitmap) == [ORIGIN - timedelta(days=3), ORIGIN, ORIGIN + timedelta(days=2)]
+
+
+def test_set_grows_after_end():
+    bitmap = CompletionBitmap.from_dates(ORIGIN, [ORIGIN])
+    
+    bitmap.set(ORIGIN + timedelta(days=40), True)
+    
+    assert bitmap.origin == ORIGIN
+    assert completed_days(bitmap) == [ORIGIN, ORIGIN + timedelta(days=40)]
+
+
+def test_clear_leaves_other_days_and_ignores_days_outside_the_range():
+    days = [ORIGIN, ORIGIN + timedelta(days=1), ORIGIN + timedelta(days=5)]
+    bitmap = CompletionBitmap.from_dates(ORIGIN, days)
+    
+    bitmap.set(ORIGIN + timedelta(days=1), False)
+    bitmap.set(ORIGIN - timedelta(days=10), False)
+    bitmap.set(ORIGIN + timedelta(days=100), False)
+    
+    assert bitmap.origin == ORIGIN
+    assert len(bitmap.bits) == 6
+    assert completed_days(bitmap) == [ORIGIN, ORIGIN + timedelta(days=5)]
+    
+    bitmap.set(ORIGIN, False)
+    bitmap.set(ORIGIN + timedelta(days=5), False)
+    assert bitmap.is_empty()
+    assert bitmap.to_bytes() == b""
+
+
+def test_bytes_round_trip():
+    days = [ORIGIN + timedelta(days=offset) for offset in (0, 1, 7, 8, 9, 15, 16, 30)]
+    bitmap = CompletionBitmap.from_dates(ORIGIN, days)
+    
+    payload = bitmap.to_bytes()
+    restored = CompletionBitmap.from_bytes(bitmap.origin, payload)
+    
+    assert len(payload) == 4
+    assert completed_days(restored) == days
+    assert restored.to_bytes() == payload
+    assert completed_days(CompletionBitmap.from_bytes(ORIGIN, b"")) == []
+
+
+def add_habit(db, created: date, completion_dates: list) -> Habit:
+    user = User(email=f"user{created}@example.com", username=f"user{created}", hashed_password="x")
+    db.add(user)
+    db.flush()
+    habit = Habit(user_id=user.id, name="habit", created_at=datetime.combine(created, datetime.min.time()))
+    db.add(habit)
+    db.flush()
+    db.add_all(HabitCompletion(user_id=user.id, habit_id=habit.id, completion_date=day) for day in completion_dates)
+    db.commit()
+    return habit
+
+
+def test_get_completion_bitmaps_builds_and_saves_unbuilt_rows(db):
+    days = [ORIGIN - timedelta(days=2), ORIGIN + timedelta(days=3)]
+    built = add_habit(db, ORIGIN, days)
+    empty = add_habit(db, ORIGIN + timedelta(days=1), [])
+    habit_repo = HabitRepository(db)
+    
+    bitmaps = habit_repo.get_completion_bitmaps([built.id, empty.id])
+    db.commit()
+    
+    assert completed_days(bitmaps[built.id]) == days
+    assert bitmaps[empty.id].is_empty()
+    db.expire_all()
+    stored = db.get(Habit, built.id)
+    assert stored.completion_bitmap_origin == ORIGIN - timedelta(days=2)
+    assert stored.completion_bitmap == bitmaps[built.id].to_bytes()
+    assert db.get(Habit, empty.id).completion_bitmap == b""
+    
+    # Built rows are read back as stored rather than rebuilt from the completions table
+    db.query(HabitCompletion).filter(HabitCompletion.habit_id == built.id).delete()
+    db.commit()
+    assert completed_days(habit_repo.get_completion_bitmaps([built.id])[built.id]) == days
+
+
+def test_set_completion_day_updates_a_built_bitmap(db):
+    habit = add_habit(db, ORIGIN, [ORIGIN])
+    habit_repo = HabitRepository(db)
+    habit_repo.get_completion_bitmaps([habit.id])
+    db.commit()
+    
+    habit_repo.set_completion_day(habit.id, ORIGIN - timedelta(days=4), True)
+    habit_repo.set_completion_day(habit.id, ORIGIN, False)
+    habit_repo.set_completion_day(habit.id, ORIGIN + timedelta(days=2), True)
+    db.commit()
+    
+    bitmap = habit_repo.get_completion_bitmaps([habit.id])[habit.id]
+    assert completed_days(bitmap) == [ORIGIN - timedelta(days=4), ORIGIN + timedelta(days=2)]
+
+
+def test_set_completion_day_builds_an_unbuilt_bitmap_from_completions(db):
+    # The completion row is written before the bitmap, as the completion service does
+    habit = add_habit(db, ORIGIN, [ORIGIN, ORIGIN + timedelta(days=1)])
+    habit_repo = HabitRepository(db)
+    
+    habit_repo.set_completion_day(habit.id, ORIGIN + timedelta(days=1), True)
+    db.commit()
+    
+    db.expire_all()
+    stored = db.get(Habit, habit.id)
+    assert completed_days(CompletionBitmap.from_bytes(stored.completion_bitmap_origin, stored.completion_bitmap)) == [
+        ORIGIN, ORIGIN + timedelta(days=1)
+    ]
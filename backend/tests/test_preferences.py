@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.auth.models import User
+from app.habits.models import Habit
+from app.preferences import service as preference_service_module
+from app.preferences.models import UserPreference
+from app.preferences.schemas import PreferenceUpdate
+from app.preferences.service import PreferenceService
+from app.reminders.service import ReminderService
+
+# Mid-October: New York on EDT (-4), London on BST (+1), Auckland on NZDT (+13)
+NOW = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+EIGHT_AM = 8 * 60
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    """User ids whose streak caches the preference service invalidated"""
+    user_ids = []
+    monkeypatch.setattr(preference_service_module, "invalidate_streak_caches", user_ids.extend)
+    return user_ids
+
+
+def add_user_with_reminder(db, timezone_name: str) -> tuple:
+    user = User(email="user@example.com", username="user", hashed_password="x")
+    db.add(user)
+    db.flush()
+    db.add(UserPreference(user_id=user.id, timezone=timezone_name))
+    habit = Habit(user_id=user.id, name="habit", reminder_time="08:00", reminder_minute=EIGHT_AM)
+    db.add(habit)
+    db.commit()
+    ReminderService(db).reschedule_user(user.id, NOW)
+    return user, habit
+
+
+def bucket(db, habit: Habit) -> tuple:
+    db.refresh(habit)
+    return habit.reminder_utc_minute, habit.reminder_day_shift, habit.reminder_valid_until
+
+
+def test_timezone_change_reschedules_reminders(db, invalidated):
+    user, habit = add_user_with_reminder(db, "America/New_York")
+    assert bucket(db, habit)[:2] == (12 * 60, 0)
+    
+    PreferenceService(db).update_preferences(user.id, PreferenceUpdate(timezone="Pacific/Auckland"), NOW)
+    
+    # 08:00 in Auckland is 19:00 UTC on the previous UTC date
+    assert bucket(db, habit)[:2] == (19 * 60, 1)
+    assert invalidated == [user.id]
+
+
+def test_timezone_change_across_dst(db, invalidated):
+    user, habit = add_user_with_reminder(db, "America/New_York")
+    
+    PreferenceService(db).update_preferences(user.id, PreferenceUpdate(timezone="Europe/London"), NOW)
+    
+    # On BST until London's clocks go back, then on GMT
+    assert bucket(db, habit) == (7 * 60, 0, datetime(2026, 10, 25, 1, 0))
+    ReminderService(db).reschedule_expired(datetime(2026, 10, 25, 2, 0, tzinfo=timezone.utc))
+    assert bucket(db, habit) == (8 * 60, 0, datetime(2027, 3, 28, 1, 0))
+
+
+def test_other_preferences_leave_reminders_alone(db, invalidated):
+    user, habit = add_user_with_reminder(db, "America/New_York")
+    before = bucket(db, habit)
+    
+    preferences = PreferenceService(db).update_preferences(
+        user.id, PreferenceUpdate(theme="dark", timezone="America/New_York"), NOW
+    )
+    
+    assert preferences["theme"] == "dark"
+    assert bucket(db, habit) == before
+    assert invalidated == []
+
+
+def test_unknown_timezone_is_rejected():
+    with pytest.raises(ValueError):
+        PreferenceUpdate(timezone="Mars/Olympus_Mons")
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+
+import fakeredis
+import pytest
+from prometheus_client import REGISTRY
+
+from app.reminders import delivery
+from app.reminders.delivery import (
+    REMINDER_DEAD_LETTER_KEY, REMINDER_GROUP, REMINDER_RETRY_KEY, REMINDER_STREAM_KEY,
+    ReminderDeliveryWorker, enqueue_reminders, reminder_ledger_key
+)
+from app.reminders.senders import FakeReminderSender
+
+RETRY_BASE_SECONDS = 0.05
+
+
+def reminder(habit_id: int, day: str = "2026-10-17") -> dict:
+    return {"habit_id": habit_id, "user_id": 1, "habit_name": f"habit {habit_id}", "reminder_time": "08:00", "date": day}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """A fake Redis server shared by the enqueueing (sync) client and the worker's (async) client"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(delivery, "redis_client", fakeredis.FakeRedis(server=server))
+    return server
+
+
+def run_worker(server, sender: FakeReminderSender, max_attempts: int = 3, ticks: int = 1) -> fakeredis.FakeAsyncRedis:
+    """Run `ticks` delivery batches, waiting out the retry backoff between them"""
+    client = fakeredis.FakeAsyncRedis(server=server)
+    worker = ReminderDeliveryWorker(
+        sender=sender, redis_client=client, consumer="test", max_attempts=max_attempts, retry_base_seconds=RETRY_BASE_SECONDS
+    )
+    
+    async def run():
+        await worker.ensure_group()
+        for tick in range(ticks):
+            if tick:
+                await asyncio.sleep(RETRY_BASE_SECONDS * 2 ** tick * 1.25)
+            await worker.run_once()
+    
+    asyncio.run(run())
+    return client
+
+
+def stream_state(server) -> tuple:
+    """Entries left on the stream and entries read but not acknowledged"""
+    client = fakeredis.FakeRedis(server=server)
+    return client.xlen(REMINDER_STREAM_KEY), client.xpending(REMINDER_STREAM_KEY, REMINDER_GROUP)["pending"]
+
+
+def test_sent_reminders_are_acknowledged_and_removed(server):
+    sender = FakeReminderSender()
+    enqueue_reminders([reminder(1), reminder(2), reminder(3)])
+    
+    run_worker(server, sender)
+    
+    assert sorted(sent["habit_id"] for sent in sender.sent) == [1, 2, 3]
+    assert stream_state(server) == (0, 0)
+    assert fakeredis.FakeRedis(server=server).exists(reminder_ledger_key(reminder(1)))
+
+
+def test_failed_send_is_scheduled_for_retry_with_backoff(server):
+    sender = FakeReminderSender(failures=1)
+    enqueue_reminders([reminder(1)])
+    
+    started = time.time()
+    run_worker(server, sender)
+    
+    client = fakeredis.FakeRedis(server=server)
+    [(member, due)] = client.zrange(REMINDER_RETRY_KEY, 0, -1, withscores=True)
+    attempt, _, payload = member.decode().split("|", 2)
+    assert attempt == "1"
+    assert json.loads(payload) == reminder(1)
+    assert started + RETRY_BASE_SECONDS <= due <= time.time() + RETRY_BASE_SECONDS * 1.25
+    # The failed entry is settled on the stream, and its ledger claim released for the retry
+    assert stream_state(server) == (0, 0)
+    assert not client.exists(reminder_ledger_key(reminder(1)))
+    assert sender.sent == []
+
+
+def test_retry_is_sent_once_due(server):
+    sender = FakeReminderSender(failures=1)
+    enqueue_reminders([reminder(1)])
+    
+    run_worker(server, sender, ticks=2)
+    
+    assert sender.sent == [reminder(1)]
+    assert sender.attempts == 2
+    assert fakeredis.FakeRedis(server=server).zcard(REMINDER_RETRY_KEY) == 0
+    assert stream_state(server) == (0, 0)
+
+
+def test_reminder_is_dead_lettered_after_max_attempts(server):
+    sender = FakeReminderSender(failures=10)
+    enqueue_reminders([reminder(1)])
+    
+    run_worker(server, sender, max_attempts=2, ticks=3)
+    
+    client = fakeredis.FakeRedis(server=server)
+    [dead] = [json.loads(entry) for entry in client.lrange(REMINDER_DEAD_LETTER_KEY, 0, -1)]
+    assert dead["reminder"] == reminder(1)
+    assert dead["attempts"] == 2
+    assert dead["error"] == "Fake send failure 2/10"
+    # Not retried again once dead-lettered
+    assert sender.attempts == 2
+    assert client.zcard(REMINDER_RETRY_KEY) == 0
+    assert stream_state(server) == (0, 0)
+
+
+def duplicates_suppressed() -> float:
+    return REGISTRY.get_sample_value("reminder_duplicates_suppressed_total") or 0
+
+
+def test_same_habit_and_local_date_is_sent_once(server):
+    sender = FakeReminderSender()
+    before = duplicates_suppressed()
+    # Queued twice in one batch, once more on a later tick, and once for the next local date
+    enqueue_reminders([reminder(1), reminder(1)])
+    run_worker(server, sender)
+    enqueue_reminders([reminder(1), reminder(1, "2026-10-18")])
+    run_worker(server, sender)
+    
+    assert sender.sent == [reminder(1), reminder(1, "2026-10-18")]
+    assert duplicates_suppressed() - before == 2
+    assert stream_state(server) == (0, 0)
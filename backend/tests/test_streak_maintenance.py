@@ -0,0 +1,213 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.auth.models import User
+from app.completions.models import HabitCompletion
+from app.habits.models import Habit
+from app.streaks.models import Streak
+from app.streaks.repository import StreakRepository
+from app.streaks.service import StreakService, compute_current_streak, compute_longest_streak, local_today
+
+# Users without preferences are on the UTC date
+TODAY = local_today("UTC")
+
+
+def days_ago(*offsets: int) -> list:
+    return [TODAY - timedelta(days=offset) for offset in offsets]
+
+
+@pytest.fixture
+def habit(db) -> Habit:
+    user = User(email="user@example.com", username="user", hashed_password="x")
+    db.add(user)
+    db.flush()
+    habit = Habit(user_id=user.id, name="habit")
+    db.add(habit)
+    db.commit()
+    return habit
+
+
+def forbid_date_reads(monkeypatch) -> None:
+    """Fail any read of completion dates, so only the stored boundaries can be used"""
+    def read(*args):
+        raise AssertionError("read completion dates")
+    
+    for method in ("get_dates_on_or_before", "get_dates_on_or_after", "get_all_dates", "get_last_completion_date"):
+        monkeypatch.setattr(StreakRepository, method, read)
+
+
+def add(db, habit: Habit, *days: date) -> None:
+    """Write completions one at a time, as the completion service does: the row, then the streak"""
+    for day in days:
+        db.add(HabitCompletion(user_id=habit.user_id, habit_id=habit.id, completion_date=day))
+        db.flush()
+        StreakService(db).completion_added(habit.user_id, habit.id, day)
+        db.commit()
+
+
+def remove(db, habit: Habit, *days: date) -> None:
+    for day in days:
+        db.query(HabitCompletion).filter(HabitCompletion.habit_id == habit.id, HabitCompletion.completion_date == day).delete()
+        db.flush()
+        StreakService(db).completion_removed(habit.user_id, habit.id, day)
+        db.commit()
+
+
+def streak_of(db, habit: Habit) -> Streak:
+    db.expire_all()
+    return db.query(Streak).filter(Streak.habit_id == habit.id).one()
+
+
+def boundaries(streak: Streak) -> tuple:
+    return streak.last_completion_date, streak.run_start_date, streak.chain_start_date, streak.chain_length
+
+
+def expected(completion_dates: list) -> tuple:
+    """Last date, run start, chain start and chain length walked from a full history, newest first"""
+    run_start = chain_start = completion_dates[0]
+    for newer, older in zip(completion_dates, completion_dates[1:]):
+        if (newer - older).days > 2:
+            break
+        if run_start == newer and (newer - older).days == 1:
+            run_start = older
+        chain_start = older
+    chain_length = sum(1 for day in completion_dates if day >= chain_start)
+    return completion_dates[0], run_start, chain_start, chain_length
+
+
+def test_completing_today_extends_the_run_and_chain_without_reading_dates(db, habit, monkeypatch):
+    add(db, habit, *days_ago(4, 2, 1))
+    assert boundaries(streak_of(db, habit)) == (*days_ago(1, 2, 4), 3)
+    
+    forbid_date_reads(monkeypatch)
+    add(db, habit, TODAY)
+    
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (*days_ago(0, 2, 4), 4)
+    assert (streak.current_streak, streak.streak_start_date, streak.longest_streak) == (4, TODAY, 3)
+
+
+def test_completing_after_a_broken_chain_starts_a_new_one(db, habit):
+    add(db, habit, *days_ago(6, 5))
+    assert streak_of(db, habit).current_streak == 0
+    
+    add(db, habit, TODAY)
+    
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (TODAY, TODAY, TODAY, 1)
+    assert (streak.current_streak, streak.longest_streak) == (1, 2)
+
+
+def test_back_dated_completion_merges_runs(db, habit):
+    add(db, habit, *days_ago(5, 4, 2, 1, 0))
+    assert streak_of(db, habit).longest_streak == 3
+    
+    add(db, habit, *days_ago(3))
+    
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (*days_ago(0, 5, 5), 6)
+    assert (streak.current_streak, streak.longest_streak) == (6, 6)
+
+
+def test_back_dated_completion_merges_an_older_chain_into_the_current_one(db, habit):
+    add(db, habit, *days_ago(8, 7, 3, 2, 1))
+    assert boundaries(streak_of(db, habit)) == (*days_ago(1, 3, 3), 3)
+    
+    add(db, habit, *days_ago(5))
+    
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (*days_ago(1, 3, 8), 6)
+    assert (streak.current_streak, streak.longest_streak) == (6, 3)
+
+
+def test_back_dated_completion_outside_the_chain_leaves_it(db, habit):
+    add(db, habit, *days_ago(2, 1, 0))
+    
+    add(db, habit, *days_ago(20, 19))
+    
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (*days_ago(0, 2, 2), 3)
+    assert streak.current_streak == 3
+
+
+def test_removing_days_inside_the_run_shrinks_it_without_reading_dates(db, habit, monkeypatch):
+    add(db, habit, *days_ago(5, 4, 3, 2, 1, 0))
+    forbid_date_reads(monkeypatch)
+    
+    remove(db, habit, TODAY)
+    assert boundaries(streak_of(db, habit)) == (*days_ago(1, 5, 5), 5)
+    
+    # A missed day splits the run but not the chain
+    remove(db, habit, *days_ago(3))
+    assert boundaries(streak_of(db, habit)) == (*days_ago(1, 2, 5), 4)
+    
+    # Missing the day before the run as well breaks the chain
+    remove(db, habit, *days_ago(2))
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (*days_ago(1, 1, 1), 1)
+    assert (streak.current_streak, streak.longest_streak) == (1, 6)
+
+
+def test_removing_a_day_before_the_run_splits_the_chain(db, habit):
+    add(db, habit, *days_ago(7, 5, 3, 2, 1))
+    assert boundaries(streak_of(db, habit)) == (*days_ago(1, 3, 7), 5)
+    
+    remove(db, habit, *days_ago(5))
+    
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (*days_ago(1, 3, 3), 3)
+    assert streak.current_streak == 3
+
+
+def test_removing_a_one_day_run_falls_back_to_the_previous_date(db, habit):
+    add(db, habit, *days_ago(4, 3, 1))
+    
+    remove(db, habit, *days_ago(1))
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (*days_ago(3, 4, 4), 2)
+    assert (streak.current_streak, streak.streak_start_date) == (0, None)
+    
+    remove(db, habit, *days_ago(3, 4))
+    streak = streak_of(db, habit)
+    assert boundaries(streak) == (None, None, None, None)
+    assert streak.current_streak == 0
+
+
+def test_rows_without_boundaries_are_filled_by_the_next_write(db, habit):
+    add(db, habit, *days_ago(3, 2, 1))
+    db.query(Streak).update({"run_start_date": None, "chain_start_date": None, "chain_length": None})
+    db.commit()
+    
+    add(db, habit, TODAY)
+    
+    assert boundaries(streak_of(db, habit)) == (*days_ago(0, 3, 3), 4)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_writes_match_a_full_recompute(db, habit, seed):
+    rng = random.Random(seed)
+    completed = set()
+    longest = 0
+    for _ in range(60):
+        day = TODAY - timedelta(days=rng.randint(-2, 20))
+        if day in completed and rng.random() < 0.8:
+            remove(db, habit, day)
+            completed.remove(day)
+        elif day not in completed:
+            add(db, habit, day)
+            completed.add(day)
+        else:
+            continue
+        
+        completion_dates = sorted(completed, reverse=True)
+        longest = max(longest, compute_longest_streak(completion_dates))
+        streak = streak_of(db, habit)
+        if not completion_dates:
+            assert (streak.last_completion_date, streak.current_streak) == (None, 0)
+            continue
+        assert boundaries(streak) == expected(completion_dates)
+        assert (streak.current_streak, streak.streak_start_date) == compute_current_streak(completion_dates, TODAY)
+        # The longest streak is a high-water mark kept across removals
+        assert streak.longest_streak == longest
@@ -0,0 +1,91 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.auth.models import User
+from app.completions.models import HabitCompletion
+from app.habits.models import Habit
+from app.streaks.models import Streak
+from app.streaks.repository import StreakRepository
+from app.streaks.service import compute_current_streak, compute_longest_streak
+
+TODAY = date(2026, 10, 17)
+
+
+def random_history(rng: random.Random) -> list:
+    """Completion dates around TODAY, newest first: runs, one- and two-day gaps, and some future-dated days"""
+    dates = set()
+    day = TODAY + timedelta(days=rng.choice([0, 0, 0, 1, 3]))
+    for _ in range(rng.randint(0, 12)):
+        for _ in range(rng.randint(1, 6)):
+            dates.add(day)
+            day -= timedelta(days=1)
+        day -= timedelta(days=rng.choice([0, 1, 1, 2, 3, 10]))
+    return sorted(dates, reverse=True)
+
+
+def seed_histories(db, seed: int, users: int = 5, habits_per_user: int = 8) -> dict:
+    """Habits with random completion histories, keyed by (user_id, habit_id)"""
+    rng = random.Random(seed)
+    histories = {}
+    for u in range(users):
+        user = User(email=f"user{seed}-{u}@example.com", username=f"user{seed}-{u}", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for h in range(habits_per_user):
+            habit = Habit(user_id=user.id, name=f"habit {u}-{h}")
+            db.add(habit)
+            db.flush()
+            dates = random_history(rng)
+            db.add_all(HabitCompletion(user_id=user.id, habit_id=habit.id, completion_date=day) for day in dates)
+            histories[(user.id, habit.id)] = dates
+    db.commit()
+    return histories
+
+
+def expected_rows(histories: dict) -> dict:
+    """Streak rows the Python algorithm computes for the habits that have completions"""
+    rows = {}
+    for key, dates in histories.items():
+        if not dates:
+            continue
+        current_streak, streak_start_date = compute_current_streak(dates, TODAY)
+        rows[key] = (current_streak, compute_longest_streak(dates), dates[0], streak_start_date)
+    return rows
+
+
+def stored_rows(db) -> dict:
+    return {
+        (streak.user_id, streak.habit_id): (
+            streak.current_streak, streak.longest_streak, streak.last_completion_date, streak.streak_start_date
+        )
+        for streak in db.query(Streak).all()
+    }
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_upsert_computed_matches_python_algorithm(db, seed):
+    histories = seed_histories(db, seed)
+    streak_repo = StreakRepository(db)
+    
+    changed = streak_repo.upsert_computed(TODAY)
+    db.commit()
+    
+    expected = expected_rows(histories)
+    assert stored_rows(db) == expected
+    assert set(changed) == {user_id for user_id, _ in expected}
+    
+    # A second pass over unchanged histories rewrites nothing
+    assert streak_repo.upsert_computed(TODAY) == []
+
+
+def test_upsert_computed_restricted_to_habit_criteria(db):
+    histories = seed_histories(db, seed=42, users=2)
+    user_id = min(user_id for user_id, _ in histories)
+    
+    StreakRepository(db).upsert_computed(TODAY, Habit.user_id == user_id)
+    db.commit()
+    
+    expected = {key: row for key, row in expected_rows(histories).items() if key[0] == user_id}
+    assert stored_rows(db) == expected
@@ -0,0 +1,77 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.auth.models import User
+from app.habits.models import Habit
+from app.preferences.models import UserPreference
+from app.streaks.models import Streak
+from app.streaks.service import StreakService
+
+# Every chain ended on the 16th, so it breaks when its owner's local date reaches the 18th
+LAST_COMPLETION = date(2026, 10, 16)
+# Kathmandu (+5:45) reaches the 18th at 18:15 UTC on the 17th and Kolkata (+5:30) at 18:30;
+# UTC and New York are still on the 17th
+TIMEZONES = ["Asia/Kathmandu", "Asia/Kolkata", "UTC", "America/New_York"]
+
+
+def utc(hour: int, minute: int) -> datetime:
+    return datetime(2026, 10, 17, hour, minute, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def users(db) -> dict:
+    """A user with a three-day chain in each timezone, by timezone"""
+    users = {}
+    for name in TIMEZONES:
+        user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(UserPreference(user_id=user.id, timezone=name))
+        habit = Habit(user_id=user.id, name="habit")
+        db.add(habit)
+        db.flush()
+        db.add(Streak(
+            user_id=user.id, habit_id=habit.id, current_streak=3, longest_streak=3,
+            last_completion_date=LAST_COMPLETION, streak_start_date=LAST_COMPLETION
+        ))
+        users[name] = user.id
+    db.commit()
+    return users
+
+
+def reset_zones(users: dict, user_ids: set) -> list:
+    return sorted(name for name, user_id in users.items() if user_id in user_ids)
+
+
+def test_each_zone_is_rolled_over_on_the_run_after_its_midnight(db, users):
+    streak_service = StreakService(db)
+    
+    resets = {}
+    since = utc(17, 45)
+    for now in (utc(18, 0), utc(18, 15), utc(18, 30), utc(18, 45)):
+        resets[now.strftime("%H:%M")] = reset_zones(users, streak_service.roll_over(now, since))
+        db.commit()
+        since = now
+    
+    assert resets == {"18:00": [], "18:15": ["Asia/Kathmandu"], "18:30": ["Asia/Kolkata"], "18:45": []}
+
+
+def test_zones_whose_midnight_did_not_pass_are_left_alone(db, users):
+    # Kolkata's chain is broken by 18:30, but its midnight passed before this window
+    assert StreakService(db).roll_over(utc(18, 45), utc(18, 31)) == set()
+    assert db.query(Streak).filter(Streak.current_streak == 0).count() == 0
+
+
+def test_missed_runs_are_caught_up(db, users):
+    # A run at 18:45 after the last one at 18:00 covers both midnights in between
+    user_ids = StreakService(db).roll_over(utc(18, 45), utc(18, 0))
+    
+    assert reset_zones(users, user_ids) == ["Asia/Kathmandu", "Asia/Kolkata"]
+
+
+def test_without_a_previous_run_every_zone_is_checked(db, users):
+    user_ids = StreakService(db).roll_over(utc(18, 45))
+    
+    assert reset_zones(users, user_ids) == ["Asia/Kathmandu", "Asia/Kolkata"]
+    assert StreakService(db).roll_over(utc(18, 45)) == set()